@@ -1,7 +1,9 @@
-import time
+import json
+import uuid
 
+import requests
 import streamlit as st
-from src.generation.rag_generator import ClinicalRAG
+from config.settings import Config
 
 st.set_page_config(
     page_title="Clinical Diagnosis Assistant",
@@ -11,24 +13,96 @@ st.set_page_config(
 st.title("Clinical Diagnosis Assistant")
 st.markdown("AI-powered diagnostic support for tropical and infectious diseases")
 
+# The index, models and LLM live in the API server (src/serving/api.py), shared by all sessions.
+API_URL = Config.API_URL.rstrip("/")
 
-# Initialize RAG system
-@st.cache_resource
-def load_rag_generator():
-    rag = ClinicalRAG()
-    return rag
+# All sessions reach the API from this server's address: identify them for the per-client rate limit.
+if "client_id" not in st.session_state:
+    st.session_state.client_id = uuid.uuid4().hex
+HEADERS = {"X-Client-ID": st.session_state.client_id}
+
+
+class ServerBusy(Exception):
+    """The API shed the request (429 rate limited / 503 overloaded)"""
+
+
+def stream_diagnosis(question):
+    """Yield the events of the API's NDJSON diagnosis stream"""
+    with requests.post(f"{API_URL}/diagnose/stream", json={"question": question}, headers=HEADERS,
+                       stream=True, timeout=Config.API_TIMEOUT_SECONDS) as response:
+        if response.status_code in (429, 503):
+            raise ServerBusy(response.headers.get("Retry-After", "a few"))
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
 
 
 # Create text area for symptom input
 greet = st.text_input("Tell me about your health.")
 
+# Skip the generated answer and only list the similar cases
+retrieval_only = st.checkbox("Similar cases only (no AI answer)")
+
 # Create a button for generating response
 button = st.button("Get response!")
 
-if button:
+if button and retrieval_only:
+    try:
+        response = requests.post(f"{API_URL}/retrieve", json={"question": greet}, headers=HEADERS,
+                                 timeout=Config.API_TIMEOUT_SECONDS)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        st.error(f"Clinical API unreachable at {API_URL}: {e}")
+        st.stop()
+    result = response.json()
+
+    st.subheader(f"Similar cases ({len(result['cases'])})")
+    for i, case in enumerate(result['cases'], 1):
+        st.markdown(f"**{i}. {case['case_id']}** ({case['score_kind']}: {case['score']:.4f})")
+        for field, items in case['matched_fields'].items():
+            st.markdown(f"- {field}: {', '.join(items)}")
+        with st.expander("Full case"):
+            st.text(case['content'][:2000])
+
+    st.caption(f"Retrieval: {result['timing']['retrieval_seconds'] * 1000:.1f}ms")
+
+elif button:
     st.write("Starting process!")
 
-    with st.spinner("Wait for it ..."):
-        rag = load_rag_generator()
-        response = rag.query(greet)
-        st.write(response['result'])
+    try:
+        with st.spinner("Wait for it ..."):
+            events = stream_diagnosis(greet)
+            sources = next(events)  # The retrieved cases arrive before the answer
+    except ServerBusy as e:
+        st.warning(f"The service is busy, please try again in {e} seconds.")
+        st.stop()
+    except requests.RequestException as e:
+        st.error(f"Clinical API unreachable at {API_URL}: {e}")
+        st.stop()
+
+    with st.expander(f"Similar cases ({len(sources['source_documents'])})"):
+        for i, case in enumerate(sources['source_documents'], 1):
+            st.markdown(f"**{i}. {case['case_id']}**")
+            st.text(case['content'][:500])
+
+    # Render the answer as the tokens arrive
+    answer_box = st.empty()
+    answer = ""
+    timing = {}
+    for event in events:
+        if event["type"] == "token":
+            answer += event["text"]
+            answer_box.markdown(answer)
+        elif event["type"] == "unavailable":
+            # The LLM timed out or is failing: the similar cases above are still useful
+            st.warning(f"{event['message']} ({event['reason']})")
+        elif event["type"] == "done":
+            timing = event["timing"]
+
+    if timing:
+        latency = [f"Sources: {timing['time_to_sources_seconds']:.2f}s"]
+        if timing["time_to_first_token_seconds"] is not None:
+            latency.append(f"First token: {timing['time_to_first_token_seconds']:.2f}s")
+        latency.append(f"Total: {timing['total_seconds']:.2f}s")
+        st.caption(" · ".join(latency))
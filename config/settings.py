@@ -15,11 +15,118 @@ class Config:
 
     # Embedding Models
     TEXT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    EMBED_BATCH_SIZE = 256  # Documents embedded per call when building an index (one trace span each)
 
     # Paths
     RAW_DATA_DIR = "data/raw/case_reports"
     PROCESSED_DATA_DIR = "data/processed"
     VECTOR_STORE_DIR = "data/vector_store"
 
+    # Incremental Pipeline (--stage pipeline)
+    PIPELINE_STATE_FILE = "data/cache/pipeline/state.json"  # Fingerprints of the outputs of the last run
+    PIPELINE_CHUNKS_DIR = "data/processed/chunks"  # Texts to embed, one JSON file per case
+    PIPELINE_EMBEDDING_CACHE = "data/cache/pipeline/embeddings.sqlite"  # Document vectors by text hash and model
+    PIPELINE_DVC_ADD = False  # Run `dvc add` on changed outputs that have a .dvc file (data/processed/filtered, ...)
+
+    # Streaming Ingestion (--stage ingest)
+    INGEST_EXTRACT_WORKERS = 2  # PDFs extracted at once (threads)
+    INGEST_FILTER_WORKERS = 4  # Cases filtered at once, each sends its pages concurrently within LLM_REQUESTS_PER_MINUTE
+    INGEST_QUEUE_SIZE = 8  # Items a queue between two stages holds before the upstream stage waits
+    INGEST_INDEX_BATCH_SIZE = 16  # Most cases embedded and appended per published index version
+    INGEST_INDEX_MAX_WAIT_SECONDS = 1.0  # Longest the index worker waits for more cases before appending
+    INGEST_REPORT_INTERVAL = 10  # Seconds between progress lines (throughput and queue occupancy)
+    INGEST_PUBLISH_RETRY_SECONDS = 1.0  # Wait after a failed publish, doubled after each further failure
+    INGEST_PUBLISH_RETRY_MAX_SECONDS = 60  # Longest wait between publish attempts
+    INGEST_PUBLISH_MAX_ATTEMPTS = 5  # Failed publishes in a row before the unpublished cases are marked failed
+
+    # Watch-folder Ingestion (--stage watch)
+    WATCH_STATE_FILE = "data/cache/pipeline/watch_state.json"  # Status of every PDF seen, survives crashes and restarts
+    WATCH_DEBOUNCE_SECONDS = 5  # A PDF is ingested once unchanged for this long, so half-copied files are skipped
+    WATCH_POLL_INTERVAL = 10  # Seconds between folder scans (the only change detection without watchdog)
+    WATCH_PUBLISH_INTERVAL = 60  # Least seconds between index versions published by the daemon
+    WATCH_MAX_ATTEMPTS = 3  # Failed PDFs are retried this many times, then only once modified
+    WATCH_STATUS_PORT = 8010  # GET /status: backlog, throughput and last published version
+
     # Retrieval Settings
-    TOP_K_RETRIEVAL = 3  # Number of top similar cases to retrieve
\ No newline at end of file
+    TOP_K_RETRIEVAL = 3  # Number of top similar cases to retrieve
+    LLM_MAX_CONCURRENCY = 4  # Parallel LLM calls in batch queries (ClinicalRAG.query_many)
+    LLM_REQUESTS_PER_MINUTE = 13  # LLM call rate for offline batch inference, within the Gemini quota (None = unlimited)
+    BATCH_INFERENCE_SIZE = 32  # Questions retrieved and written together by --stage batch
+    CONTEXT_TOKEN_BUDGET = 1200  # Approximate prompt tokens for the retrieved cases (None = no limit)
+    RETRIEVAL_P99_TARGET_MS = 10  # Latency target for retrieval-only lookups on the local index (embed + search)
+
+    # Index Sharding
+    INDEX_NUM_SHARDS = 1  # Split the FAISS index into N shards by case_id hash (1 = single index)
+    INDEX_SEARCH_WORKERS = 4  # Threads used to search the shards in parallel
+
+    # Index Versioning & Hot Reload
+    INDEX_VERSIONS_TO_KEEP = 3  # Published index versions kept on disk, older ones are garbage-collected
+    INDEX_RELOAD_INTERVAL = 30  # Seconds between checks for a newly published index version
+    INDEX_RELOAD_MAX_RESIDENT = 2  # Index copies allowed in memory during a swap (1 = unload old before loading new)
+    INDEX_MMAP = True  # Memory-map flat FAISS indexes (faiss >= 1.11) so processes share one copy in the page cache
+
+    # Quantized Search
+    INDEX_QUANTIZATION = None  # None (exact flat search), "binary" (1-bit Hamming) or "int8" (scalar quantized)
+    QUANTIZED_RERANK_FACTOR = 10  # Candidates re-scored with the float vectors per requested result
+
+    # Semantic Answer Cache
+    SEMANTIC_CACHE_ENABLED = True  # Reuse answers for near-duplicate queries that retrieve the same cases
+    SEMANTIC_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity between query embeddings for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES = 1000  # LRU capacity
+    SEMANTIC_CACHE_TTL = 24 * 3600  # Seconds before a cached answer expires
+    SEMANTIC_CACHE_DIR = "data/cache/semantic_cache"  # Persisted across restarts (None = memory only)
+
+    # Retrieval Cache
+    RETRIEVAL_CACHE_ENABLED = True  # Cache query embeddings and search results, invalidated per index version
+    RETRIEVAL_CACHE_MAX_MB = 64  # Memory budget shared by both cache levels (LRU)
+    RETRIEVAL_CACHE_DB = None  # SQLite file shared between processes, e.g. "data/cache/retrieval.sqlite"
+    RETRIEVAL_CACHE_DB_MAX_ENTRIES = 100000  # Rows kept per level in the SQLite file
+
+    # Cross-Encoder Re-ranking
+    RERANK_ENABLED = False  # Re-score a wider dense candidate set with a CPU cross-encoder
+    RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES = 50  # Dense candidates fetched for re-ranking
+    RERANK_TIME_BUDGET_MS = 150  # Fall back to the dense ranking when scoring takes longer
+    RERANK_CACHE_SIZE = 1024  # Re-ranked (query, candidate set) results kept in memory
+
+    # LLM Resilience
+    LLM_TIMEOUT_SECONDS = 30  # Deadline for one answer, then the retrieved cases are returned without it
+    LLM_HEDGE_ENABLED = False  # Send a second request when the first is slower than the hedge delay
+    LLM_HEDGE_DELAY_SECONDS = None  # Hedge delay, None = p95 of recent call latencies
+    LLM_BREAKER_FAILURES = 5  # Consecutive failures that stop calls to the LLM
+    LLM_BREAKER_RESET_SECONDS = 60  # Pause before a trial call is let through again
+
+    # API Server
+    API_HOST = "0.0.0.0"
+    API_PORT = 8000
+    API_WORKERS = int(os.getenv("API_WORKERS", 2))  # Worker processes, they share the index and model weights
+    API_URL = os.getenv("API_URL", "http://localhost:8000")  # Where the Streamlit app sends its requests
+    API_TIMEOUT_SECONDS = 60  # Streamlit client timeout, above LLM_TIMEOUT_SECONDS
+    API_MICRO_BATCHING = True  # Batch the embedding and search of concurrent API requests
+
+    # Tracing
+    TRACE_FILE = os.getenv("TRACE_FILE")  # Chrome trace JSON written when a run or API worker ends (None = tracing off)
+
+    # Admission Control (per API worker)
+    ADMISSION_MAX_CONCURRENT = 4  # Diagnosis requests generating at once
+    ADMISSION_QUEUE_DEPTH = 16  # Requests waiting for a slot, beyond that 503
+    ADMISSION_MAX_WAIT_SECONDS = 10  # Longest queue wait, requests expected to wait longer get a 503 up front
+    RATE_LIMIT_PER_MINUTE = 30  # Diagnosis requests per client (None = unlimited)
+    RATE_LIMIT_BURST = 5  # Requests a client may send at once
+    RETRIEVE_MAX_CONCURRENT = 8  # /retrieve searches at once, separate from the diagnosis slots
+    RETRIEVE_QUEUE_DEPTH = 64  # /retrieve requests waiting for a slot, beyond that 503
+    RETRIEVE_MAX_WAIT_SECONDS = 2  # Longest /retrieve queue wait
+    RETRIEVE_RATE_LIMIT_PER_MINUTE = 120  # /retrieve requests per client (None = unlimited)
+    RETRIEVE_RATE_LIMIT_BURST = 10  # /retrieve requests a client may send at once
+
+    # Query Micro-batching
+    MICRO_BATCH_MAX_SIZE = 32  # Most queries embedded and searched together
+    MICRO_BATCH_MAX_WAIT_MS = 2  # Longest a query waits for others to join its batch (0 = never wait)
+
+    # Evaluation
+    RELEVANCE_INDEX_FILE = "data/cache/relevance_index.pkl"  # Term -> case_ids index of the filtered corpus, rebuilt when it changes
+
+    # Benchmark History
+    BENCHMARK_HISTORY_FILE = "tests/results/benchmark_history.jsonl"  # Append-only record of benchmark and evaluation runs
+    BENCHMARK_REGRESSION_THRESHOLD = 5.0  # Percent a metric may get worse before compare fails
+    BENCHMARK_SIGNIFICANCE = 0.05  # p-value below which a change is not noise (Welch's t-test)
@@ -1,4 +1,7 @@
 import argparse
+import asyncio
+import json
+import os
 import sys
 from pathlib import Path
 
@@ -6,7 +9,14 @@ from src.extraction.pdf_extractor import ClinicalPDFExtractor
 from src.filtering.gemini_client import GeminiClient
 from src.embedding.embedder import ClinicalEmbedder
 from src.generation.rag_generator import ClinicalRAG
+from src.generation.batch_inference import BatchInference
+from src.pipeline.runner import PipelineRunner
+from src.pipeline.stages import default_stages
+from src.pipeline.streaming import StreamingIngestion
+from src.pipeline.watcher import IngestionDaemon
 from config.settings import Config
+from src.utils.metrics import METRICS, PIPELINE_STAGE
+from src.utils.tracing import TRACER, span
 
 
 def extract_stage():
@@ -25,20 +35,26 @@ def filter_stage():
     print(f"Filtered {len(filtered_cases)} cases")
 
 
-def embed_stage():
+def embed_stage(shard=None):
     """Create embeddings and build FAISS vector store"""
     print("Creating embeddings and vector store...")
     embedder = ClinicalEmbedder()
 
+    # Rebuild a single shard of an existing sharded index
+    if shard is not None:
+        embedder.rebuild_shard(shard, model_name=Config.TEXT_EMBEDDING_MODEL)
+        print(f"Shard {shard} rebuilt and saved")
+        return
+
     # Load filtered documents
     documents = embedder.load_filtered_as_document()
 
-    # Create vector store
-    vector_store = embedder.create_vector_store(documents, Config.TEXT_EMBEDDING_MODEL)
+    # Create the vector store (sharded and/or quantized as configured)
+    vector_store = embedder.create_index(documents, Config.TEXT_EMBEDDING_MODEL)
 
-    # Save vector store
-    embedder.save_vector_store(vector_store)
-    print("Vector store created and saved")
+    # Publish as a new immutable version, running apps pick it up on their next reload check
+    version = embedder.publish_vector_store(vector_store)
+    print(f"Vector store created and published as version {version}")
 
 
 def build_index_stage():
@@ -66,20 +82,117 @@ def query_stage(question):
         print(f"\n{i}. Case: {doc.metadata['case_id']}")
         print(f"   Content: {doc.page_content[:200]}...")
 
+    timing = result['timing']
+    if result['degraded']:
+        print(f"\nGeneration unavailable ({result['degraded']['reason']}): {result['degraded']['detail']}")
+    print(f"\nRetrieval: {timing['retrieval_seconds']:.2f}s | "
+          f"Generation: {timing['generation_seconds']:.2f}s | Total: {timing['total_seconds']:.2f}s")
+    if timing['semantic_cache_hit']:
+        print("Answer served from the semantic cache")
+
+
+def retrieve_stage(question):
+    """Retrieve similar cases only, without loading or calling the LLM"""
+    print(f"Retrieving similar cases: {question}")
+
+    rag = ClinicalRAG(retrieval_only=True)
+    result = rag.search(question)
+
+    print("\n" + "="*80)
+    print("SIMILAR CASES RETRIEVED:")
+    print("="*80)
+    for i, case in enumerate(result['cases'], 1):
+        print(f"\n{i}. Case: {case['case_id']} ({result['score_kind']}: {case['score']:.4f})")
+        if not case['matched_fields']:
+            print("   No field matches the query terms")
+        for field, items in case['matched_fields'].items():
+            print(f"   {field}: {', '.join(items)}")
+
+    timing = result['timing']
+    print(f"\nRetrieval: {timing['retrieval_seconds'] * 1000:.1f}ms | Total: {timing['total_seconds'] * 1000:.1f}ms")
+
+
+def batch_stage(input_path, output_path):
+    """Answer every question of a JSONL file, resuming after the ones already in the output"""
+    print(f"Batch inference: {input_path} -> {output_path}")
+
+    summary = BatchInference().run(input_path, output_path)
+
+    print(f"\nAnswered {summary['answered']} | Failed {summary['failed']} | "
+          f"Skipped (already answered) {summary['skipped']} | Time {summary['seconds']:.1f}s")
+
+
+def serve_stage(workers):
+    """Run the HTTP API with gunicorn, the workers share the index and model weights"""
+    print(f"Starting API on {Config.API_HOST}:{Config.API_PORT} with {workers} workers...")
+    # Replace this process with gunicorn, its config preloads the app before forking workers
+    os.execvp("gunicorn", ["gunicorn", "-c", "src/serving/gunicorn_conf.py", "--workers", str(workers),
+                           "src.serving.api:app"])
+
+
+def pipeline_stage(targets=None, force=False, dvc=Config.PIPELINE_DVC_ADD):
+    """Bring the DAG extract -> filter -> chunk -> embed up to date, recomputing only stale items"""
+    print("Running incremental pipeline...")
+    runner = PipelineRunner(default_stages(), dvc=dvc)
+    summary = runner.run(targets, force=force)
+    print(f"Pipeline done in {sum(result['seconds'] for result in summary.values()):.1f}s")
+    return summary
+
+
+def ingest_stage(input_path):
+    """Stream PDFs through extraction, filtering and indexing, all stages running concurrently"""
+    path = Path(input_path)
+    pdf_files = sorted(path.glob("*.pdf")) if path.is_dir() else [path]
+    print(f"Streaming ingestion of {len(pdf_files)} PDFs...")
+
+    report = asyncio.run(StreamingIngestion().run(pdf_files))
+    StreamingIngestion.print_report(report)
+    return report
+
+
+def watch_stage(watch_dir=None):
+    """Watch the case report folder and stream new or modified PDFs into the live index until stopped"""
+    asyncio.run(IngestionDaemon(watch_dir or Config.RAW_DATA_DIR).run())
+
 
 def run_full_pipeline():
     """Run the complete pipeline from PDFs to RAG system"""
     print("Running full Clinical RAG pipeline...")
 
-    extract_stage()
-    filter_stage()
-    embed_stage()
+    # Only new or changed PDFs are extracted, filtered and embedded again
+    pipeline_stage()
 
     # Test query
     test_question = "Patient with fever, bleeding, and recent travel to West Africa"
     query_stage(test_question)
 
 
+def run_stage(args):
+    """Run the stage picked on the command line"""
+    if args.stage == 'extract':
+        extract_stage()
+    elif args.stage == 'filter':
+        filter_stage()
+    elif args.stage in ['embed', 'index', 'build_index']:
+        embed_stage(args.shard)
+    elif args.stage == 'query':
+        query_stage(args.question)
+    elif args.stage == 'retrieve':
+        retrieve_stage(args.question)
+    elif args.stage == 'batch':
+        batch_stage(args.input, args.output)
+    elif args.stage == 'serve':
+        serve_stage(args.workers)
+    elif args.stage == 'ingest':
+        ingest_stage(args.input)
+    elif args.stage == 'watch':
+        watch_stage(args.input)
+    elif args.stage == 'pipeline':
+        pipeline_stage(args.targets, args.force, args.dvc)
+    elif args.stage == 'full':
+        run_full_pipeline()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Clinical RAG Pipeline - Medical Case Report Analysis System",
@@ -89,14 +202,25 @@ Examples:
   python main.py --stage extract          # Extract PDFs
   python main.py --stage filter           # Filter with Gemini
   python main.py --stage embed            # Create embeddings
+  python main.py --stage embed --shard 2  # Rebuild one shard of a sharded index
   python main.py --stage query --question "Patient with fever..."
+  python main.py --stage retrieve --question "Patient with fever..."  # Similar cases only, no LLM
+  python main.py --stage batch --input questions.jsonl --output answers.jsonl  # Resumable
+  python main.py --stage serve --workers 4  # Run the HTTP API
   python main.py --stage full             # Run complete pipeline
+  python main.py --stage pipeline         # Recompute only stale extract/filter/chunk/embed outputs
+  python main.py --stage pipeline --targets chunk --force  # Redo chunk (and upstream stale items)
+  python main.py --stage ingest --input new_reports/  # Stream new PDFs into the live index
+  python main.py --stage watch            # Ingest PDFs dropped into data/raw/case_reports until stopped
+  python main.py --stage batch --input q.jsonl --output a.jsonl --metrics-json metrics.json
+  python main.py --stage full --trace trace.json  # Open in ui.perfetto.dev or chrome://tracing
         """
     )
 
     parser.add_argument(
         "--stage",
-        choices=['extract', 'filter', 'embed', 'index', 'build_index', 'query', 'full'],
+        choices=['extract', 'filter', 'embed', 'index', 'build_index', 'query', 'retrieve', 'batch', 'serve',
+                 'pipeline', 'ingest', 'watch', 'full'],
         required=True,
         help="Pipeline stage to run"
     )
@@ -104,34 +228,98 @@ Examples:
     parser.add_argument(
         "--question",
         type=str,
-        help="Clinical question for RAG query (required for 'query' stage)"
+        help="Clinical question for RAG query (required for 'query' and 'retrieve' stages)"
+    )
+
+    parser.add_argument(
+        "--shard",
+        type=int,
+        help="Rebuild only this shard of a sharded index (optional for 'embed' stage)"
+    )
+
+    parser.add_argument(
+        "--input",
+        type=str,
+        help="JSONL file with one {\"id\": ..., \"question\": ...} per line (required for 'batch' stage), "
+             "or a PDF or folder of PDFs (required for 'ingest' stage, folder to watch for 'watch' stage)"
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="JSONL file the answers are appended to (required for 'batch' stage)"
+    )
+
+    parser.add_argument(
+        "--metrics-json",
+        type=str,
+        help="Write the latency histograms and counters of the run to this JSON file"
+    )
+
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=Config.TRACE_FILE,
+        help="Record spans (per PDF page, LLM request, embedding batch, query) into this Chrome trace file"
+    )
+
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=['extract', 'filter', 'chunk', 'embed'],
+        help="Pipeline stages to bring up to date, with their upstream stages (optional for 'pipeline' stage)"
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recompute every item of the pipeline stages, ignoring fingerprints (optional for 'pipeline' stage)"
+    )
+
+    parser.add_argument(
+        "--dvc",
+        action="store_true",
+        default=Config.PIPELINE_DVC_ADD,
+        help="Run `dvc add` on changed DVC-tracked outputs after the pipeline stage"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Config.API_WORKERS,
+        help="API worker processes (optional for 'serve' stage)"
     )
 
     args = parser.parse_args()
 
-    # Validate question for query stage
-    if args.stage == 'query' and not args.question:
-        parser.error("--question is required when using --stage query")
+    # Validate question for query stages
+    if args.stage in ['query', 'retrieve'] and not args.question:
+        parser.error(f"--question is required when using --stage {args.stage}")
+    if args.stage == 'batch' and not (args.input and args.output):
+        parser.error("--input and --output are required when using --stage batch")
+    if args.stage == 'ingest' and not args.input:
+        parser.error("--input is required when using --stage ingest")
+
+    if args.trace:
+        TRACER.enable()
 
     # Execute based on stage
     try:
-        if args.stage == 'extract':
-            extract_stage()
-        elif args.stage == 'filter':
-            filter_stage()
-        elif args.stage in ['embed', 'index', 'build_index']:
-            embed_stage()
-        elif args.stage == 'query':
-            query_stage(args.question)
-        elif args.stage == 'full':
-            run_full_pipeline()
-
+        with PIPELINE_STAGE.time(stage=args.stage), span("pipeline.stage", stage=args.stage):
+            run_stage(args)
     except Exception as e:
         print(f"Error in {args.stage} stage: {e}")
         sys.exit(1)
+    finally:
+        if args.metrics_json:
+            with open(args.metrics_json, "w") as f:
+                json.dump(METRICS.summary(), f, indent=2)
+            print(f"Metrics written to: {args.metrics_json}")
+        if args.trace:
+            TRACER.export(args.trace)
 
     print(f"\n{args.stage.title()} stage completed successfully!")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
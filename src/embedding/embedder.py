@@ -1,10 +1,20 @@
 from pathlib import Path
+from collections import defaultdict
 import json
 import os
+import pickle
+import shutil
+import faiss
 from langchain.docstore.document import Document
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 
+from config.settings import Config
+from src.indexing.sharded_store import ShardedVectorStore, SHARD_MANIFEST, shard_for_case, shard_dir_name
+from src.indexing.versioning import IndexVersionManager
+from src.indexing.quantized_store import QuantizedVectorStore, QUANTIZED_MANIFEST
+from src.utils.tracing import span
+
 # 1. Get the absolute path to THIS script file
 THIS_FILE = os.path.abspath(__file__)
 # 2. Get the directory this script is in
@@ -22,8 +32,11 @@ VECTOR_STORE_PATH = os.path.join(PROJECT_ROOT, "data", "vector", "clinical_faiss
 
 class ClinicalEmbedder:
 
-    def __init__(self):
-        self.filtered_dir = Path(FILTERED_DATA_PATH)
+    def __init__(self, filtered_dir=FILTERED_DATA_PATH):
+        """
+        :param filtered_dir: directory of the filtered JSON cases (e.g. a synthetic corpus).
+        """
+        self.filtered_dir = Path(filtered_dir)
 
     def load_filtered_cases(self):
         """
@@ -120,10 +133,11 @@ class ClinicalEmbedder:
         print(f"Created {len(documents)}")
         return documents
 
-    def create_vector_store(self, documents, model_name="all-MiniLM-L6-v2"):
+    def create_vector_store(self, documents, model_name="all-MiniLM-L6-v2", embeddings=None):
         """
         :param documents: Langchain documents,
         :param model_name: HuggingFace embedding model name
+        :param embeddings: already loaded embedding model (loaded from model_name if not given)
         :return: FAISS vector store
         """
         print(f"\n{'=' * 60}")
@@ -131,19 +145,61 @@ class ClinicalEmbedder:
         print(f"{'=' * 60}")
 
         # Embedding
-        embeddings = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={'device': 'cpu'}  # use CPU instead of cuda
-        )
+        embeddings = embeddings or self.load_embeddings(model_name)
 
         # Create FAISS vector store from documents.
         print(f"Embedding {len(documents)} documents...")
-        vector_store = FAISS.from_documents(documents, embeddings)
+        vector_store = self.build_faiss(documents, embeddings)
 
         print(f"Vector store created with {len(documents)} vectors")
 
         return vector_store
 
+    def create_index(self, documents, model_name="all-MiniLM-L6-v2", embeddings=None):
+        """
+        :param documents: Langchain documents,
+        :param model_name: HuggingFace embedding model name
+        :param embeddings: already loaded embedding model (loaded from model_name if not given)
+        :return: the vector store as configured: sharded if INDEX_NUM_SHARDS > 1, quantized if INDEX_QUANTIZATION
+        """
+        if Config.INDEX_NUM_SHARDS > 1:
+            vector_store = self.create_sharded_vector_store(documents, Config.INDEX_NUM_SHARDS, model_name, embeddings)
+        else:
+            vector_store = self.create_vector_store(documents, model_name, embeddings)
+
+        # Optional compressed first-pass search with exact re-ranking
+        if Config.INDEX_QUANTIZATION:
+            vector_store = self.quantize_vector_store(vector_store)
+        return vector_store
+
+    def build_faiss(self, documents, embeddings, batch_size=Config.EMBED_BATCH_SIZE):
+        """
+        :param documents: Langchain documents
+        :param embeddings: loaded embedding model
+        :param batch_size: documents embedded per model call
+        :return: FAISS vector store, as FAISS.from_documents builds it
+        """
+        if not documents:
+            raise ValueError("No documents to index")
+
+        # Each batch is added as soon as it is embedded: at millions of cases, holding every
+        # vector as Python floats until the end would take several times the index's memory.
+        vector_store = None
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            texts = [doc.page_content for doc in batch]
+            with span("embed.batch", documents=len(batch), chars=sum(len(text) for text in texts)):
+                vectors = embeddings.embed_documents(texts)
+
+            with span("index.add", vectors=len(vectors)):
+                text_embeddings = list(zip(texts, vectors))
+                metadatas = [doc.metadata for doc in batch]
+                if vector_store is None:
+                    vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+                else:
+                    vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+        return vector_store
+
     def save_vector_store(self, vector_store, save_path=VECTOR_STORE_PATH):
         """
         :param vector_store: vectorized data
@@ -155,23 +211,230 @@ class ClinicalEmbedder:
                         exist_ok=True)
 
         vector_store.save_local(save_path)
+
+        # A leftover manifest would make load_vector_store pick up old files instead.
+        (save_path / SHARD_MANIFEST).unlink(missing_ok=True)
+        if not isinstance(vector_store, QuantizedVectorStore):
+            (save_path / QUANTIZED_MANIFEST).unlink(missing_ok=True)
         print(f" Vector store saved to: {save_path}")
 
-    def load_vector_store(self, load_path=VECTOR_STORE_PATH, model_name="all-MiniLM-L6-v2"):
+    def load_vector_store(self, load_path=VECTOR_STORE_PATH, model_name="all-MiniLM-L6-v2", embeddings=None):
         """
         :param model_name: The model used to embed
         :param load_path: The direction of the local disk
+        :param embeddings: An already loaded embedding model to reuse (e.g. on hot reload)
         :return: Load the existing FAISS vector from the disk.
         """
-        embeddings = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={'device': 'cpu'}
-        )
+        if embeddings is None:
+            embeddings = self.load_embeddings(model_name)
+
+        # Versioned indexes keep the live copy under versions/<CURRENT>.
+        load_path = IndexVersionManager(load_path).resolve()
 
-        vector_store = FAISS.load_local(load_path, embeddings)
+        with span("index.load", path=str(load_path)):
+            # A sharded index is a directory of independent FAISS stores plus a manifest.
+            if (Path(load_path) / SHARD_MANIFEST).exists():
+                return self.load_sharded_vector_store(load_path, embeddings)
+
+            vector_store = self._load_store_dir(load_path, embeddings)
         print(f" Vector store loaded from: {load_path}")
         return vector_store
 
+    def quantize_vector_store(self, vector_store, mode=Config.INDEX_QUANTIZATION,
+                              rerank_factor=Config.QUANTIZED_RERANK_FACTOR):
+        """
+        :param vector_store: flat FAISS store or ShardedVectorStore of flat stores
+        :param mode: "binary" (1-bit Hamming codes) or "int8" (scalar quantizer)
+        :param rerank_factor: candidates re-scored exactly per requested result
+        :return: the same index with a two-stage quantized search
+        """
+        print(f"Quantizing vector store ({mode} codes, exact re-ranking of {rerank_factor}x candidates)...")
+        if isinstance(vector_store, ShardedVectorStore):
+            shards = {
+                shard_id: QuantizedVectorStore.from_faiss(shard, mode, rerank_factor)
+                for shard_id, shard in vector_store.shards.items()
+            }
+            return ShardedVectorStore(shards, vector_store.embeddings, vector_store.num_shards,
+                                      num_workers=Config.INDEX_SEARCH_WORKERS)
+        return QuantizedVectorStore.from_faiss(vector_store, mode, rerank_factor)
+
+    def publish_vector_store(self, vector_store, root=VECTOR_STORE_PATH, keep=Config.INDEX_VERSIONS_TO_KEEP):
+        """
+        :param vector_store: FAISS or ShardedVectorStore to publish
+        :param root: the versioned index directory
+        :param keep: number of versions to keep on disk after publishing
+        :return: the new version name. Readers switch to it atomically.
+        """
+        versions = IndexVersionManager(root)
+        staging_dir = versions.create_staging_dir()
+
+        with span("index.publish") as publish_span:
+            try:
+                if isinstance(vector_store, ShardedVectorStore):
+                    self.save_sharded_vector_store(vector_store, staging_dir)
+                else:
+                    self.save_vector_store(vector_store, staging_dir)
+                version = versions.publish(staging_dir)
+            except BaseException:
+                shutil.rmtree(staging_dir, ignore_errors=True)  # A failed save leaves no partial version behind
+                raise
+            versions.garbage_collect(keep)
+            publish_span.set(version=version)
+        return version
+
+    def create_sharded_vector_store(self, documents, num_shards=Config.INDEX_NUM_SHARDS, model_name="all-MiniLM-L6-v2",
+                                    embeddings=None):
+        """
+        :param documents: Langchain documents,
+        :param num_shards: number of shards, cases are assigned by case_id hash
+        :param model_name: HuggingFace embedding model name
+        :param embeddings: already loaded embedding model (loaded from model_name if not given)
+        :return: ShardedVectorStore holding one FAISS store per non-empty shard
+        """
+        print(f"\n{'=' * 60}")
+        print(f"Creating {num_shards} shards using: {model_name}")
+        print(f"{'=' * 60}")
+
+        embeddings = embeddings or self.load_embeddings(model_name)
+
+        # Group the documents by the shard that owns their case.
+        grouped = defaultdict(list)
+        for doc in documents:
+            grouped[shard_for_case(doc.metadata["case_id"], num_shards)].append(doc)
+
+        shards = {}
+        for shard_id in sorted(grouped):
+            print(f"Embedding shard {shard_id} ({len(grouped[shard_id])} documents)...")
+            shards[shard_id] = self.build_faiss(grouped[shard_id], embeddings)
+
+        vector_store = ShardedVectorStore(shards, embeddings, num_shards, num_workers=Config.INDEX_SEARCH_WORKERS)
+        print(f"Sharded vector store created with {len(documents)} vectors in {len(shards)} shards")
+        return vector_store
+
+    def save_sharded_vector_store(self, vector_store, save_path=VECTOR_STORE_PATH):
+        """
+        :param vector_store: ShardedVectorStore to save
+        :param save_path: the direction for saving the shard directories and manifest
+        :return: Saves every shard to its own sub directory.
+        """
+        save_path = Path(save_path)
+        save_path.mkdir(parents=True,
+                        exist_ok=True)
+
+        for shard_id, shard in vector_store.shards.items():
+            shard.save_local(save_path / shard_dir_name(shard_id))
+
+        manifest = {
+            "num_shards": vector_store.num_shards,
+            "shards": {str(shard_id): len(shard.index_to_docstore_id) for shard_id, shard in vector_store.shards.items()}
+        }
+        self._write_shard_manifest(save_path, manifest)
+        print(f" Sharded vector store saved to: {save_path}")
+
+    def load_sharded_vector_store(self, load_path, embeddings):
+        """
+        :param load_path: the direction of the shard directories and manifest
+        :param embeddings: the embedding model shared by every shard
+        :return: ShardedVectorStore with every shard listed in the manifest.
+        """
+        manifest = self._read_shard_manifest(load_path)
+
+        shards = {}
+        for shard_id in manifest["shards"]:
+            shards[int(shard_id)] = self._load_store_dir(Path(load_path) / shard_dir_name(int(shard_id)), embeddings)
+
+        vector_store = ShardedVectorStore(shards, embeddings, manifest["num_shards"],
+                                          num_workers=Config.INDEX_SEARCH_WORKERS)
+        print(f" Sharded vector store loaded from: {load_path} ({len(shards)} shards)")
+        return vector_store
+
+    def rebuild_shard(self, shard_id, save_path=VECTOR_STORE_PATH, model_name="all-MiniLM-L6-v2"):
+        """
+        :param shard_id: the shard number to rebuild
+        :param save_path: the direction of an existing sharded vector store
+        :param model_name: HuggingFace embedding model name
+        :return: Re-embeds only the cases owned by this shard. A versioned index gets a
+                 new version (published versions are never modified in place).
+        """
+        versions = IndexVersionManager(save_path)
+        versioned = versions.current_version() is not None
+        shard_root = versions.resolve()
+
+        manifest = self._read_shard_manifest(shard_root)
+        num_shards = manifest["num_shards"]
+        if not 0 <= shard_id < num_shards:
+            raise ValueError(f"Shard {shard_id} does not exist, index has {num_shards} shards")
+
+        documents = [
+            doc for doc in self.load_filtered_as_document()
+            if shard_for_case(doc.metadata["case_id"], num_shards) == shard_id
+        ]
+        if not documents:
+            raise ValueError(f"No cases are assigned to shard {shard_id}")
+
+        staging_dir = versions.create_staging_dir() if versioned else None
+        try:
+            if versioned:
+                # Start the new version from a copy of the current one, other shards stay as they are.
+                shutil.copytree(shard_root, staging_dir, dirs_exist_ok=True)
+                shard_root = staging_dir
+
+            print(f"Rebuilding shard {shard_id} with {len(documents)} documents...")
+            shard = self.build_faiss(documents, self.load_embeddings(model_name))
+            if Config.INDEX_QUANTIZATION:
+                shard = QuantizedVectorStore.from_faiss(shard, Config.INDEX_QUANTIZATION,
+                                                        Config.QUANTIZED_RERANK_FACTOR)
+
+            shard_dir = Path(shard_root) / shard_dir_name(shard_id)
+            shutil.rmtree(shard_dir, ignore_errors=True)  # Drop files of the previous (maybe differently quantized) shard
+            shard.save_local(shard_dir)
+
+            manifest["shards"][str(shard_id)] = len(shard.index_to_docstore_id)
+            self._write_shard_manifest(shard_root, manifest)
+            print(f" Shard {shard_id} saved to: {Path(shard_root) / shard_dir_name(shard_id)}")
+
+            if versioned:
+                versions.publish(shard_root)
+                versions.garbage_collect(Config.INDEX_VERSIONS_TO_KEEP)
+        except BaseException:
+            if staging_dir is not None:
+                shutil.rmtree(staging_dir, ignore_errors=True)  # A failed rebuild leaves no index copy behind
+            raise
+
+    def load_embeddings(self, model_name="all-MiniLM-L6-v2"):
+        """
+        :param model_name: HuggingFace embedding model name
+        :return: the embedding model, running on CPU.
+        """
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': 'cpu'}  # use CPU instead of cuda
+        )
+
+    def _load_store_dir(self, path, embeddings):
+        # Quantized stores write their own manifest, everything else is a flat FAISS store.
+        if (Path(path) / QUANTIZED_MANIFEST).exists():
+            return QuantizedVectorStore.load_local(path, embeddings)
+        if Config.INDEX_MMAP and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            return self._load_faiss_mmap(path, embeddings)
+        return FAISS.load_local(path, embeddings)
+
+    def _load_faiss_mmap(self, path, embeddings):
+        # Zero-copy load (faiss >= 1.11): the vectors stay in the OS page cache, so every process
+        # mapping the same version shares one copy. The index is read-only, never add() to it.
+        index = faiss.read_index(str(Path(path) / "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        with open(Path(path) / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    def _read_shard_manifest(self, path):
+        with open(Path(path) / SHARD_MANIFEST, 'r') as f:
+            return json.load(f)
+
+    def _write_shard_manifest(self, path, manifest):
+        with open(Path(path) / SHARD_MANIFEST, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
 
 if __name__ == "__main__":
     embedder = ClinicalEmbedder()
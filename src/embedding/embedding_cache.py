@@ -0,0 +1,62 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with an SQLite cache of document vectors keyed by the text hash
+    and the model name, so rebuilding an index only embeds the documents that changed.
+    Queries are passed through uncached.
+    """
+
+    def __init__(self, embeddings, db_path, model_name):
+        """
+        :param embeddings: the embedding model doing the actual work.
+        :param db_path: SQLite file holding the vectors.
+        :param model_name: part of the key, vectors of another model are never reused.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB)")
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        """
+        :param texts: documents to embed.
+        :return: their vectors, from the cache where possible.
+        """
+        keys = [self._key(text) for text in texts]
+        cached = {}
+        for start in range(0, len(keys), 500):  # Stay below SQLite's bound parameter limit
+            batch = keys[start:start + 500]
+            rows = self.db.execute(f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(batch))})",
+                                   batch).fetchall()
+            cached.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            rows = []
+            for i, vector in zip(missing, vectors):
+                cached[keys[i]] = list(vector)
+                rows.append((keys[i], np.asarray(vector, dtype=np.float32).tobytes()))
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)", rows)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
@@ -3,6 +3,8 @@ from pathlib import Path
 import fitz
 import json
 
+from src.utils.tracing import span
+
 
 class ClinicalPDFExtractor:
 
@@ -26,6 +28,19 @@ class ClinicalPDFExtractor:
         case_dir.mkdir(exist_ok=True)  # Create the directory if it does not exist.
         print(f"the data path is :{pdf_path}")
         print(f"the type of data path: {type(pdf_path)}")
+        with span("extract.pdf", case_id=pdf_name, bytes=Path(pdf_path).stat().st_size) as pdf_span:
+            case_data = self._extract_pages(pdf_path, pdf_name, case_dir)
+            pdf_span.set(pages=len(case_data['pages']))
+
+        # Save the metadata.
+        metadata_path = case_dir / "metadata.json"
+        with open(metadata_path, "w") as f:
+            json.dump(case_data, f, indent=2)
+            # json.dump() write an object case_data into a file as JSON text
+            # indent=2 makes it formatted and readable (2- indentation)
+        return case_data
+
+    def _extract_pages(self, pdf_path, pdf_name, case_dir):
         doc = fitz.open(pdf_path)
 
         # Store the case data.
@@ -36,47 +51,45 @@ class ClinicalPDFExtractor:
         }
 
         for page_num, page in enumerate(doc):
-            # Store the page information
-            page_data = {
-                'page_number': page_num + 1,
-                'text': '',
-                'image': []
-            }
-
-            # Get text from the page.
-            text = page.get_text()
-            page_data['text'] = text.strip()
-
-            # Get image from the page.
-            image_list = page.get_images()
-            for img_index, img in enumerate(image_list):
-                x_ref = img[0]  # The image's reference ID
-                base_image = doc.extract_image(x_ref)  # Extract the image bytes and metadata.
-                image_bytes = base_image["image"]  # Actual binary image data
-                image_ext = base_image["ext"]  # file extension: jpg or png
-
-                # Save the image
-                image_filename = f"page{page_num + 1}_image {img_index + 1}.{image_ext}"
-                image_path = case_dir / image_filename
-
-                with open(image_path, "wb") as img_file:
-                    img_file.write(image_bytes)
-
-                page_data['image'].append({
-                    'filename': image_filename,
-                    'path': str(image_path),
-                    'page': page_num + 1
-                })
-            case_data['pages'].append(page_data)  # Add case_data into page_data.
+            page_span = span("extract.page", case_id=pdf_name, page=page_num + 1)
+            with page_span:
+                # Store the page information
+                page_data = {
+                    'page_number': page_num + 1,
+                    'text': '',
+                    'image': []
+                }
+
+                # Get text from the page.
+                text = page.get_text()
+                page_data['text'] = text.strip()
+
+                # Get image from the page.
+                image_bytes_total = 0
+                image_list = page.get_images()
+                for img_index, img in enumerate(image_list):
+                    x_ref = img[0]  # The image's reference ID
+                    base_image = doc.extract_image(x_ref)  # Extract the image bytes and metadata.
+                    image_bytes = base_image["image"]  # Actual binary image data
+                    image_ext = base_image["ext"]  # file extension: jpg or png
+                    image_bytes_total += len(image_bytes)
+
+                    # Save the image
+                    image_filename = f"page{page_num + 1}_image {img_index + 1}.{image_ext}"
+                    image_path = case_dir / image_filename
+
+                    with open(image_path, "wb") as img_file:
+                        img_file.write(image_bytes)
+
+                    page_data['image'].append({
+                        'filename': image_filename,
+                        'path': str(image_path),
+                        'page': page_num + 1
+                    })
+                case_data['pages'].append(page_data)  # Add case_data into page_data.
+                page_span.set(chars=len(page_data['text']), images=len(image_list), image_bytes=image_bytes_total)
 
         doc.close()
-
-        # Save the metadata.
-        metadata_path = case_dir / "metadata.json"
-        with open(metadata_path, "w") as f:
-            json.dump(case_data, f, indent=2)
-            # json.dump() write an object case_data into a file as JSON text
-            # indent=2 makes it formatted and readable (2- indentation)
         return case_data
 
     def extract_all_report(self, reports_dir="data/raw/case_reports"):
@@ -1,10 +1,13 @@
 from pathlib import Path
+import asyncio
 import time
 import google.generativeai as genai
 from torch.nn.utils import remove_spectral_norm
 import json
 
 from config.settings import Config
+from src.utils.metrics import ERRORS
+from src.utils.tracing import span
 
 
 class GeminiClient:
@@ -14,6 +17,7 @@ class GeminiClient:
         genai.configure(api_key=Config.GOOGLE_API_KEY)  # Call api key from the Config class.
         self.model = genai.GenerativeModel(
             Config.GEMINI_MODEL)  # Call the Gemini model, we can replace another Google model
+        self.request_count = 0  # Count for requested times, shared by all cases of the run.
 
     def generate_response(self, prompt):
         response = self.model.generate_content(prompt)
@@ -94,7 +98,18 @@ Return ONLY a valid, minified JSON object based on the schema below. Do not add
 
         prompt = self.create_filter_prompt(text)
         response = self.generate_response(prompt)
+        return self.clean_response(response)
 
+    async def afilter_single_page_text(self, text):
+        """
+
+        :param text: page text
+        :return: the cleaned response, without blocking the event loop
+        """
+        response = await self.model.generate_content_async(self.create_filter_prompt(text))
+        return self.clean_response(response.text)
+
+    def clean_response(self, response):
         # Remove Markdown code blocks
         cleaned_response = response.strip()
         if cleaned_response.startswith('```json'):
@@ -116,56 +131,116 @@ Return ONLY a valid, minified JSON object based on the schema below. Do not add
         all_cases = self.filter_text_data()
 
         filtered_cases = []
-        request_count = 0  # Count for requested times.
 
         for case in all_cases:
-            print(f"\nProcessing case: {case['pdf_name']}")
-
-            case_data = {
-                "case_id": case['pdf_name'],
-                "diseases": [],
-                "symptoms": [],
-                "vital_signs": [],
-                "anatomical_terms": [],
-                "laboratory_findings": [],
-                "treatments": [],
-                "pathogens": [],
-                "procedures": [],
-                "misc_medical_terms": [],
-                "patient_history": "",
-                "risk_factors": []
-            }
-
-            for page in case["pages"]:
-                page_text = page["text"]
-
-                if page_text.strip():
-                    print(f"\nProcessing page number: {page['page_number']} ...")
-                    if request_count > 0 and request_count % 15 == 0:
-                        print("Waiting 60 seconds to avoid rate limit...")
+            case_data = self.filter_case(case)
+            self.save_filtered_case(case_data)
+
+            filtered_cases.append(case_data)
+
+        return filtered_cases
+
+    def filter_case(self, case):
+        """
+
+        :param case: one extracted case, as read from its metadata.json
+        :return: the filtered data of all its pages, merged
+        """
+        print(f"\nProcessing case: {case['pdf_name']}")
+
+        case_data = self.new_case_data(case['pdf_name'])
+
+        for page in case["pages"]:
+            page_text = page["text"]
+
+            if page_text.strip():
+                print(f"\nProcessing page number: {page['page_number']} ...")
+                if self.request_count > 0 and self.request_count % 15 == 0:
+                    print("Waiting 60 seconds to avoid rate limit...")
+                    with span("filter.rate_limit_wait", case_id=case['pdf_name'], seconds=60):
                         time.sleep(60)
 
-                    # Get responses filtered by LLM model.
+                # Get responses filtered by LLM model.
+                with span("filter.request", case_id=case['pdf_name'], page=page['page_number'],
+                          input_chars=len(page_text)) as request_span:
                     filtered_response = self.filter_single_page_text(page_text)
-                    request_count += 1
+                    request_span.set(output_chars=len(filtered_response))
+                self.request_count += 1
 
-                    try:
-                        page_data = json.loads(filtered_response)
-                        case_data = self.merge_filtered_data(case_data, page_data)
+                case_data = self.merge_filtered_response(case_data, filtered_response)
 
+                with span("filter.rate_limit_wait", case_id=case['pdf_name'], seconds=4.5):
+                    time.sleep(4.5)
 
+        return case_data
 
-                    # Manage situations where the input JSON is invalid instead of crashing the program.
-                    except json.JSONDecodeError as e:
-                        print(f"Error parsing JSON: {e}")
-                        print(filtered_response)  # See what is LLM actually returning
+    async def afilter_case(self, case, rate_limiter=None):
+        """
 
-                    time.sleep(4.5)
-            self.save_filtered_case(case_data)
+        :param case: one extracted case, as read from its metadata.json
+        :param rate_limiter: TokenBucket shared by all concurrent cases, paces the requests
+        :return: the filtered data of all its pages, merged. The pages are sent concurrently,
+            so a case takes about one request round trip.
+        """
+        pages = [page for page in case["pages"] if page["text"].strip()]
+
+        async def filter_page(page):
+            if rate_limiter is not None:
+                with span("filter.rate_limit_wait", case_id=case['pdf_name']):
+                    await rate_limiter.acquire_async()
+            with span("filter.request", case_id=case['pdf_name'], page=page['page_number'],
+                      input_chars=len(page["text"])) as request_span:
+                filtered_response = await self.afilter_single_page_text(page["text"])
+                request_span.set(output_chars=len(filtered_response))
+            self.request_count += 1
+            return filtered_response
+
+        responses = await asyncio.gather(*(filter_page(page) for page in pages))
+
+        case_data = self.new_case_data(case['pdf_name'])
+        for filtered_response in responses:  # Merged in page order
+            case_data = self.merge_filtered_response(case_data, filtered_response)
+        return case_data
+
+    def new_case_data(self, case_id):
+        """
 
-            filtered_cases.append(case_data)
+        :param case_id: the case (PDF) name
+        :return: an empty filtered case
+        """
+        return {
+            "case_id": case_id,
+            "diseases": [],
+            "symptoms": [],
+            "vital_signs": [],
+            "anatomical_terms": [],
+            "laboratory_findings": [],
+            "treatments": [],
+            "pathogens": [],
+            "procedures": [],
+            "misc_medical_terms": [],
+            "patient_history": "",
+            "risk_factors": []
+        }
+
+    def merge_filtered_response(self, case_data, filtered_response):
+        """
 
-        return filtered_cases
+        :param case_data: accumulated data for the case
+        :param filtered_response: the cleaned LLM response for one page
+        :return: the merged data, unchanged if the response is not valid JSON
+        """
+        try:
+            page_data = json.loads(filtered_response)
+            case_data = self.merge_filtered_data(case_data, page_data)
+
+        # Manage situations where the input JSON is invalid instead of crashing the program.
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON: {e}")
+            ERRORS.inc(stage="filter", reason="invalid_json")
+            print(filtered_response)  # See what is LLM actually returning
+
+        return case_data
 
     def merge_filtered_data(self, existing_data, new_page_data):
         """
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from itertools import islice
+
+from config.settings import Config
+from src.generation.rag_generator import ClinicalRAG
+from src.utils.rate_limit import TokenBucket
+
+ID_FIELDS = ("id", "question_id", "request_id")  # First one present is the question id
+QUESTION_FIELDS = ("question", "query", "body")  # First one present is the question text
+
+
+def read_questions(path, warn=True):
+    """
+    Stream questions from a JSONL file without loading it.
+
+    :param path: JSONL file, one object per line with an id and a question field.
+    :param warn: print the lines skipped for having no question.
+    :return: generator of (question_id, question, record). Lines without an id use their line number.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = next((record[field] for field in QUESTION_FIELDS if record.get(field)), None)
+            if question is None:
+                if warn:
+                    print(f"Skipping line {line_number}: no {' / '.join(QUESTION_FIELDS)} field")
+                continue
+            question_id = next((record[field] for field in ID_FIELDS if field in record), line_number)
+            yield str(question_id), question, record
+
+
+def completed_ids(path):
+    """
+    :param path: output JSONL of an earlier run.
+    :return: ids answered without error. Failed questions are retried, the last line per id wins.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Line cut short by an interrupted run
+            if record.get("error") is None:
+                done.add(record["id"])
+            else:
+                done.discard(record["id"])
+    return done
+
+
+class BatchInference:
+    """
+    Answers a JSONL file of questions offline: retrieval is batched, the LLM calls run with
+    bounded concurrency under a requests-per-minute limit, and each batch is appended to the
+    output as soon as it is done, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, rag=None, batch_size=Config.BATCH_INFERENCE_SIZE,
+                 max_concurrency=Config.LLM_MAX_CONCURRENCY, requests_per_minute=Config.LLM_REQUESTS_PER_MINUTE):
+        """
+        :param rag: ClinicalRAG to use (created if not given).
+        :param batch_size: questions retrieved together and written together.
+        :param max_concurrency: LLM calls in flight.
+        :param requests_per_minute: LLM call rate limit (None = unlimited).
+        """
+        self.rag = rag or ClinicalRAG()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = None
+        if requests_per_minute:
+            self.rate_limiter = TokenBucket(requests_per_minute / 60, max(1, max_concurrency))
+
+    def run(self, input_path, output_path):
+        """
+        :param input_path: questions JSONL.
+        :param output_path: answers JSONL, appended to (questions already answered there are skipped).
+        :return: summary dict with answered, failed, skipped and seconds.
+        """
+        done = completed_ids(output_path)
+        # Counted from the questions actually read: answered ids no longer in the input and
+        # lines without a question are neither skipped nor remaining.
+        total = skipped = 0
+        for question_id, _, _ in read_questions(input_path):
+            total += 1
+            skipped += question_id in done
+        remaining = total - skipped
+        print(f"{total} questions, {skipped} already answered, {remaining} to go")
+
+        pending = (item for item in read_questions(input_path, warn=False) if item[0] not in done)
+        start = time.perf_counter()
+        answered = failed = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path, "a", encoding="utf-8") as out:
+            while True:
+                batch = list(islice(pending, self.batch_size))
+                if not batch:
+                    break
+
+                results = self.rag.query_many([question for _, question, _ in batch],
+                                              max_concurrency=self.max_concurrency, rate_limiter=self.rate_limiter)
+                for (question_id, _, record), result in zip(batch, results):
+                    out.write(json.dumps(self.to_record(question_id, record, result)) + "\n")
+                    failed += result["error"] is not None
+                out.flush()
+                os.fsync(out.fileno())  # A batch on disk is never redone after a crash
+
+                answered += len(batch)
+                elapsed = time.perf_counter() - start
+                rate = answered / elapsed
+                eta = (remaining - answered) / rate if rate else 0
+                print(f"{answered}/{remaining} | {rate:.2f} q/s | {failed} failed | "
+                      f"elapsed {self.format_seconds(elapsed)} | ETA {self.format_seconds(eta)}")
+
+        return {
+            "answered": answered - failed,
+            "failed": failed,
+            "skipped": skipped,
+            "seconds": time.perf_counter() - start
+        }
+
+    @staticmethod
+    def to_record(question_id, record, result):
+        """
+        :param question_id: id of the question.
+        :param record: the input line, extra fields (e.g. expected diagnosis) are kept.
+        :param result: the query_many result for it.
+        :return: JSON-ready output line.
+        """
+        return {
+            **record,
+            "id": question_id,
+            "result": result["result"],
+            "case_ids": [doc.metadata["case_id"] for doc in result["source_documents"]],
+            "context_tokens": result["context_tokens"],
+            "degraded": result["degraded"],
+            "timing": result["timing"],
+            "error": result["error"]
+        }
+
+    @staticmethod
+    def format_seconds(seconds):
+        hours, rest = divmod(int(seconds), 3600)
+        minutes, seconds = divmod(rest, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,122 @@
+import math
+
+# Field labels written by ClinicalEmbedder.prepare_text_for_embedding, most useful for diagnosis first.
+# When the budget runs out, fields at the end of this list are trimmed first.
+FIELD_PRIORITY = [
+    "Diseases",
+    "Symptoms",
+    "Risk Factors",
+    "Pathogens",
+    "Laboratory Findings",
+    "Patient History",
+    "Vital Signs",
+    "Treatments",
+    "Procedures",
+]
+TEXT_FIELDS = {"Patient History"}  # Free text, every other field is a comma separated list
+
+
+def estimate_tokens(text):
+    """
+    :param text: any prompt text.
+    :return: approximate token count (about 4 characters per token for English text).
+    """
+    return math.ceil(len(text) / 4) if text else 0
+
+
+class ContextBuilder:
+    """
+    Packs retrieved cases into the prompt context under a token budget.
+    Fields are ranked (diagnoses and symptoms first), repeated entities are removed within
+    and across cases, and lower ranked fields are trimmed when the budget is reached.
+    """
+
+    def __init__(self, token_budget=1200, field_priority=None):
+        """
+        :param token_budget: maximum approximate tokens for the whole context (None = no limit).
+        :param field_priority: field labels in the order they are kept.
+        """
+        self.token_budget = token_budget
+        self.field_priority = field_priority or FIELD_PRIORITY
+
+    def parse_case(self, page_content):
+        """
+        :param page_content: text of one case document ("Label: value" lines).
+        :return: dict of field label -> list of items (Patient History -> [text]).
+        """
+        fields = {}
+        current = None
+        for line in page_content.split("\n"):
+            label, _, value = line.partition(": ")
+            if label in self.field_priority:
+                current = label
+                fields[current] = []
+            elif current is None:
+                continue
+            else:
+                value = line  # Continuation of a multi-line field (patient history pages)
+
+            if current in TEXT_FIELDS:
+                if value.strip():
+                    fields[current].append(value.strip())
+            else:
+                fields[current].extend(item.strip() for item in value.split(",") if item.strip())
+        return fields
+
+    def build(self, docs):
+        """
+        :param docs: retrieved Langchain documents, best match first.
+        :return: dict with the packed context 'text', its estimated 'tokens' and
+                 'raw_tokens' (what pasting the whole cases would have cost).
+        """
+        parsed = [self.parse_case(doc.page_content) for doc in docs]
+        headers = [f"Case {doc.metadata.get('case_id', i + 1)}:" for i, doc in enumerate(docs)]
+
+        remaining = None
+        if self.token_budget is not None:
+            remaining = self.token_budget - sum(estimate_tokens(header) + 1 for header in headers)
+
+        # Fill field by field across all cases, so the 3rd case's diagnoses beat the 1st case's procedures.
+        packed = [{} for _ in docs]
+        seen = {}
+        for field in self.field_priority:
+            seen_in_field = seen.setdefault(field, set())
+            for case_index, fields in enumerate(parsed):
+                for item in fields.get(field, []):
+                    key = item.lower()
+                    if key in seen_in_field:
+                        continue  # merge_filtered_data keeps every page's copy of an entity
+                    line_start = field not in packed[case_index]
+                    cost = estimate_tokens(f"{field}: {item}" if line_start else f", {item}")
+                    if remaining is not None and cost > remaining:
+                        if field in TEXT_FIELDS and remaining > 8:
+                            item = self._truncate(item, remaining - estimate_tokens(f"{field}: "))
+                            cost = remaining
+                        else:
+                            continue  # A shorter item further down may still fit
+                    seen_in_field.add(key)
+                    packed[case_index].setdefault(field, []).append(item)
+                    if remaining is not None:
+                        remaining -= cost
+
+        blocks = []
+        for header, fields in zip(headers, packed):
+            lines = [header]
+            for field in self.field_priority:
+                if field in fields:
+                    separator = " " if field in TEXT_FIELDS else ", "
+                    lines.append(f"{field}: {separator.join(fields[field])}")
+            blocks.append("\n".join(lines))
+
+        text = "\n\n".join(blocks)
+        return {
+            "text": text,
+            "tokens": estimate_tokens(text),
+            "raw_tokens": estimate_tokens("\n\n".join(doc.page_content for doc in docs))
+        }
+
+    @staticmethod
+    def _truncate(text, max_tokens):
+        # Cut on a word boundary to roughly max_tokens.
+        cut = text[:max(0, max_tokens * 4 - 3)]
+        return cut.rsplit(" ", 1)[0] + "..."
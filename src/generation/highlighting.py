@@ -0,0 +1,62 @@
+import re
+
+from src.generation.context_builder import ContextBuilder, TEXT_FIELDS
+
+# Query words too common to count as a match.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "he", "her",
+    "his", "in", "is", "it", "of", "on", "or", "she", "that", "the", "their", "they", "this", "to",
+    "was", "were", "what", "which", "who", "with", "patient", "could", "diagnosis", "recent", "days",
+    "year", "years", "old", "male", "female", "presents", "presenting"
+}
+MIN_TERM_LENGTH = 3
+SNIPPET_CHARS = 80  # Context kept on each side of the first match in free text fields
+
+_parser = ContextBuilder()
+
+
+def query_terms(query):
+    """
+    :param query: the clinician's query text.
+    :return: lowercased query words worth matching, in query order without duplicates.
+    """
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", query.lower()):
+        if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def highlight_matches(query, page_content, marker="**"):
+    """
+    :param query: the clinician's query text.
+    :param page_content: text of one case document ("Label: value" lines).
+    :param marker: string wrapped around matched terms (Markdown bold by default).
+    :return: dict of field label -> items of that field containing a query term, with the
+             terms wrapped in marker. Fields without a match are left out.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return {}
+
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+                         re.IGNORECASE)
+    matched = {}
+    for field, items in _parser.parse_case(page_content).items():
+        for item in items:
+            match = pattern.search(item)
+            if match is None:
+                continue
+            if field in TEXT_FIELDS:
+                item = _snippet(item, match.start(), match.end())
+            highlighted = pattern.sub(lambda m: f"{marker}{m.group(0)}{marker}", item)
+            if highlighted not in matched.get(field, []):  # Cases repeat entities across pages
+                matched.setdefault(field, []).append(highlighted)
+    return matched
+
+
+def _snippet(text, start, end):
+    # Cut a long free text down to the words around the first match.
+    left = max(0, start - SNIPPET_CHARS)
+    right = min(len(text), end + SNIPPET_CHARS)
+    return ("..." if left else "") + text[left:right].strip() + ("..." if right < len(text) else "")
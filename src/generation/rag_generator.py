@@ -1,40 +1,282 @@
+import asyncio
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from config.settings import Config
 
-from src.embedding.embedder import ClinicalEmbedder
+from src.embedding.embedder import ClinicalEmbedder, VECTOR_STORE_PATH
+from src.indexing.versioning import IndexVersionManager
+from src.indexing.batch_search import batch_similarity_search
+from src.indexing.retrieval_cache import RetrievalCache
+from src.generation.semantic_cache import SemanticCache
+from src.generation.context_builder import ContextBuilder, estimate_tokens
+from src.generation.highlighting import highlight_matches
+from src.generation.resilience import ResilientGenerator, CircuitBreaker, GenerationUnavailable
+from src.utils.concurrency import RequestGate
+from src.utils.batching import MicroBatcher
+from src.utils.metrics import ERRORS, PROMPT_BUILD, QUERY_EMBEDDING, QUERY_TOTAL, TOKENS
+from src.utils.tracing import span
+
+
+class _QueryRun:
+    """
+    One query from the retrieved cases to its answer: semantic cache lookup, context, degraded
+    note, timing and metrics. Shared by the sync, async, streaming and batch query paths, which
+    only differ in how they call the LLM.
+    """
+
+    def __init__(self, rag, question, retrieval, start, mode):
+        """
+        :param rag: the ClinicalRAG answering the query.
+        :param question: the patient symptoms.
+        :param retrieval: (query vector, [(doc, score)], index version, score kind) from the retrieval step.
+        :param start: perf_counter time the query started.
+        :param mode: QUERY_TOTAL label ('query', 'stream' or 'batch').
+        """
+        self.rag = rag
+        self.question = question
+        self.vector, docs_and_scores, self.index_version, _ = retrieval
+        self.docs = [doc for doc, _ in docs_and_scores]
+        self.start = start
+        self.mode = mode
+        self.retrieved = time.perf_counter()
+        self.finished = None
+
+        self.answer = rag._cached_answer(self.vector, self.docs, self.index_version)
+        self.cache_hit = self.answer is not None
+        self.generated = None  # Text produced by the LLM, counted in the answer tokens
+        self.chunks = []
+        self.time_to_first_token = None
+        self.degraded = None
+        self.context = None
+        self.context_tokens = 0
+        if not self.cache_hit:
+            self.context = rag.build_context(self.docs)
+            self.context_tokens = self.context["tokens"]
+
+    def prompt(self):
+        return self.rag.build_prompt(self.question, self.context)
+
+    def answered(self, answer):
+        """The LLM answered: keep the answer and remember it in the semantic cache"""
+        self.answer = self.generated = answer
+        self.rag._remember_answer(self.question, self.vector, self.docs, self.index_version, answer,
+                                  time.perf_counter() - self.retrieved)
+
+    def unavailable(self, error):
+        """
+        :param error: the GenerationUnavailable raised by the generator.
+        :return: the degraded note, which also replaces the answer.
+        """
+        self.degraded = self.rag._degraded(error)
+        self.answer = self.degraded["message"]
+        return self.degraded
+
+    def token(self, text):
+        """
+        :param text: an answer chunk (the whole answer on a semantic cache hit).
+        :return: the 'token' stream event.
+        """
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.start
+        if not self.cache_hit:
+            self.chunks.append(text)
+        return {"type": "token", "text": text}
+
+    def finish(self):
+        """Stop the clock and record the query metrics"""
+        self.finished = time.perf_counter()
+        # Chunks already streamed were generated even if the stream was then cut short.
+        generated = "".join(self.chunks) if self.chunks else self.generated
+        self.rag._record_query(self.finished - self.start, self.mode, self.context_tokens, generated)
+
+    def result(self, **timing):
+        """
+        :param timing: timings of the query path, the semantic cache hit is added.
+        :return: the query result dict.
+        """
+        return {
+            "query": self.question,
+            "result": self.answer,
+            "source_documents": self.docs,
+            "context_tokens": self.context_tokens,
+            "degraded": self.degraded,
+            "timing": {**timing, "semantic_cache_hit": self.cache_hit}
+        }
+
+    def query_result(self):
+        """The result of query() and aquery()"""
+        return self.result(retrieval_seconds=self.retrieved - self.start,
+                           generation_seconds=self.finished - self.retrieved,
+                           total_seconds=self.finished - self.start)
+
+    def sources_event(self):
+        return {"type": "sources", "source_documents": self.docs,
+                "time_to_sources_seconds": self.retrieved - self.start}
+
+    def done_event(self):
+        return {"type": "done", "timing": {
+            "time_to_sources_seconds": self.retrieved - self.start,
+            "time_to_first_token_seconds": self.time_to_first_token,
+            "total_seconds": self.finished - self.start,
+            "semantic_cache_hit": self.cache_hit
+        }, "context_tokens": self.context_tokens, "degraded": self.degraded}
 
 
 class ClinicalRAG:
-    def __init__(self):
+    def __init__(self, retrieval_only=False, llm=None, micro_batching=False, vector_store_path=VECTOR_STORE_PATH,
+                 embeddings=None):
+        """
+        :param retrieval_only: only load the index for search(), skip the LLM (no API key needed).
+        :param llm: chat model to use instead of Gemini (e.g. a local stand-in for testing).
+        :param micro_batching: batch the retrieval of concurrent queries (servers under load).
+        :param vector_store_path: versioned index root to serve (e.g. a benchmark index).
+        :param embeddings: query embedding model matching the index (loaded from the HuggingFace model if not given).
+        """
+        self.retrieval_only = retrieval_only
+
         print("Loading vector store ...")
         self.embedder = ClinicalEmbedder()
-        self.vector_store = self.embedder.load_vector_store()
-
-        print("Initialize Gemini ...")
-        self.llm = ChatGoogleGenerativeAI(
-            model=Config.GEMINI_MODEL,
-            google_api_key=Config.GOOGLE_API_KEY,
-            temperature=0.7,
-            max_output_tokens=512  # Creativity dial for the AI. Control the randomness of output
-        )
+        self.index_versions = IndexVersionManager(vector_store_path)
+        self.index_version = self.index_versions.current_version()
+        self.vector_store = self.embedder.load_vector_store(vector_store_path, embeddings=embeddings)
+        self.embeddings = self.vector_store.embeddings  # Reused on hot reload, weights are loaded once
+
+        self.llm = None
+        self.generator = None
+        self.semantic_cache = None
+        if not retrieval_only:
+            self.enable_generation(llm)
 
         self.prompt = self.create_prompt()
+        self.context_builder = ContextBuilder(token_budget=Config.CONTEXT_TOKEN_BUDGET)
 
-        print("Creating RAG chain ...")
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",  # Method for handling documents
-            retriever=self.vector_store.as_retriever(search_kwargs={"k": Config.TOP_K_RETRIEVAL}),
-            # Tell the chain where get its knowledge, and retrieve the top k most relevant
+        self.reranker = None
+        if Config.RERANK_ENABLED:
+            # Imported here so sentence-transformers' cross-encoder is only loaded when used.
+            from src.indexing.reranker import CrossEncoderReranker
+            print("Loading re-ranker ...")
+            self.reranker = CrossEncoderReranker(
+                model_name=Config.RERANK_MODEL,
+                time_budget_ms=Config.RERANK_TIME_BUDGET_MS,
+                cache_size=Config.RERANK_CACHE_SIZE
+            )
 
-            return_source_documents=True,  # return the actual k documents that retrieved from database.
-            chain_type_kwargs={"prompt": self.prompt}
-            # By default, RetrievalQA uses a generic prompt. This customizes the prompt sent to the LLM.
-        )
+        self.retrieval_cache = None
+        if Config.RETRIEVAL_CACHE_ENABLED:
+            self.retrieval_cache = RetrievalCache(
+                max_bytes=Config.RETRIEVAL_CACHE_MAX_MB * 1024 * 1024,
+                namespace=Config.TEXT_EMBEDDING_MODEL,
+                db_path=Config.RETRIEVAL_CACHE_DB,
+                db_max_entries=Config.RETRIEVAL_CACHE_DB_MAX_ENTRIES
+            )
+
+        self.batcher = None
+        if micro_batching:
+            self.batcher = MicroBatcher(self._retrieve_batch, max_batch_size=Config.MICRO_BATCH_MAX_SIZE,
+                                        max_wait_ms=Config.MICRO_BATCH_MAX_WAIT_MS, name="retrieval-batcher")
+
+        self._gate = RequestGate()  # Lets an index swap wait for in-flight queries
+        self._reload_lock = threading.Lock()
+        self._watcher = None
         print("RAG system ready !")
 
+    def enable_generation(self, llm=None):
+        """
+        Create the LLM client, its resilience wrapper and the semantic answer cache.
+        Called by __init__ unless retrieval_only; a server that forks workers calls it in each
+        worker instead, since gRPC clients and threads do not survive fork().
+
+        :param llm: chat model to use instead of Gemini (e.g. a local stand-in for testing).
+        """
+        if llm is None:
+            print("Initialize Gemini ...")
+            llm = ChatGoogleGenerativeAI(
+                model=Config.GEMINI_MODEL,
+                google_api_key=Config.GOOGLE_API_KEY,
+                temperature=0.7,
+                max_output_tokens=512  # Creativity dial for the AI. Control the randomness of output
+            )
+        self.llm = llm
+        # Deadlines, hedging and a circuit breaker around every LLM call
+        self.generator = ResilientGenerator(
+            llm,
+            timeout_seconds=Config.LLM_TIMEOUT_SECONDS,
+            hedge=Config.LLM_HEDGE_ENABLED,
+            hedge_delay_seconds=Config.LLM_HEDGE_DELAY_SECONDS,
+            breaker=CircuitBreaker(Config.LLM_BREAKER_FAILURES, Config.LLM_BREAKER_RESET_SECONDS),
+            max_workers=max(16, 4 * Config.LLM_MAX_CONCURRENCY)
+        )
+
+        if Config.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.SEMANTIC_CACHE_TTL,
+                path=Config.SEMANTIC_CACHE_DIR
+            )
+        self.retrieval_only = False
+
+    def reload_index(self):
+        """
+        Load the current index version if it changed and swap it in between requests.
+        Returns True when a new version was loaded.
+        """
+        with self._reload_lock:
+            version = self.index_versions.current_version()
+            if version is None or version == self.index_version:
+                return False
+
+            # Load the version directory itself, so a publish during the load cannot mix versions.
+            version_path = self.index_versions.resolve_version(version)
+            print(f"Reloading index version {version} ...")
+
+            if Config.INDEX_RELOAD_MAX_RESIDENT < 2:
+                # No room for two copies: drain in-flight queries and unload before loading.
+                with self._gate.exclusive():
+                    old_version_path = self.index_versions.resolve_version(self.index_version)
+                    self.vector_store = None
+                    gc.collect()
+                    try:
+                        vector_store = self.embedder.load_vector_store(version_path, embeddings=self.embeddings)
+                    except Exception:
+                        # Put the previous version back rather than serving nothing.
+                        self.vector_store = self.embedder.load_vector_store(old_version_path,
+                                                                            embeddings=self.embeddings)
+                        raise
+                    self._swap_index(vector_store, version)
+            else:
+                # Load next to the old copy; queries keep using the old one until the swap.
+                vector_store = self.embedder.load_vector_store(version_path, embeddings=self.embeddings)
+                self._swap_index(vector_store, version)
+
+            print(f"Index version {version} is live")
+            return True
+
+    def _swap_index(self, vector_store, version):
+        # Plain attribute assignment is atomic; running queries still hold the old store.
+        self.vector_store, self.index_version = vector_store, version
+
+    def start_index_watcher(self, interval=Config.INDEX_RELOAD_INTERVAL):
+        """Poll for newly published index versions in a background thread"""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_index()
+                except Exception as e:
+                    print(f"Index reload failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="index-watcher", daemon=True)
+        self._watcher.start()
+
     def create_prompt(self):
         """Create medical diagnosis prompt"""
 
@@ -57,14 +299,352 @@ class ClinicalRAG:
         return PromptTemplate(template=template, input_variables=["context", "question"])
         # Constructs and returns a PromptTemplate.
 
+    def retrieve(self, question, k=Config.TOP_K_RETRIEVAL):
+        """
+        Embed the question and return the k most similar cases as (Document, score) pairs.
+        The scores may be distances or cross-encoder scores, use search() when they are compared.
+        """
+        _, docs_and_scores, _, _ = self._retrieve(question, k)
+        return docs_and_scores
+
+    def search(self, question, k=Config.TOP_K_RETRIEVAL):
+        """
+        Retrieval only: the k most similar cases with the fields matching the question highlighted.
+
+        :param question: patient symptom description
+        :param k: number of cases to return
+        :return: dict with 'query', 'cases' (case_id, score, matched_fields, document), 'score_kind'
+                 and 'timing' (retrieval_seconds for embedding and search, total_seconds including
+                 highlighting). score_kind is "distance" (index distances, lower is better) or
+                 "cross_encoder" (higher is better). With re-ranking enabled it is still "distance"
+                 when the cross-encoder ran out of time budget for this query.
+        """
+        start = time.perf_counter()
+        _, docs_and_scores, index_version, score_kind = self._retrieve(question, k)
+        retrieved = time.perf_counter()
+
+        cases = [
+            {
+                "case_id": doc.metadata["case_id"],
+                "score": float(score),
+                "matched_fields": highlight_matches(question, doc.page_content),
+                "document": doc
+            }
+            for doc, score in docs_and_scores
+        ]
+        finished = time.perf_counter()
+
+        return {
+            "query": question,
+            "cases": cases,
+            "score_kind": score_kind,
+            "index_version": index_version,
+            "timing": {
+                "retrieval_seconds": retrieved - start,
+                "total_seconds": finished - start
+            }
+        }
+
+    def _retrieve(self, question, k=Config.TOP_K_RETRIEVAL):
+        # Also returns the query vector and the index version, the semantic cache needs both, and
+        # the kind of the scores (see search).
+        with span("query.retrieve", k=k) as retrieve_span:
+            fetch_k = self._fetch_k(k)
+            cached = self._cached_retrieval(question, fetch_k) if self.batcher is not None else None
+            if cached is not None:
+                vector, docs_and_scores, index_version = cached  # Do not wait for a batch
+            elif self.batcher is not None:
+                vector, docs_and_scores, index_version = self.batcher((question, fetch_k))
+            else:
+                with self._gate.shared():
+                    vector_store, index_version = self.vector_store, self.index_version
+                    vector = self._embed_query(question)
+                    docs_and_scores = self._search(vector_store, index_version, vector, fetch_k)
+            retrieve_span.set(index_version=index_version)
+            docs_and_scores, score_kind = self._rerank(question, docs_and_scores, k)
+            return vector, docs_and_scores, index_version, score_kind
+
+    def _retrieve_batch(self, items):
+        # Micro-batch handler: one embedding pass and one multi-query search for concurrent queries.
+        questions = [question for question, _ in items]
+        fetch_k = max(k for _, k in items)
+        with self._gate.shared():
+            vector_store, index_version = self.vector_store, self.index_version
+            vectors = self._embed_queries(questions)
+            results = self._search_many(vector_store, index_version, vectors, fetch_k)
+        return [
+            (vector, docs_and_scores[:k], index_version)
+            for (_, k), vector, docs_and_scores in zip(items, vectors, results)
+        ]
+
+    def _cached_retrieval(self, question, fetch_k):
+        if self.retrieval_cache is None:
+            return None
+        vector = self.retrieval_cache.get_embedding(question, count_miss=False)
+        if vector is None:
+            return None
+        index_version = self.index_version
+        docs_and_scores = self.retrieval_cache.get_results(vector, fetch_k, index_version, count_miss=False)
+        if docs_and_scores is None:
+            return None
+        return vector, docs_and_scores, index_version
+
+    def _embed_query(self, question):
+        if self.retrieval_cache is None:
+            with QUERY_EMBEDDING.time(), span("query.embed"):
+                return self.embeddings.embed_query(question)
+        vector = self.retrieval_cache.get_embedding(question)
+        if vector is None:
+            with QUERY_EMBEDDING.time(), span("query.embed"):
+                vector = self.embeddings.embed_query(question)
+            self.retrieval_cache.put_embedding(question, vector)
+        return vector
+
+    def _search(self, vector_store, index_version, vector, fetch_k):
+        # Through the batch path, which times the index search and the docstore fetch separately.
+        if self.retrieval_cache is None:
+            return batch_similarity_search(vector_store, [vector], fetch_k)[0]
+        docs_and_scores = self.retrieval_cache.get_results(vector, fetch_k, index_version)
+        if docs_and_scores is None:
+            docs_and_scores = batch_similarity_search(vector_store, [vector], fetch_k)[0]
+            self.retrieval_cache.put_results(vector, fetch_k, index_version, docs_and_scores)
+        return docs_and_scores
+
+    def _embed_queries(self, questions):
+        # Batched version of _embed_query: only the cache misses go through the model, in one pass.
+        if self.retrieval_cache is None:
+            with QUERY_EMBEDDING.time(), span("query.embed"):
+                return self.embeddings.embed_documents(questions)
+        vectors = [self.retrieval_cache.get_embedding(question) for question in questions]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with QUERY_EMBEDDING.time(), span("query.embed"):
+                embedded = self.embeddings.embed_documents([questions[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                self.retrieval_cache.put_embedding(questions[i], vector)
+        return vectors
+
+    def _search_many(self, vector_store, index_version, vectors, fetch_k):
+        # Batched version of _search: one multi-query search for the cache misses.
+        if self.retrieval_cache is None:
+            return batch_similarity_search(vector_store, vectors, fetch_k)
+        results = [self.retrieval_cache.get_results(vector, fetch_k, index_version) for vector in vectors]
+        missing = [i for i, docs_and_scores in enumerate(results) if docs_and_scores is None]
+        if missing:
+            searched = batch_similarity_search(vector_store, [vectors[i] for i in missing], fetch_k)
+            for i, docs_and_scores in zip(missing, searched):
+                results[i] = docs_and_scores
+                self.retrieval_cache.put_results(vectors[i], fetch_k, index_version, docs_and_scores)
+        return results
+
+    def _fetch_k(self, k):
+        # The re-ranker needs a wider candidate set than the final k.
+        return max(k, Config.RERANK_CANDIDATES) if self.reranker is not None else k
+
+    def _rerank(self, question, docs_and_scores, k):
+        # Returns the top k and the kind of their scores, "distance" or "cross_encoder".
+        if self.reranker is None:
+            return docs_and_scores[:k], "distance"
+        return self.reranker.rerank_with_kind(question, docs_and_scores, k)
+
+    def _require_llm(self):
+        if self.llm is None:
+            raise RuntimeError("ClinicalRAG was created with retrieval_only=True, use search() or "
+                               "create it without retrieval_only to generate answers.")
+
+    @staticmethod
+    def _degraded(error):
+        # Structured note returned in place of an answer when the LLM is unavailable.
+        return {
+            "status": "generation_unavailable",
+            "reason": error.reason,
+            "detail": error.detail,
+            "message": "The diagnosis could not be generated right now. The similar cases retrieved are shown below."
+        }
+
+    def _cached_answer(self, vector, docs, index_version):
+        if self.semantic_cache is None:
+            return None
+        return self.semantic_cache.lookup(vector, [doc.metadata["case_id"] for doc in docs], index_version)
+
+    def _remember_answer(self, question, vector, docs, index_version, answer, generation_seconds):
+        if self.semantic_cache is not None and answer:
+            self.semantic_cache.store(question, vector, [doc.metadata["case_id"] for doc in docs],
+                                      index_version, answer, generation_seconds)
+
+    def build_context(self, docs):
+        """Pack the retrieved cases into the prompt context under the token budget"""
+        with PROMPT_BUILD.time(step="context"):
+            return self.context_builder.build(docs)
+
+    def build_prompt(self, question, context):
+        """Fill the diagnosis prompt with a context from build_context"""
+        with PROMPT_BUILD.time(step="prompt"):
+            return self.prompt.format(context=context["text"], question=question)
+
+    @staticmethod
+    def _record_query(seconds, mode, context_tokens, answer):
+        # LLM errors are counted by the ResilientGenerator; answer tokens are the LLM's, not cache hits.
+        QUERY_TOTAL.observe(seconds, mode=mode)
+        TOKENS.inc(context_tokens, kind="context")
+        if answer:
+            TOKENS.inc(estimate_tokens(answer), kind="answer")
+
     def query(self, patient_symptoms):
         """Query the RAG system for diagnosis"""
+        self._require_llm()
         print(f"Query: {patient_symptoms}\n")
         print("Searching for similar cases...")
 
-        result = self.qa_chain({"query": patient_symptoms})
+        start = time.perf_counter()
+        run = _QueryRun(self, patient_symptoms, self._retrieve(patient_symptoms), start, "query")
+        if not run.cache_hit:
+            try:
+                run.answered(self.generate(patient_symptoms, run.context))
+            except GenerationUnavailable as e:
+                run.unavailable(e)
+        run.finish()
+        return run.query_result()
+
+    async def aquery(self, patient_symptoms):
+        """Async version of query, the LLM call does not block a thread while waiting"""
+        self._require_llm()
+        start = time.perf_counter()
+        # Embedding and search are CPU bound, keep them off the event loop.
+        retrieval = await asyncio.to_thread(self._retrieve, patient_symptoms)
+        run = _QueryRun(self, patient_symptoms, retrieval, start, "query")
+        if not run.cache_hit:
+            try:
+                with span("query.generate", context_tokens=run.context_tokens):
+                    answer = await self.generator.ainvoke(run.prompt())
+                run.answered(answer)
+            except GenerationUnavailable as e:
+                run.unavailable(e)
+        run.finish()
+        return run.query_result()
+
+    def stream_query(self, patient_symptoms):
+        """
+        Query the RAG system and yield results as they become available:
+        a 'sources' event with the retrieved cases, 'token' events with answer chunks,
+        an 'unavailable' event if the LLM times out or fails (see _degraded),
+        then a 'done' event with time-to-sources, time-to-first-token and total latency.
+        """
+        self._require_llm()
+        start = time.perf_counter()
+        run = _QueryRun(self, patient_symptoms, self._retrieve(patient_symptoms), start, "stream")
+        yield run.sources_event()
+
+        if run.cache_hit:
+            yield run.token(run.answer)
+        else:
+            try:
+                for text in self.generator.stream(run.prompt()):
+                    yield run.token(text)
+                run.answered("".join(run.chunks))
+            except GenerationUnavailable as e:
+                # Tokens already sent stay on screen; the note says the answer is missing or cut short.
+                yield {"type": "unavailable", **run.unavailable(e)}
+        run.finish()
+        yield run.done_event()
+
+    async def astream_query(self, patient_symptoms):
+        """Async version of stream_query, yields the same events"""
+        self._require_llm()
+        start = time.perf_counter()
+        retrieval = await asyncio.to_thread(self._retrieve, patient_symptoms)
+        run = _QueryRun(self, patient_symptoms, retrieval, start, "stream")
+        yield run.sources_event()
+
+        if run.cache_hit:
+            yield run.token(run.answer)
+        else:
+            try:
+                async for text in self.generator.astream(run.prompt()):
+                    yield run.token(text)
+                run.answered("".join(run.chunks))
+            except GenerationUnavailable as e:
+                yield {"type": "unavailable", **run.unavailable(e)}
+        run.finish()
+        yield run.done_event()
+
+    def query_many(self, questions, max_concurrency=Config.LLM_MAX_CONCURRENCY, rate_limiter=None):
+        """
+        Query the RAG system for many diagnoses at once.
+        Questions missing from the retrieval cache are embedded in one batched forward pass and
+        searched with one multi-query index search, then the LLM calls run with bounded concurrency.
+
+        :param questions: list of patient symptom descriptions
+        :param max_concurrency: maximum number of LLM calls in flight
+        :param rate_limiter: TokenBucket every LLM call waits on (semantic cache hits do not), shared across calls
+        :return: one result dict per question, in input order, with 'result', 'source_documents',
+                 'timing' and 'error' (None on success). Embedding and search time is the batch
+                 time shared equally between the questions.
+        """
+        self._require_llm()
+        questions = list(questions)
+        if not questions:
+            return []
+
+        batch_start = time.perf_counter()
+        print(f"Searching similar cases for {len(questions)} queries...")
+        with self._gate.shared():
+            vector_store, index_version = self.vector_store, self.index_version
+            vectors = self._embed_queries(questions)
+            embedded = time.perf_counter()
+            candidates = self._search_many(vector_store, index_version, vectors,
+                                           self._fetch_k(Config.TOP_K_RETRIEVAL))
+        retrieved = [
+            self._rerank(question, docs_and_scores, Config.TOP_K_RETRIEVAL)
+            for question, docs_and_scores in zip(questions, candidates)
+        ]
+        searched = time.perf_counter()
+
+        embedding_share = (embedded - batch_start) / len(questions)
+        search_share = (searched - embedded) / len(questions)
+
+        def answer(item):
+            question, vector, (docs_and_scores, score_kind) = item
+            run = _QueryRun(self, question, (vector, docs_and_scores, index_version, score_kind), batch_start, "batch")
+            error = None
+            if not run.cache_hit:
+                # Unlike query(), one failing question must not fail the whole batch: every error
+                # is reported in the question's result instead of raised.
+                try:
+                    if rate_limiter is not None:
+                        rate_limiter.acquire()
+                    run.answered(self.generate(question, run.context))
+                except GenerationUnavailable as e:
+                    run.unavailable(e)
+                    run.answer, error = "", str(e)
+                except Exception as e:
+                    run.answer, error = "", str(e)
+                    ERRORS.inc(stage="query", reason=type(e).__name__)
+            run.finish()
+
+            return {
+                **run.result(
+                    embedding_seconds=embedding_share,
+                    search_seconds=search_share,
+                    queue_seconds=run.retrieved - searched,  # Waiting for a free LLM slot
+                    generation_seconds=run.finished - run.retrieved,
+                    total_seconds=run.finished - batch_start
+                ),
+                "error": error
+            }
+
+        # map() keeps the input order whatever order the LLM calls finish in.
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            return list(executor.map(answer, zip(questions, vectors, retrieved)))
 
-        return result
+    def generate(self, question, context):
+        """Generate the diagnosis for a question from a context built by build_context"""
+        self._require_llm()
+        with span("query.generate", context_tokens=context["tokens"]) as generate_span:
+            answer = self.generator.invoke(self.build_prompt(question, context))
+            generate_span.set(answer_tokens=estimate_tokens(answer))
+        return answer
 
 
 if __name__ == "__main__":
@@ -0,0 +1,373 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from src.utils.metrics import ERRORS, LLM_GENERATION, LLM_TIME_TO_FIRST_TOKEN
+
+# Successful call latencies kept to estimate the hedge delay (p95).
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20  # No hedging until the p95 is based on this many calls
+
+
+class GenerationUnavailable(Exception):
+    """The LLM did not answer: reason is 'timeout', 'circuit_open' or 'error'."""
+
+    def __init__(self, reason, detail=""):
+        super().__init__(f"Generation unavailable ({reason}){': ' + detail if detail else ''}")
+        self.reason = reason
+        self.detail = detail
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing backend. After failure_threshold consecutive failures the
+    circuit opens and calls are refused for reset_seconds; then a single trial call is
+    let through (half-open), which closes the circuit on success or reopens it on failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    TRIAL = "trial"
+
+    def __init__(self, failure_threshold=5, reset_seconds=60):
+        """
+        :param failure_threshold: consecutive failures that open the circuit.
+        :param reset_seconds: how long the circuit stays open before a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """
+        :return: False if the call is refused, TRIAL if it is the half-open trial call, else True.
+        """
+        with self.lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return self.TRIAL
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release_trial(self):
+        """The trial call ended without an outcome (caller went away), the next call is the trial."""
+        with self.lock:
+            self.trial_running = False
+
+
+class ResilientGenerator:
+    """
+    Wraps the LLM calls with a deadline, optional hedging and a circuit breaker.
+    Every failure (deadline, breaker open, backend error) surfaces as GenerationUnavailable,
+    so callers can fall back to a retrieval-only answer.
+
+    Hedging sends a second identical request when the first has not answered after the
+    hedge delay (the observed p95 by default) and returns whichever finishes first.
+    Threads cannot be cancelled, so a timed-out or losing call finishes in the background.
+    """
+
+    def __init__(self, llm, timeout_seconds=30, hedge=False, hedge_delay_seconds=None, breaker=None,
+                 max_workers=16):
+        """
+        :param llm: Langchain chat model (invoke/ainvoke/stream/astream returning .content chunks).
+        :param timeout_seconds: deadline for a whole call (None = no deadline).
+        :param hedge: send a second request for slow calls.
+        :param hedge_delay_seconds: wait before hedging, None = the p95 of recent calls.
+        :param breaker: CircuitBreaker shared by all calls (None = never trip).
+        :param max_workers: threads for blocking calls, including abandoned ones.
+        """
+        self.llm = llm
+        self.timeout_seconds = timeout_seconds
+        self.hedge = hedge
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.breaker = breaker
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.cancelled = 0
+        self.failures = {"timeout": 0, "circuit_open": 0, "error": 0}
+
+    def hedge_delay(self):
+        """
+        :return: seconds to wait before sending the hedge request, None = do not hedge.
+        """
+        if not self.hedge:
+            return None
+        if self.hedge_delay_seconds is not None:
+            return self.hedge_delay_seconds
+        with self.lock:
+            if len(self.latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            return float(np.percentile(self.latencies, 95))
+
+    def stats(self):
+        """
+        :return: call, hedge and failure counts plus the breaker state.
+        """
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "cancelled": self.cancelled,
+            "failures": dict(self.failures),
+            "breaker": self.breaker.state if self.breaker else CircuitBreaker.CLOSED
+        }
+
+    def invoke(self, prompt):
+        """
+        :param prompt: the full prompt text.
+        :return: the generated text.
+        :raises GenerationUnavailable: on deadline, open circuit or backend error.
+        """
+        trial = self._admit()
+        with self._settled(trial):
+            start = time.monotonic()
+            deadline = None if self.timeout_seconds is None else start + self.timeout_seconds
+            hedge_at = self._hedge_at(start)
+
+            primary = self.executor.submit(self._call, prompt)
+            futures = [primary]
+            errors = []
+            while futures:
+                done, _ = wait(futures, timeout=self._next_wait(deadline, hedge_at), return_when=FIRST_COMPLETED)
+                for future in done:
+                    futures.remove(future)
+                    if future.exception() is None:
+                        return self._succeeded(start, future.result(), hedged_win=future is not primary)
+                    errors.append(future.exception())
+                if done:
+                    continue
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    self._failed("timeout")
+                    raise GenerationUnavailable("timeout", f"no answer after {self.timeout_seconds}s")
+                if hedge_at is not None and now >= hedge_at:
+                    self.hedges += 1
+                    futures.append(self.executor.submit(self._call, prompt))
+                    hedge_at = None  # One hedge per call
+
+            self._failed("error")
+            raise GenerationUnavailable("error", str(errors[-1]))
+
+    async def ainvoke(self, prompt):
+        """Async version of invoke, the requests are asyncio tasks instead of threads"""
+        trial = self._admit()
+        start = time.monotonic()
+        deadline = None if self.timeout_seconds is None else start + self.timeout_seconds
+        hedge_at = self._hedge_at(start)
+
+        primary = asyncio.ensure_future(self._acall(prompt))
+        tasks = [primary]
+        errors = []
+        with self._settled(trial):
+            try:
+                while tasks:
+                    done, _ = await asyncio.wait(tasks, timeout=self._next_wait(deadline, hedge_at),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        tasks.remove(task)
+                        if task.exception() is None:
+                            return self._succeeded(start, task.result(), hedged_win=task is not primary)
+                        errors.append(task.exception())
+                    if done:
+                        continue
+
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        self._failed("timeout")
+                        raise GenerationUnavailable("timeout", f"no answer after {self.timeout_seconds}s")
+                    if hedge_at is not None and now >= hedge_at:
+                        self.hedges += 1
+                        tasks.append(asyncio.ensure_future(self._acall(prompt)))
+                        hedge_at = None
+            finally:
+                for task in tasks:
+                    task.cancel()  # Unlike threads, the losing or timed-out request is really stopped
+
+            self._failed("error")
+            raise GenerationUnavailable("error", str(errors[-1]))
+
+    def stream(self, prompt):
+        """
+        :param prompt: the full prompt text.
+        :return: generator of text chunks. The deadline covers the whole stream; chunks already
+                 yielded stay valid when GenerationUnavailable is raised part way through.
+        """
+        trial = self._admit()
+        start = time.monotonic()
+        deadline = None if self.timeout_seconds is None else start + self.timeout_seconds
+        chunks = queue.Queue()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in self.llm.stream(prompt):
+                    chunks.put(chunk.content)
+                chunks.put(done)
+            except Exception as e:
+                chunks.put(e)
+
+        self.executor.submit(produce)
+        first = True
+        with self._settled(trial):
+            while True:
+                try:
+                    item = chunks.get(timeout=self._remaining(deadline))
+                except queue.Empty:
+                    self._failed("timeout")
+                    raise GenerationUnavailable("timeout", f"answer incomplete after {self.timeout_seconds}s")
+                if item is done:
+                    self._succeeded(start, streamed=True)
+                    return
+                if isinstance(item, Exception):
+                    self._failed("error")
+                    raise GenerationUnavailable("error", str(item))
+                if first:
+                    LLM_TIME_TO_FIRST_TOKEN.observe(time.monotonic() - start)
+                    first = False
+                yield item
+
+    async def astream(self, prompt):
+        """Async version of stream"""
+        trial = self._admit()
+        start = time.monotonic()
+        deadline = None if self.timeout_seconds is None else start + self.timeout_seconds
+        chunks = self.llm.astream(prompt).__aiter__()
+        first = True
+        with self._settled(trial):
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self._remaining(deadline))
+                except StopAsyncIteration:
+                    self._succeeded(start, streamed=True)
+                    return
+                except asyncio.TimeoutError:
+                    self._failed("timeout")
+                    raise GenerationUnavailable("timeout", f"answer incomplete after {self.timeout_seconds}s")
+                except Exception as e:
+                    self._failed("error")
+                    raise GenerationUnavailable("error", str(e))
+                if first:
+                    LLM_TIME_TO_FIRST_TOKEN.observe(time.monotonic() - start)
+                    first = False
+                yield chunk.content
+
+    def _call(self, prompt):
+        # Each request records its own latency, so hedged calls do not pull the p95 down.
+        start = time.monotonic()
+        content = self.llm.invoke(prompt).content
+        self._record_latency(time.monotonic() - start)
+        return content
+
+    async def _acall(self, prompt):
+        start = time.monotonic()
+        response = await self.llm.ainvoke(prompt)
+        self._record_latency(time.monotonic() - start)
+        return response.content
+
+    def _record_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def _hedge_at(self, start):
+        delay = self.hedge_delay()
+        return None if delay is None else start + delay
+
+    @staticmethod
+    def _next_wait(deadline, hedge_at):
+        waits = [t - time.monotonic() for t in (deadline, hedge_at) if t is not None]
+        return max(0.0, min(waits)) if waits else None
+
+    def _admit(self):
+        """
+        :return: True if the call is the breaker's half-open trial.
+        :raises GenerationUnavailable: when the circuit is open.
+        """
+        self.calls += 1
+        if self.breaker is None:
+            return False
+        allowed = self.breaker.allow()
+        if not allowed:
+            self.failures["circuit_open"] += 1
+            ERRORS.inc(stage="llm", reason="circuit_open")
+            raise GenerationUnavailable("circuit_open", "too many recent LLM failures, not calling it")
+        return allowed == CircuitBreaker.TRIAL
+
+    @contextmanager
+    def _settled(self, trial):
+        """
+        Wraps a call after _admit. Outcomes are recorded with _succeeded/_failed; a call that ends
+        otherwise (stream closed by a disconnecting client, task cancelled, interrupt) is counted as
+        cancelled and, if it was the half-open trial, frees the trial slot instead of blocking the
+        breaker forever. A cancellation says nothing about the backend, so it is not a failure.
+        """
+        try:
+            yield
+        except GenerationUnavailable:
+            raise
+        except BaseException:
+            self.cancelled += 1
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+    def _succeeded(self, start, result=None, hedged_win=False, streamed=False):
+        seconds = time.monotonic() - start
+        LLM_GENERATION.observe(seconds)
+        if not streamed:
+            LLM_TIME_TO_FIRST_TOKEN.observe(seconds)  # The whole answer arrives at once
+        if hedged_win:
+            self.hedge_wins += 1
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return result
+
+    def _failed(self, reason):
+        self.failures[reason] += 1
+        ERRORS.inc(stage="llm", reason=reason)
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    @staticmethod
+    def _remaining(deadline):
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
@@ -0,0 +1,202 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from src.utils.metrics import CACHE_REQUESTS
+
+# Nearest cached queries checked per lookup (a close query may have retrieved other cases).
+LOOKUP_NEIGHBOURS = 5
+CACHE_FILE = "semantic_cache.npz"  # Ids, embeddings and entries, replaced as a whole on every save
+
+
+class SemanticCache:
+    """
+    Caches answers by query embedding. A new query reuses a cached answer when it is
+    within the cosine threshold of a cached query, retrieved the same set of cases and
+    ran against the same index version. Lookups go through a small inner-product FAISS
+    index over the normalized cached embeddings; eviction is LRU plus a TTL.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=1000, ttl_seconds=86400, path=None, save_interval=30):
+        """
+        :param threshold: minimum cosine similarity for a hit.
+        :param max_entries: LRU capacity.
+        :param ttl_seconds: age after which an entry is dropped.
+        :param path: directory to persist the cache in (None = memory only).
+        :param save_interval: minimum seconds between two saves to disk.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self.save_interval = save_interval
+
+        self.entries = OrderedDict()  # entry id -> answer and metadata, least recently used first
+        self.vectors = {}  # entry id -> normalized embedding
+        self.index = None  # Created on the first entry, when the dimension is known
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_seconds = 0.0
+        self.last_save = 0.0
+
+        if self.path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def lookup(self, embedding, case_ids, index_version):
+        """
+        :param embedding: the query embedding (already computed for retrieval).
+        :param case_ids: ids of the cases retrieved for the query.
+        :param index_version: version of the index the cases came from.
+        :return: the cached answer, or None on a miss.
+        """
+        vector = self._normalize(embedding)
+        case_set = sorted(case_ids)
+        now = time.time()
+
+        with self.lock:
+            if self.index is not None and self.index.ntotal:
+                scores, ids = self.index.search(vector, min(LOOKUP_NEIGHBOURS, self.index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id == -1 or score < self.threshold:
+                        break  # Results are sorted, nothing closer follows
+                    entry = self.entries[int(entry_id)]
+                    if now - entry["created"] > self.ttl_seconds:
+                        self._remove(int(entry_id))
+                        continue
+                    if entry["case_ids"] == case_set and entry["index_version"] == index_version:
+                        self.entries.move_to_end(int(entry_id))
+                        self.hits += 1
+                        CACHE_REQUESTS.inc(cache="semantic_answer", result="hit")
+                        self.latency_saved_seconds += entry["generation_seconds"]
+                        return entry["answer"]
+
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="semantic_answer", result="miss")
+            return None
+
+    def store(self, query, embedding, case_ids, index_version, answer, generation_seconds):
+        """
+        :param query: the query text (kept for inspection only).
+        :param embedding: the query embedding.
+        :param case_ids: ids of the cases the answer was generated from.
+        :param index_version: version of the index the cases came from.
+        :param answer: the generated answer.
+        :param generation_seconds: how long the LLM call took, counted as saved on every hit.
+        """
+        vector = self._normalize(embedding)
+        with self.lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = {
+                "query": query,
+                "answer": answer,
+                "case_ids": sorted(case_ids),
+                "index_version": index_version,
+                "created": time.time(),
+                "generation_seconds": generation_seconds
+            }
+            self.vectors[entry_id] = vector[0]
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))  # Least recently used
+
+        if self.path is not None and time.time() - self.last_save > self.save_interval:
+            self.save()
+
+    def stats(self):
+        """
+        :return: hit rate and latency saved since startup.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_seconds": self.latency_saved_seconds
+        }
+
+    def save(self):
+        """
+        Write the cache to disk: ids, embeddings and entries in one .npz file. Several writers
+        share the directory (API workers, query_many threads, exit hooks), so each writes its own
+        temporary file and a single rename replaces the cache; a crash never pairs the embeddings
+        of one save with the entries of another.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            ids = list(self.entries)
+            meta = {"next_id": self.next_id, "entries": [self.entries[i] for i in ids]}
+            vectors = np.array([self.vectors[i] for i in ids], dtype=np.float32)
+            self.last_save = time.time()
+
+        temp_path = self.path / f"{CACHE_FILE}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                np.savez(f, ids=np.array(ids, dtype=np.int64), vectors=vectors, meta=np.array(json.dumps(meta)))
+            os.replace(temp_path, self.path / CACHE_FILE)
+        except OSError as e:
+            # The disk copy is an optimization: a full or read-only disk never fails a query.
+            print(f"Semantic cache save skipped: {e}")
+            with suppress(OSError):
+                temp_path.unlink(missing_ok=True)
+
+    def load(self):
+        """Load a cache saved by save(), dropping expired entries."""
+        cache_file = self.path / CACHE_FILE
+        if not cache_file.exists():
+            return
+
+        try:
+            with np.load(cache_file, allow_pickle=False) as data:
+                ids = data["ids"]
+                vectors = data["vectors"]
+                meta = json.loads(str(data["meta"]))
+        except (json.JSONDecodeError, ValueError, KeyError, OSError) as e:
+            print(f"Ignoring unreadable semantic cache: {e}")
+            return
+        if not len(ids) == len(vectors) == len(meta["entries"]):
+            print("Ignoring semantic cache: entries and vectors do not match")
+            return
+
+        now = time.time()
+        self.next_id = meta["next_id"]
+        for entry_id, vector, entry in zip(ids.tolist(), vectors, meta["entries"]):
+            if now - entry["created"] > self.ttl_seconds:
+                continue
+            if self.index is None:
+                self.index = faiss.IndexIDMap(faiss.IndexFlatIP(len(vector)))
+            self.entries[entry_id] = entry
+            self.vectors[entry_id] = vector
+            self.index.add_with_ids(vector[None, :], np.array([entry_id], dtype=np.int64))
+        print(f"Semantic cache loaded with {len(self.entries)} entries")
+
+    def _remove(self, entry_id):
+        del self.entries[entry_id]
+        del self.vectors[entry_id]
+        self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.array([embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)  # Inner product of unit vectors is the cosine similarity
+        return vector
@@ -0,0 +1,50 @@
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from src.utils.metrics import DOCSTORE_FETCH, INDEX_SEARCH
+from src.utils.tracing import span
+
+
+def batch_similarity_search(vector_store, vectors, k):
+    """
+    :param vector_store: FAISS, ShardedVectorStore or QuantizedVectorStore.
+    :param vectors: list of query vectors.
+    :param k: number of results per query.
+    :return: one list of (Document, score) pairs per query, in input order.
+    """
+    if not len(vectors):
+        return []
+
+    # Our own stores know how to search many queries at once.
+    if hasattr(vector_store, "similarity_search_with_score_by_vectors"):
+        return vector_store.similarity_search_with_score_by_vectors(vectors, k)
+
+    if isinstance(vector_store, FAISS):
+        return faiss_search_by_vectors(vector_store, vectors, k)
+
+    with INDEX_SEARCH.time(), span("index.search", queries=len(vectors), k=k):
+        return [vector_store.similarity_search_with_score_by_vector(vector, k) for vector in vectors]
+
+
+def faiss_search_by_vectors(vector_store, vectors, k):
+    """
+    :param vector_store: a Langchain FAISS store.
+    :param vectors: list of query vectors.
+    :param k: number of results per query.
+    :return: one list of (Document, score) pairs per query, from a single index.search call.
+    """
+    queries = np.array(vectors, dtype=np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(queries)
+
+    with INDEX_SEARCH.time(), span("index.search", queries=len(queries), k=k):
+        scores, indices = vector_store.index.search(queries, k)
+    with DOCSTORE_FETCH.time(), span("index.docstore_fetch"):
+        return [
+            [
+                (vector_store.docstore.search(vector_store.index_to_docstore_id[i]), float(score))
+                for i, score in zip(row_indices, row_scores) if i != -1  # -1 when there are fewer than k docs
+            ]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
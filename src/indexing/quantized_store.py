@@ -0,0 +1,193 @@
+import json
+import pickle
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.vectorstores import VectorStore
+
+from src.utils.metrics import DOCSTORE_FETCH, INDEX_SEARCH
+from src.utils.tracing import span
+
+# Files written by QuantizedVectorStore.save_local
+QUANTIZED_MANIFEST = "quantized.json"
+CODES_FILE = "codes.faiss"
+VECTORS_FILE = "vectors.f32"
+DOCSTORE_FILE = "index.pkl"
+
+QUANTIZATION_MODES = ("binary", "int8")
+
+
+def build_code_index(vectors, mode):
+    """
+    :param vectors: float32 matrix, one row per document.
+    :param mode: "binary" (1 bit per dimension, Hamming) or "int8" (scalar quantizer).
+    :return: a FAISS index over the compressed codes.
+    """
+    dim = vectors.shape[1]
+    if mode == "binary":
+        index = faiss.IndexBinaryFlat(dim)  # dim must be a multiple of 8 (384 is)
+        index.add(np.packbits(vectors > 0, axis=1))
+    elif mode == "int8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        index.train(vectors)
+        index.add(vectors)
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}, expected one of {QUANTIZATION_MODES}")
+    return index
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Two-stage search: a first pass over compressed codes (1-bit or int8) picks a small
+    candidate set, which is then re-scored exactly with the float32 vectors. The float
+    vectors live in a memory-mapped file, so only the candidate rows are ever read.
+    Scores are squared L2 distances, the same as IndexFlatL2.
+    """
+
+    def __init__(self, code_index, mode, vectors, docstore, index_to_docstore_id, embedding, rerank_factor=10):
+        """
+        :param code_index: FAISS index over the compressed codes.
+        :param mode: "binary" or "int8".
+        :param vectors: float32 vectors (np.memmap when loaded from disk), row i = FAISS id i.
+        :param docstore: the Langchain docstore holding the documents.
+        :param index_to_docstore_id: dict of FAISS id -> docstore id.
+        :param embedding: embedding model used to embed queries.
+        :param rerank_factor: candidates re-scored per requested result.
+        """
+        self.code_index = code_index
+        self.mode = mode
+        self.vectors = vectors
+        self.docstore = docstore
+        self.index_to_docstore_id = index_to_docstore_id
+        self.embedding = embedding
+        self.rerank_factor = rerank_factor
+        self.distance_strategy = DistanceStrategy.EUCLIDEAN_DISTANCE
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @classmethod
+    def from_faiss(cls, vector_store, mode, rerank_factor=10):
+        """
+        :param vector_store: a flat Langchain FAISS store.
+        :param mode: "binary" or "int8".
+        :param rerank_factor: candidates re-scored per requested result.
+        :return: QuantizedVectorStore over the same documents.
+        """
+        vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+        return cls(build_code_index(vectors, mode), mode, vectors, vector_store.docstore,
+                   vector_store.index_to_docstore_id, vector_store.embeddings, rerank_factor)
+
+    def search_ids(self, queries, k):
+        """
+        :param queries: float32 matrix of query vectors.
+        :param k: number of results per query.
+        :return: (distances, ids) arrays of shape (n_queries, k), ids are -1 where missing.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        n_candidates = min(self.code_index.ntotal, max(k, k * self.rerank_factor))
+
+        # Stage 1: approximate candidates from the compressed codes.
+        if self.mode == "binary":
+            _, candidate_ids = self.code_index.search(np.packbits(queries > 0, axis=1), n_candidates)
+        else:
+            _, candidate_ids = self.code_index.search(queries, n_candidates)
+
+        # Stage 2: exact distances for the candidates only.
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, query in enumerate(queries):
+            candidates = np.sort(candidate_ids[row][candidate_ids[row] >= 0])  # Sorted reads page in sequentially
+            exact = ((np.asarray(self.vectors[candidates]) - query) ** 2).sum(axis=1)
+            order = np.argsort(exact)[:k]
+            distances[row, :len(order)] = exact[order]
+            ids[row, :len(order)] = candidates[order]
+        return distances, ids
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vectors([embedding], k)[0]
+
+    def similarity_search_with_score_by_vectors(self, embeddings, k=4):
+        with INDEX_SEARCH.time(), span("index.search", queries=len(embeddings), k=k):
+            distances, ids = self.search_ids(np.array(embeddings, dtype=np.float32), k)
+        with DOCSTORE_FETCH.time(), span("index.docstore_fetch"):
+            return [
+                [
+                    (self.docstore.search(self.index_to_docstore_id[i]), float(distance))
+                    for i, distance in zip(row_ids, row_distances) if i != -1
+                ]
+                for row_ids, row_distances in zip(ids, distances)
+            ]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def save_local(self, folder_path):
+        """
+        :param folder_path: the direction for saving the codes, float vectors and docstore.
+        """
+        path = Path(folder_path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        if self.mode == "binary":
+            faiss.write_index_binary(self.code_index, str(path / CODES_FILE))
+        else:
+            faiss.write_index(self.code_index, str(path / CODES_FILE))
+
+        np.ascontiguousarray(self.vectors, dtype=np.float32).tofile(path / VECTORS_FILE)
+
+        with open(path / DOCSTORE_FILE, "wb") as f:
+            pickle.dump((self.docstore, self.index_to_docstore_id), f)
+
+        manifest = {
+            "mode": self.mode,
+            "num_vectors": int(self.vectors.shape[0]),
+            "dim": int(self.vectors.shape[1]),
+            "rerank_factor": self.rerank_factor
+        }
+        with open(path / QUANTIZED_MANIFEST, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load_local(cls, folder_path, embedding):
+        """
+        :param folder_path: the direction of a saved quantized store.
+        :param embedding: embedding model used to embed queries.
+        :return: QuantizedVectorStore with the float vectors memory-mapped, not loaded.
+        """
+        path = Path(folder_path)
+        with open(path / QUANTIZED_MANIFEST, 'r') as f:
+            manifest = json.load(f)
+
+        if manifest["mode"] == "binary":
+            code_index = faiss.read_index_binary(str(path / CODES_FILE))
+        else:
+            code_index = faiss.read_index(str(path / CODES_FILE))
+
+        vectors = np.memmap(path / VECTORS_FILE, dtype=np.float32, mode='r',
+                            shape=(manifest["num_vectors"], manifest["dim"]))
+
+        with open(path / DOCSTORE_FILE, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+        return cls(code_index, manifest["mode"], vectors, docstore, index_to_docstore_id, embedding,
+                   manifest["rerank_factor"])
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Quantized stores are rebuilt from a flat FAISS store, not appended to.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Use QuantizedVectorStore.from_faiss on a flat FAISS store.")
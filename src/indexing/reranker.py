@@ -0,0 +1,107 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores dense retrieval candidates with a small CPU cross-encoder, all pairs in one
+    batched forward pass. If scoring does not finish within the time budget the dense
+    ranking is returned instead (the late scores still land in the cache for next time),
+    so callers must check the score kind before comparing or thresholding scores.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", time_budget_ms=150,
+                 cache_size=1024, max_workers=2):
+        """
+        :param model_name: HuggingFace cross-encoder model name.
+        :param time_budget_ms: hard per-query budget, None = always wait for the scores.
+        :param cache_size: number of (query, candidate set) score lists kept (LRU).
+        :param max_workers: scoring threads (waiting in their queue counts against the budget).
+        """
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.time_budget_ms = time_budget_ms
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (query hash, candidate ids) -> {case_id: score}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self.reranked = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+
+    def rerank(self, query, docs_and_scores, k):
+        """
+        :param query: the query text.
+        :param docs_and_scores: dense candidates as (Document, distance) pairs, best first.
+        :param k: number of results to return.
+        :return: top k (Document, score) pairs, see rerank_with_kind for what the scores are.
+        """
+        return self.rerank_with_kind(query, docs_and_scores, k)[0]
+
+    def rerank_with_kind(self, query, docs_and_scores, k):
+        """
+        :param query: the query text.
+        :param docs_and_scores: dense candidates as (Document, distance) pairs, best first.
+        :param k: number of results to return.
+        :return: (top k (Document, score) pairs, score kind). The kind is "cross_encoder" (higher
+                 is better), or "distance" (the original distances, lower is better) when the
+                 budget fell back to the dense ranking.
+        """
+        if not docs_and_scores:
+            return [], "distance"
+
+        docs = [doc for doc, _ in docs_and_scores]
+        key = self._cache_key(query, docs)
+
+        with self.lock:
+            scores = self.cache.get(key)
+            if scores is not None:
+                self.cache.move_to_end(key)
+                self.cache_hits += 1
+        if scores is not None:
+            return self._order(docs, scores, k), "cross_encoder"
+
+        future = self.executor.submit(self._score, query, docs)
+        timeout = None if self.time_budget_ms is None else self.time_budget_ms / 1000
+        try:
+            scores = future.result(timeout=timeout)
+        except TimeoutError:
+            self.fallbacks += 1
+            future.add_done_callback(lambda done: self._store(key, done.result()) if not done.exception() else None)
+            return docs_and_scores[:k], "distance"
+
+        self._store(key, scores)
+        self.reranked += 1
+        return self._order(docs, scores, k), "cross_encoder"
+
+    def stats(self):
+        """
+        :return: how often the cross-encoder ran, fell back to dense ranking or hit the cache.
+        """
+        return {"reranked": self.reranked, "fallbacks": self.fallbacks, "cache_hits": self.cache_hits}
+
+    def _score(self, query, docs):
+        pairs = [(query, doc.page_content) for doc in docs]
+        scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        return {doc.metadata["case_id"]: float(score) for doc, score in zip(docs, scores)}
+
+    def _store(self, key, scores):
+        with self.lock:
+            self.cache[key] = scores
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    @staticmethod
+    def _order(docs, scores, k):
+        ranked = sorted(docs, key=lambda doc: scores[doc.metadata["case_id"]], reverse=True)
+        return [(doc, scores[doc.metadata["case_id"]]) for doc in ranked[:k]]
+
+    @staticmethod
+    def _cache_key(query, docs):
+        query_hash = hashlib.sha1(query.strip().lower().encode("utf-8")).hexdigest()
+        return query_hash, tuple(sorted(doc.metadata["case_id"] for doc in docs))
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.metrics import CACHE_REQUESTS
+
+# Rough per-entry overhead (keys, dict slots, Python objects) added to the payload size.
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def normalize_query(text):
+    """
+    :param text: query text.
+    :return: the text lowercased with whitespace collapsed, so trivial variants share an entry.
+    """
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class _LRU:
+    """OrderedDict LRU bounded by the summed size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # key -> (value, size)
+        self.bytes = 0
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            return None
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size):
+        if key in self.items:
+            self.bytes -= self.items.pop(key)[1]
+        self.items[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self.items:
+            self.bytes -= self.items.popitem(last=False)[1][1]
+
+    def remove_where(self, predicate):
+        for key in [key for key in self.items if predicate(key)]:
+            self.bytes -= self.items.pop(key)[1]
+
+
+class RetrievalCache:
+    """
+    Two-level cache for the retrieval path:
+    1. normalized query text -> query embedding (skips the embedding model)
+    2. (embedding hash, k, filters, index version) -> search results (skips the index search)
+
+    Both levels are in-memory LRUs sharing a byte budget. An optional SQLite file adds a
+    second tier that several processes (app, CLI, evaluation runs) can share. Results are
+    keyed by index version: once a newer version is seen, results for older ones are dropped.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, namespace="", db_path=None, db_max_entries=100000):
+        """
+        :param max_bytes: memory budget for both levels (half each).
+        :param namespace: embedding model name, so a model change never reuses old embeddings.
+        :param db_path: SQLite file for the shared on-disk tier (None = memory only).
+        :param db_max_entries: rows kept per table in the on-disk tier.
+        """
+        self.namespace = namespace
+        self.embeddings = _LRU(max_bytes // 2)
+        self.results = _LRU(max_bytes // 2)
+        self.lock = threading.Lock()
+        self.index_version = None
+
+        self.db_path = Path(db_path) if db_path else None
+        self.db_max_entries = db_max_entries
+        self._local = threading.local()  # One SQLite connection per thread
+        self._db_writes = 0
+        if self.db_path is not None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_db()
+
+        self.hits = {"embedding": 0, "results": 0, "embedding_disk": 0, "results_disk": 0}
+        self.misses = {"embedding": 0, "results": 0}
+
+    def get_embedding(self, text, count_miss=True):
+        """
+        :param text: query text.
+        :param count_miss: False for a look-ahead whose miss is looked up again later.
+        :return: the cached embedding (list of floats), or None.
+        """
+        key = self._embedding_key(text)
+        with self.lock:
+            vector = self.embeddings.get(key)
+        if vector is not None:
+            self.hits["embedding"] += 1
+            CACHE_REQUESTS.inc(cache="query_embedding", result="hit")
+            return vector
+
+        if self.db_path is not None:
+            row = self._db().execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                with self.lock:
+                    self.embeddings.put(key, vector, len(row[0]) + ENTRY_OVERHEAD_BYTES)
+                self.hits["embedding_disk"] += 1
+                CACHE_REQUESTS.inc(cache="query_embedding", result="hit")
+                return vector
+
+        if count_miss:
+            self.misses["embedding"] += 1
+            CACHE_REQUESTS.inc(cache="query_embedding", result="miss")
+        return None
+
+    def put_embedding(self, text, vector):
+        """
+        :param text: query text.
+        :param vector: its embedding.
+        """
+        key = self._embedding_key(text)
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self.lock:
+            self.embeddings.put(key, list(vector), len(blob) + ENTRY_OVERHEAD_BYTES)
+        if self.db_path is not None:
+            self._db_write("INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)",
+                           (key, blob, time.time()))
+
+    def get_results(self, vector, k, index_version, filters=None, count_miss=True):
+        """
+        :param vector: query embedding.
+        :param k: number of results searched for.
+        :param index_version: version of the index the results must come from.
+        :param filters: any search filters (part of the key).
+        :param count_miss: False for a look-ahead whose miss is looked up again later.
+        :return: cached list of (Document, score) pairs, or None.
+        """
+        self._observe_version(index_version)
+        key = self._results_key(vector, k, index_version, filters)
+        with self.lock:
+            results = self.results.get(key)
+        if results is not None:
+            self.hits["results"] += 1
+            CACHE_REQUESTS.inc(cache="search_results", result="hit")
+            return results
+
+        if self.db_path is not None:
+            row = self._db().execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                results = pickle.loads(row[0])
+                with self.lock:
+                    self.results.put(key, results, len(row[0]) + ENTRY_OVERHEAD_BYTES)
+                self.hits["results_disk"] += 1
+                CACHE_REQUESTS.inc(cache="search_results", result="hit")
+                return results
+
+        if count_miss:
+            self.misses["results"] += 1
+            CACHE_REQUESTS.inc(cache="search_results", result="miss")
+        return None
+
+    def put_results(self, vector, k, index_version, docs_and_scores, filters=None):
+        """
+        :param vector: query embedding.
+        :param k: number of results searched for.
+        :param index_version: version of the index the results came from.
+        :param docs_and_scores: list of (Document, score) pairs.
+        :param filters: any search filters (part of the key).
+        """
+        self._observe_version(index_version)
+        key = self._results_key(vector, k, index_version, filters)
+        size = sum(len(doc.page_content) + ENTRY_OVERHEAD_BYTES for doc, _ in docs_and_scores)
+        with self.lock:
+            if index_version != self.index_version:
+                return  # Searched an index that was replaced meanwhile
+            self.results.put(key, docs_and_scores, size + ENTRY_OVERHEAD_BYTES)
+        if self.db_path is not None:
+            blob = pickle.dumps(docs_and_scores, protocol=pickle.HIGHEST_PROTOCOL)
+            self._db_write("INSERT OR REPLACE INTO results (key, index_version, data, created) VALUES (?, ?, ?, ?)",
+                           (key, str(index_version), blob, time.time()))
+
+    def stats(self):
+        """
+        :return: hits, misses and memory use per level.
+        """
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "embedding_entries": len(self.embeddings.items),
+            "result_entries": len(self.results.items),
+            "memory_bytes": self.embeddings.bytes + self.results.bytes
+        }
+
+    def _observe_version(self, index_version):
+        # A new version makes every older result stale: drop them from memory and disk.
+        # Version names are timestamps, so they sort in publishing order. Only move forward: a
+        # query still running on the old index during a hot reload must not reset the cache to it.
+        # None (an unversioned, legacy index) is never newer than a real version; as a string it
+        # would sort after every timestamp.
+        with self.lock:
+            if index_version == self.index_version or index_version is None:
+                return
+            if self.index_version is not None and str(index_version) < str(self.index_version):
+                return
+            self.index_version = index_version
+            version = str(index_version)
+            self.results.remove_where(lambda key: not key.endswith(f"|{version}"))
+        if self.db_path is not None:
+            # Only older versions: another process may not have reloaded yet, or may be ahead of this
+            # one. Entries of unversioned indexes ('None') sort after every version and are kept.
+            self._db_write("DELETE FROM results WHERE index_version < ? AND index_version != 'None'", (version,))
+
+    def _embedding_key(self, text):
+        return f"{self.namespace}|{normalize_query(text)}"
+
+    @staticmethod
+    def _results_key(vector, k, index_version, filters):
+        vector_hash = hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()
+        filters_key = json.dumps(filters, sort_keys=True, default=str) if filters else ""
+        return f"{vector_hash}|{k}|{filters_key}|{index_version}"
+
+    def _db(self):
+        connection = getattr(self._local, "connection", None)
+        # A connection inherited through fork() (pre-forking servers) must not be used by the child.
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers in other processes never block writers
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _init_db(self):
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, created REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS results "
+                   "(key TEXT PRIMARY KEY, index_version TEXT, data BLOB, created REAL)")
+
+    def _db_write(self, sql, params):
+        try:
+            db = self._db()
+            db.execute(sql, params)
+            self._db_writes += 1
+            if self._db_writes % 1000 == 0:
+                self._db_prune(db)
+        except sqlite3.OperationalError as e:
+            # The disk tier is an optimization: a locked or full database never fails a query.
+            print(f"Retrieval cache write skipped: {e}")
+
+    def _db_prune(self, db):
+        for table in ("embeddings", "results"):
+            db.execute(f"DELETE FROM {table} WHERE key NOT IN "
+                       f"(SELECT key FROM {table} ORDER BY created DESC LIMIT ?)", (self.db_max_entries,))
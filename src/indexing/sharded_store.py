@@ -0,0 +1,112 @@
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.vectorstores import VectorStore
+
+from src.indexing.batch_search import batch_similarity_search
+
+# Manifest written next to the shard directories, describes how the index was split.
+SHARD_MANIFEST = "shards.json"
+
+
+def shard_for_case(case_id, num_shards):
+    """
+    :param case_id: the case identifier stored in the document metadata.
+    :param num_shards: total number of shards.
+    :return: the shard number owning this case (stable across runs and machines).
+    """
+    # Python's hash() is salted per process, so use a real digest instead.
+    digest = hashlib.md5(case_id.encode("utf-8")).hexdigest()
+    return int(digest, 16) % num_shards
+
+
+def shard_dir_name(shard_id):
+    """
+    :param shard_id: the shard number.
+    :return: the directory name the shard is saved under.
+    """
+    return f"shard_{shard_id:03d}"
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    A set of independent FAISS stores searched in parallel (scatter-gather).
+    Every shard returns its own top-k, so the global top-k is always inside the
+    union of those lists and the merge is exact.
+    """
+
+    def __init__(self, shards, embedding, num_shards, num_workers=4):
+        """
+        :param shards: dict of shard number -> FAISS store (empty shards are left out).
+        :param embedding: embedding model used to embed queries.
+        :param num_shards: total number of shards the cases were hashed into.
+        :param num_workers: number of threads used to query the shards.
+        """
+        self.shards = dict(sorted(shards.items()))
+        self.embedding = embedding
+        self.num_shards = num_shards
+        # FAISS releases the GIL while searching, so threads run the shards in parallel.
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(num_workers, len(self.shards))))
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def _higher_is_better(self):
+        first_shard = next(iter(self.shards.values()), None)
+        if first_shard is None:
+            return False
+        return first_shard.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        """
+        :param embedding: the query vector.
+        :param k: number of results to return.
+        :return: the global top-k (Document, score) pairs merged from every shard.
+        """
+        futures = [
+            self.executor.submit(shard.similarity_search_with_score_by_vector, embedding, k, **kwargs)
+            for shard in self.shards.values()
+        ]
+        return self._merge([future.result() for future in futures], k)
+
+    def similarity_search_with_score_by_vectors(self, embeddings, k=4):
+        """
+        :param embeddings: list of query vectors.
+        :param k: number of results per query.
+        :return: one global top-k list per query; each shard runs a single multi-query search.
+        """
+        futures = [
+            self.executor.submit(batch_similarity_search, shard, embeddings, k)
+            for shard in self.shards.values()
+        ]
+        per_shard = [future.result() for future in futures]
+        return [self._merge([shard_results[row] for shard_results in per_shard], k) for row in range(len(embeddings))]
+
+    def _merge(self, shard_results, k):
+        candidates = [pair for results in shard_results for pair in results]
+        if self._higher_is_better():
+            return heapq.nlargest(k, candidates, key=lambda pair: pair[1])
+        return heapq.nsmallest(k, candidates, key=lambda pair: pair[1])
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return next(iter(self.shards.values()))._select_relevance_score_fn()
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Rebuild the affected shard with ClinicalEmbedder.rebuild_shard instead.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Use ClinicalEmbedder.create_sharded_vector_store to build a sharded index.")
@@ -0,0 +1,115 @@
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# File holding the name of the version that readers should load.
+CURRENT_POINTER = "CURRENT"
+VERSIONS_DIR = "versions"
+STAGING_PREFIX = ".staging-"
+
+
+class IndexVersionManager:
+    """
+    Publishes vector indexes as immutable, versioned directories:
+
+        <root>/versions/<version>/...   one complete index per version
+        <root>/CURRENT                  name of the version readers should load
+
+    A version is written to a staging directory first, renamed into place and only
+    then made current by atomically replacing the CURRENT file, so a reader never
+    sees a half written index.
+    """
+
+    def __init__(self, root):
+        """
+        :param root: the index directory (e.g. data/vector/clinical_faiss).
+        """
+        self.root = Path(root)
+        self.versions_dir = self.root / VERSIONS_DIR
+
+    def create_staging_dir(self):
+        """
+        :return: a fresh directory to write the next index version into.
+        """
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')  # Sortable by build time
+        staging_dir = self.versions_dir / f"{STAGING_PREFIX}{version}"
+        staging_dir.mkdir()
+        return staging_dir
+
+    def publish(self, staging_dir):
+        """
+        :param staging_dir: a directory returned by create_staging_dir, fully written.
+        :return: the published version name, now pointed to by CURRENT.
+        """
+        staging_dir = Path(staging_dir)
+        version = staging_dir.name[len(STAGING_PREFIX):]
+        version_dir = self.versions_dir / version
+        os.rename(staging_dir, version_dir)
+
+        # Write the pointer next to the real one and swap it in with a single rename.
+        tmp_pointer = self.root / f".{CURRENT_POINTER}.{uuid.uuid4().hex[:6]}"
+        with open(tmp_pointer, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, self.root / CURRENT_POINTER)
+
+        print(f" Published index version: {version}")
+        return version
+
+    def current_version(self):
+        """
+        :return: the current version name, or None for an unversioned index.
+        """
+        try:
+            return (self.root / CURRENT_POINTER).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def resolve(self):
+        """
+        :return: the directory holding the index readers should load.
+        """
+        # An unversioned index (legacy layout) keeps its files directly in the root.
+        return self.resolve_version(self.current_version())
+
+    def resolve_version(self, version):
+        """
+        :param version: a version name, or None for the unversioned layout.
+        :return: the directory holding that version.
+        """
+        if version is None:
+            return self.root
+        return self.versions_dir / version
+
+    def list_versions(self):
+        """
+        :return: the published version names, oldest first.
+        """
+        if not self.versions_dir.exists():
+            return []
+        return sorted(
+            path.name for path in self.versions_dir.iterdir()
+            if path.is_dir() and not path.name.startswith(STAGING_PREFIX)
+        )
+
+    def garbage_collect(self, keep=3):
+        """
+        :param keep: number of most recent versions to keep on disk.
+        :return: the removed version names. The current version is never removed.
+        """
+        current = self.current_version()
+        versions = self.list_versions()
+        removed = []
+        for version in versions[:-keep] if keep > 0 else versions:
+            if version == current:
+                continue
+            shutil.rmtree(self.versions_dir / version, ignore_errors=True)
+            removed.append(version)
+
+        if removed:
+            print(f" Removed old index versions: {', '.join(removed)}")
+        return removed
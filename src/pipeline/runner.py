@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from config.settings import Config
+from src.utils.metrics import ERRORS, PIPELINE_STAGE
+from src.utils.tracing import span
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+STATE_SAVE_INTERVAL = 5  # Seconds between state writes while a stage runs, an interrupted run keeps its progress
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileHasher:
+    """
+    md5 of files (the hash DVC uses), remembered with their size and mtime so an unchanged
+    file is never read twice. This keeps a no-op run to a stat() per file.
+    """
+
+    def __init__(self, known=None):
+        """
+        :param known: {path: [size, mtime_ns, md5]} from an earlier run.
+        """
+        self.known = known if known is not None else {}
+        self.seen = set()
+
+    def hash(self, path):
+        key = str(path)
+        stat = os.stat(path)
+        entry = self.known.get(key)
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            entry = self.known[key] = [stat.st_size, stat.st_mtime_ns, file_md5(path)]
+        self.seen.add(key)
+        return entry[2]
+
+    def prune(self):
+        """Forget files not hashed in this run"""
+        self.known = {key: entry for key, entry in self.known.items() if key in self.seen}
+
+
+class PipelineRunner:
+    """
+    Runs the stages of a DAG in dependency order and recomputes only what is stale.
+
+    Each output is recorded with a fingerprint of its input file hash, the stage's source
+    files and its config (model names, index settings). A rerun compares fingerprints and
+    skips matching items, so changing one PDF re-extracts and re-filters only that case,
+    while changing GEMINI_MODEL re-filters every case but re-extracts none. Items whose
+    input disappeared have their outputs removed, which cascades down the DAG.
+    """
+
+    def __init__(self, stages, state_path=Config.PIPELINE_STATE_FILE, dvc=Config.PIPELINE_DVC_ADD):
+        """
+        :param stages: Stage objects, see src.pipeline.stages.
+        :param state_path: JSON file with the fingerprints of the last run.
+        :param dvc: run `dvc add` on changed output directories that have a .dvc file.
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = Path(state_path)
+        self.dvc = dvc
+        self.state = self._load_state()
+        self.hasher = FileHasher(self.state["files"])
+        self.last_save = time.monotonic()
+
+    def resolve(self, targets=None):
+        """
+        :param targets: stage names to bring up to date (all if None).
+        :return: those stages and everything upstream of them, in dependency order.
+        """
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline stages form a cycle at '{name}'")
+            if name not in self.stages:
+                raise ValueError(f"Unknown pipeline stage '{name}'")
+            visiting.add(name)
+            for upstream in self.stages[name].upstream:
+                visit(upstream)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in targets or self.stages:
+            visit(name)
+        return [self.stages[name] for name in order]
+
+    def run(self, targets=None, force=False):
+        """
+        :param targets: stage names to bring up to date (all if None).
+        :param force: recompute every item of the target stages regardless of fingerprints (upstream
+            stages still only recompute stale items).
+        :return: {stage name: {ran, skipped, adopted, failed, removed, seconds}}.
+        """
+        summary = {}
+        forced = set(targets or self.stages) if force else set()
+        for stage in self.resolve(targets):
+            start = time.perf_counter()
+            with PIPELINE_STAGE.time(stage=stage.name), span("pipeline.stage", stage=stage.name) as stage_span:
+                if stage.per_item:
+                    result = self._run_items(stage, stage.name in forced)
+                else:
+                    result = self._run_whole(stage, stage.name in forced)
+                stage_span.set(**result)
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            summary[stage.name] = result
+            print(f"[{stage.name}] ran {result['ran']}, up to date {result['skipped']}, adopted {result['adopted']}, "
+                  f"failed {result['failed']}, removed {result['removed']} ({result['seconds']:.2f}s)")
+
+        if targets is None:
+            self.hasher.prune()
+        self.save()
+
+        changed = [self.stages[name] for name, result in summary.items() if result["ran"] or result["removed"]]
+        if self.dvc and changed:
+            self.dvc_add(changed)
+        return summary
+
+    def _run_items(self, stage, force):
+        stage_fingerprint = self.stage_fingerprint(stage)
+        done = self.state["stages"].setdefault(stage.name, {}).setdefault("items", {})
+        inputs = stage.inputs()
+        result = {"ran": 0, "skipped": 0, "adopted": 0, "failed": 0, "removed": 0}
+
+        for item_id in sorted(inputs):
+            fingerprint = self._combine(stage_fingerprint, self.hasher.hash(inputs[item_id]))
+            if not force and stage.is_done(item_id):
+                if done.get(item_id) == fingerprint:
+                    result["skipped"] += 1
+                    continue
+                if item_id not in done:
+                    # Output made before the runner tracked it (dvc pull, an earlier --stage run): trusted as current.
+                    done[item_id] = fingerprint
+                    result["adopted"] += 1
+                    continue
+
+            try:
+                with span(f"pipeline.{stage.name}", item=item_id):
+                    stage.run_item(item_id, inputs[item_id])
+            except Exception as e:
+                print(f"[{stage.name}] {item_id} failed: {e}")
+                ERRORS.inc(stage=stage.name, reason=type(e).__name__)
+                # Outputs of the previous input are stale: removed, so downstream stages drop them too.
+                # Recorded as failed (None), so they are retried on the next run rather than adopted.
+                stage.remove_item(item_id)
+                done[item_id] = None
+                result["failed"] += 1
+                continue
+            done[item_id] = fingerprint
+            result["ran"] += 1
+            self._save_periodically()
+
+        for item_id in [item_id for item_id in done if item_id not in inputs]:
+            stage.remove_item(item_id)
+            del done[item_id]
+            result["removed"] += 1
+        return result
+
+    def _run_whole(self, stage, force):
+        state = self.state["stages"].setdefault(stage.name, {})
+        inputs = stage.inputs()
+        result = {"ran": 0, "skipped": 0, "adopted": 0, "failed": 0, "removed": 0}
+        if not inputs:
+            print(f"[{stage.name}] no inputs, nothing to build")
+            return result
+
+        fingerprint = self._combine(self.stage_fingerprint(stage),
+                                    *(f"{item_id}:{self.hasher.hash(inputs[item_id])}" for item_id in sorted(inputs)))
+        if not force and state.get("fingerprint") == fingerprint and stage.is_done(None):
+            result["skipped"] = 1
+            return result
+
+        try:
+            stage.run(inputs)
+        except Exception as e:
+            print(f"[{stage.name}] failed: {e}")
+            ERRORS.inc(stage=stage.name, reason=type(e).__name__)
+            state.pop("fingerprint", None)
+            result["failed"] = 1
+            return result
+        state["fingerprint"] = fingerprint
+        result["ran"] = 1
+        return result
+
+    def stage_fingerprint(self, stage):
+        """
+        :return: hash of the stage's source files and config, part of every output fingerprint.
+        """
+        parts = [stage.name, json.dumps(stage.config(), sort_keys=True, default=str)]
+        parts.extend(f"{path}:{self.hasher.hash(PROJECT_ROOT / path)}" for path in stage.code)
+        return self._combine(*parts)
+
+    @staticmethod
+    def _combine(*parts):
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def dvc_add(self, stages):
+        """Refresh the .dvc files of changed output directories tracked with `dvc add`"""
+        paths = [str(path) for stage in stages for path in stage.dvc_outputs()
+                 if Path(f"{path}.dvc").exists()]
+        if not paths:
+            return
+        if shutil.which("dvc") is None:
+            print(f"dvc not installed, run `dvc add {' '.join(paths)}` to track the new outputs")
+            return
+        print(f"Updating DVC tracking: {', '.join(paths)}")
+        subprocess.run(["dvc", "add", *paths], check=True)
+
+    def _save_periodically(self):
+        if time.monotonic() - self.last_save >= STATE_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.state["files"] = self.hasher.known
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.state_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.state_path)  # Atomic, a crash leaves the previous state
+        self.last_save = time.monotonic()
+
+    def _load_state(self):
+        if self.state_path.exists():
+            try:
+                with open(self.state_path, "r") as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                print(f"Pipeline state {self.state_path} unreadable, starting over")
+        return {"files": {}, "stages": {}}
@@ -0,0 +1,241 @@
+import json
+import shutil
+from pathlib import Path
+
+from config.settings import Config
+
+
+class Stage:
+    """
+    One step of the pipeline DAG. A per-item stage maps each input file to its own outputs,
+    so only new or changed items are recomputed. A whole stage (per_item = False) builds one
+    output from all of its inputs at once.
+    """
+
+    name = None
+    upstream = ()  # Names of the stages whose outputs are this stage's inputs
+    code = ()  # Source files, relative to the project root, whose changes invalidate every output
+    per_item = True
+
+    def config(self):
+        """
+        :return: settings that invalidate every output when they change (model names, ...).
+        """
+        return {}
+
+    def inputs(self):
+        """
+        :return: {item id: input file}.
+        """
+        raise NotImplementedError
+
+    def outputs(self, item_id):
+        """
+        :param item_id: item of a per-item stage, None for a whole stage.
+        :return: files that exist once the item is done.
+        """
+        raise NotImplementedError
+
+    def is_done(self, item_id):
+        """
+        :param item_id: item of a per-item stage, None for a whole stage.
+        :return: whether the outputs are present (deleted outputs are rebuilt even if fingerprints match).
+        """
+        return all(Path(path).exists() for path in self.outputs(item_id))
+
+    def run_item(self, item_id, path):
+        raise NotImplementedError
+
+    def run(self, inputs):
+        raise NotImplementedError
+
+    def remove_item(self, item_id):
+        """Delete the outputs of an item whose input is gone"""
+        for path in self.outputs(item_id):
+            Path(path).unlink(missing_ok=True)
+
+    def dvc_outputs(self):
+        """
+        :return: output directories that may be tracked with `dvc add` (a sibling <dir>.dvc file).
+        """
+        return []
+
+
+class ExtractStage(Stage):
+    """PDF -> extracted/<case>/metadata.json and page images"""
+
+    name = "extract"
+    code = ("src/extraction/pdf_extractor.py",)
+
+    def __init__(self, raw_dir=Config.RAW_DATA_DIR, extracted_dir=f"{Config.PROCESSED_DATA_DIR}/extracted"):
+        self.raw_dir = Path(raw_dir)
+        self.extracted_dir = Path(extracted_dir)
+        self.extractor = None
+
+    def inputs(self):
+        if not self.raw_dir.exists():
+            return {}
+        return {pdf.stem: pdf for pdf in self.raw_dir.glob("*.pdf")}
+
+    def outputs(self, item_id):
+        return [self.extracted_dir / item_id / "metadata.json"]
+
+    def run_item(self, item_id, path):
+        from src.extraction.pdf_extractor import ClinicalPDFExtractor
+
+        if self.extractor is None:
+            self.extractor = ClinicalPDFExtractor(self.extracted_dir)
+        # Images of an earlier extraction with more pages must not outlive it.
+        shutil.rmtree(self.extracted_dir / item_id, ignore_errors=True)
+        self.extractor.extract_case_report(path)
+
+    def remove_item(self, item_id):
+        shutil.rmtree(self.extracted_dir / item_id, ignore_errors=True)
+
+    def dvc_outputs(self):
+        return [self.extracted_dir]
+
+
+class FilterStage(Stage):
+    """extracted/<case>/metadata.json -> filtered/<case>_filtered.json, one LLM request per page"""
+
+    name = "filter"
+    upstream = ("extract",)
+    code = ("src/filtering/gemini_client.py",)
+
+    def __init__(self, extracted_dir=f"{Config.PROCESSED_DATA_DIR}/extracted",
+                 filtered_dir=f"{Config.PROCESSED_DATA_DIR}/filtered"):
+        self.extracted_dir = Path(extracted_dir)
+        self.filtered_dir = Path(filtered_dir)
+        self.client = None
+
+    def config(self):
+        return {"model": Config.GEMINI_MODEL}
+
+    def inputs(self):
+        if not self.extracted_dir.exists():
+            return {}
+        return {folder.name: folder / "metadata.json" for folder in self.extracted_dir.iterdir()
+                if (folder / "metadata.json").exists()}
+
+    def outputs(self, item_id):
+        return [self.filtered_dir / f"{item_id}_filtered.json"]
+
+    def run_item(self, item_id, path):
+        from src.filtering.gemini_client import GeminiClient
+
+        if self.client is None:
+            self.client = GeminiClient()  # One client, so the request pacing spans all cases
+        with open(path, "r") as f:
+            case = json.load(f)
+        self.client.save_filtered_case(self.client.filter_case(case), output_dir=self.filtered_dir)
+
+    def dvc_outputs(self):
+        return [self.filtered_dir]
+
+
+class ChunkStage(Stage):
+    """filtered/<case>_filtered.json -> chunks/<case>.json, the texts embedded for the case"""
+
+    name = "chunk"
+    upstream = ("filter",)
+    code = ("src/embedding/embedder.py",)
+
+    def __init__(self, filtered_dir=f"{Config.PROCESSED_DATA_DIR}/filtered", chunks_dir=Config.PIPELINE_CHUNKS_DIR):
+        self.filtered_dir = Path(filtered_dir)
+        self.chunks_dir = Path(chunks_dir)
+        self.embedder = None
+
+    def inputs(self):
+        if not self.filtered_dir.exists():
+            return {}
+        return {path.stem.removesuffix("_filtered"): path for path in self.filtered_dir.glob("*.json")}
+
+    def outputs(self, item_id):
+        return [self.chunks_dir / f"{item_id}.json"]
+
+    def run_item(self, item_id, path):
+        from src.embedding.embedder import ClinicalEmbedder
+
+        if self.embedder is None:
+            self.embedder = ClinicalEmbedder()
+        with open(path, "r") as f:
+            case = json.load(f)
+        chunks = [{"text": self.embedder.prepare_text_for_embedding(case), "metadata": {"case_id": case["case_id"]}}]
+
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.chunks_dir / f"{item_id}.json", "w", encoding="utf-8") as f:
+            json.dump(chunks, f, ensure_ascii=False)
+
+
+class EmbedStage(Stage):
+    """chunks/*.json -> a new published index version, unchanged texts reuse their cached vectors"""
+
+    name = "embed"
+    upstream = ("chunk",)
+    code = ("src/embedding/embedder.py", "src/indexing/sharded_store.py", "src/indexing/quantized_store.py")
+    per_item = False
+
+    def __init__(self, chunks_dir=Config.PIPELINE_CHUNKS_DIR, vector_store_path=None,
+                 cache_path=Config.PIPELINE_EMBEDDING_CACHE):
+        """
+        :param vector_store_path: versioned index root (the embedder's VECTOR_STORE_PATH if not given).
+        """
+        self.chunks_dir = Path(chunks_dir)
+        self._vector_store_path = vector_store_path
+        self.cache_path = cache_path
+
+    @property
+    def vector_store_path(self):
+        # Resolved on use, a no-op run never imports the embedding stack.
+        if self._vector_store_path is None:
+            from src.embedding.embedder import VECTOR_STORE_PATH
+            self._vector_store_path = VECTOR_STORE_PATH
+        return self._vector_store_path
+
+    def config(self):
+        return {
+            "model": Config.TEXT_EMBEDDING_MODEL,
+            "num_shards": Config.INDEX_NUM_SHARDS,
+            "quantization": Config.INDEX_QUANTIZATION,
+            "rerank_factor": Config.QUANTIZED_RERANK_FACTOR
+        }
+
+    def inputs(self):
+        if not self.chunks_dir.exists():
+            return {}
+        return {path.stem: path for path in self.chunks_dir.glob("*.json")}
+
+    def outputs(self, item_id):
+        return []
+
+    def is_done(self, item_id):
+        from src.indexing.versioning import IndexVersionManager
+
+        return IndexVersionManager(self.vector_store_path).current_version() is not None
+
+    def run(self, inputs):
+        from langchain.docstore.document import Document
+        from src.embedding.embedder import ClinicalEmbedder
+        from src.embedding.embedding_cache import CachedEmbeddings
+
+        documents = []
+        for item_id in sorted(inputs):
+            with open(inputs[item_id], "r", encoding="utf-8") as f:
+                documents.extend(Document(page_content=chunk["text"], metadata=chunk["metadata"])
+                                 for chunk in json.load(f))
+
+        embedder = ClinicalEmbedder()
+        embeddings = CachedEmbeddings(embedder.load_embeddings(Config.TEXT_EMBEDDING_MODEL), self.cache_path,
+                                      Config.TEXT_EMBEDDING_MODEL)
+        vector_store = embedder.create_index(documents, Config.TEXT_EMBEDDING_MODEL, embeddings)
+        version = embedder.publish_vector_store(vector_store, self.vector_store_path)
+        print(f"Embedded {embeddings.misses} new chunks, reused {embeddings.hits} cached vectors, "
+              f"published version {version}")
+
+
+def default_stages():
+    """
+    :return: extract -> filter -> chunk -> embed, on the configured directories.
+    """
+    return [ExtractStage(), FilterStage(), ChunkStage(), EmbedStage()]
@@ -0,0 +1,431 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config.settings import Config
+from src.indexing.quantized_store import QUANTIZED_MANIFEST
+from src.indexing.sharded_store import SHARD_MANIFEST
+from src.indexing.versioning import IndexVersionManager
+from src.pipeline.stages import ChunkStage, ExtractStage
+from src.utils.metrics import ERRORS
+from src.utils.rate_limit import TokenBucket
+from src.utils.tracing import span
+
+
+class StageStats:
+    """Items, failures and busy time of the workers of one stage"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.items = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def record(self, seconds, items=1, failed=False):
+        self.busy_seconds += seconds
+        self.items += items
+        self.failed += items if failed else 0
+
+    def summary(self, elapsed):
+        return {
+            "items": self.items,
+            "failed": self.failed,
+            "items_per_second": self.items / elapsed if elapsed else 0.0,
+            "utilization": self.busy_seconds / (elapsed * self.workers) if elapsed else 0.0
+        }
+
+
+class QueueStats:
+    """Occupancy of a bounded queue, sampled at a fixed interval"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.samples = 0
+        self.total = 0
+        self.max = 0
+        self.full = 0
+
+    def sample(self):
+        size = self.queue.qsize()
+        self.samples += 1
+        self.total += size
+        self.max = max(self.max, size)
+        self.full += self.queue.full()
+
+    def summary(self):
+        return {
+            "capacity": self.queue.maxsize,
+            "mean": self.total / self.samples if self.samples else 0.0,
+            "max": self.max,
+            "full_fraction": self.full / self.samples if self.samples else 0.0
+        }
+
+
+class StreamingIngestion:
+    """
+    Ingests PDFs end to end with the stages running concurrently instead of one after the other:
+
+        PDFs -> [extract workers] -> queue -> [async filter workers] -> queue -> [index worker]
+
+    Every queue is bounded, so a slow stage makes the ones before it wait (backpressure)
+    instead of piling up extracted cases in memory. Extraction runs in threads, filtering
+    sends all pages of a case to Gemini concurrently under a shared rate limit, and the index
+    worker embeds what has arrived in micro-batches, appends it to the flat FAISS index and
+    publishes a new version. A new PDF is searchable about one filter round trip after its
+    extraction, once running apps pick up the version (INDEX_RELOAD_INTERVAL).
+
+    The same extracted, filtered and chunk files as --stage pipeline are written, so a later
+    pipeline run adopts them instead of filtering again.
+    """
+
+    def __init__(self, client=None, embeddings=None, vector_store_path=None,
+                 extracted_dir=f"{Config.PROCESSED_DATA_DIR}/extracted",
+                 filtered_dir=f"{Config.PROCESSED_DATA_DIR}/filtered", chunks_dir=Config.PIPELINE_CHUNKS_DIR,
+                 extract_workers=Config.INGEST_EXTRACT_WORKERS, filter_workers=Config.INGEST_FILTER_WORKERS,
+                 queue_size=Config.INGEST_QUEUE_SIZE, batch_size=Config.INGEST_INDEX_BATCH_SIZE,
+                 max_wait_seconds=Config.INGEST_INDEX_MAX_WAIT_SECONDS,
+                 requests_per_minute=Config.LLM_REQUESTS_PER_MINUTE, publish_interval=0, on_complete=None,
+                 publish_retry_seconds=Config.INGEST_PUBLISH_RETRY_SECONDS,
+                 publish_max_attempts=Config.INGEST_PUBLISH_MAX_ATTEMPTS):
+        """
+        :param client: GeminiClient (created if not given).
+        :param embeddings: embedding model (cached TEXT_EMBEDDING_MODEL if not given).
+        :param vector_store_path: versioned index root (the embedder's VECTOR_STORE_PATH if not given).
+        :param extract_workers: PDFs extracted at once, in threads.
+        :param filter_workers: cases filtered at once.
+        :param queue_size: items each queue holds before the stage feeding it waits.
+        :param batch_size: most cases embedded and appended per index version.
+        :param max_wait_seconds: longest the index worker waits for a batch to fill.
+        :param requests_per_minute: filter request rate (None = unlimited).
+        :param publish_interval: least seconds between published index versions (0 = after every batch).
+            Appended cases wait in memory until the next version is published.
+        :param on_complete: called with (case_id, error) once a case is published (error None) or has failed.
+        :param publish_retry_seconds: wait after a failed publish, doubled after each further failure
+            (up to INGEST_PUBLISH_RETRY_MAX_SECONDS) and independent of publish_interval.
+        :param publish_max_attempts: failed publishes in a row after which the unpublished cases are
+            removed from the index and reported failed.
+        """
+        if Config.INDEX_NUM_SHARDS > 1 or Config.INDEX_QUANTIZATION:
+            raise ValueError("Streaming ingestion appends to a flat index, "
+                             "build sharded or quantized indexes with --stage pipeline")
+
+        from src.embedding.embedder import ClinicalEmbedder, VECTOR_STORE_PATH
+
+        self.embedder = ClinicalEmbedder()
+        self.client = client
+        self.embeddings = embeddings
+        self.vector_store_path = vector_store_path or VECTOR_STORE_PATH
+        self.filtered_dir = Path(filtered_dir)
+        self.extractor = ExtractStage(extracted_dir=extracted_dir)
+        self.chunker = ChunkStage(filtered_dir=filtered_dir, chunks_dir=chunks_dir)
+        self.extract_workers = extract_workers
+        self.filter_workers = filter_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.publish_interval = publish_interval
+        self.on_complete = on_complete
+        self.publish_retry_seconds = publish_retry_seconds
+        self.publish_max_attempts = publish_max_attempts
+        self.rate_limiter = None
+        if requests_per_minute:
+            self.rate_limiter = TokenBucket(requests_per_minute / 60, max(1, filter_workers))
+
+        self.store = None
+        self.case_doc_ids = {}  # case_id -> docstore ids, to replace a case that is ingested again
+        self.versions = []
+        self.unpublished = []  # (case_id, submitted) appended to the index since the last published version
+        self.last_publish = 0.0
+        self.publish_failures = 0  # Failed publishes in a row
+        self.publish_retry_at = 0.0
+        self.searchable_seconds = []  # From submit to published, per case
+        self.started = None
+
+    async def start(self):
+        """Create the queues and start the workers (call from the event loop that submits)"""
+        if self.client is None:
+            from src.filtering.gemini_client import GeminiClient
+            self.client = GeminiClient()
+        if self.embeddings is None:
+            from src.embedding.embedding_cache import CachedEmbeddings
+            self.embeddings = CachedEmbeddings(self.embedder.load_embeddings(Config.TEXT_EMBEDDING_MODEL),
+                                               Config.PIPELINE_EMBEDDING_CACHE, Config.TEXT_EMBEDDING_MODEL)
+        await asyncio.to_thread(self._load_store)
+
+        self.pdfs = asyncio.Queue(self.queue_size)
+        self.extracted = asyncio.Queue(self.queue_size)
+        self.filtered = asyncio.Queue(self.queue_size)
+        self.queue_stats = {name: QueueStats(queue) for name, queue in
+                            (("pdfs", self.pdfs), ("extracted", self.extracted), ("filtered", self.filtered))}
+        self.stage_stats = {"extract": StageStats(self.extract_workers), "filter": StageStats(self.filter_workers),
+                            "index": StageStats(1)}
+        self.started = time.perf_counter()
+
+        self.extract_tasks = [asyncio.create_task(self._extract_worker()) for _ in range(self.extract_workers)]
+        self.filter_tasks = [asyncio.create_task(self._filter_worker()) for _ in range(self.filter_workers)]
+        self.index_task = asyncio.create_task(self._index_worker())
+        self.monitor_task = asyncio.create_task(self._monitor())
+
+    async def submit(self, pdf_path):
+        """
+        :param pdf_path: PDF to ingest. Waits while the first queue is full.
+        """
+        await self.pdfs.put((Path(pdf_path).stem, Path(pdf_path), time.perf_counter()))
+
+    async def close(self):
+        """
+        Let every submitted PDF finish, then stop the workers.
+
+        :return: the report, see report().
+        """
+        # Each stage stops once the one before it has stopped and its queue is drained.
+        for queue, tasks in ((self.pdfs, self.extract_tasks), (self.extracted, self.filter_tasks),
+                             (self.filtered, [self.index_task])):
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        self.monitor_task.cancel()
+        return self.report()
+
+    async def run(self, pdf_paths):
+        """
+        :param pdf_paths: PDFs to ingest.
+        :return: the report, see report().
+        """
+        await self.start()
+        for pdf_path in pdf_paths:
+            await self.submit(pdf_path)
+        return await self.close()
+
+    async def _extract_worker(self):
+        while (item := await self.pdfs.get()) is not None:
+            case_id, pdf_path, submitted = item
+            start = time.perf_counter()
+            try:
+                case = await asyncio.to_thread(self._extract, case_id, pdf_path)
+            except Exception as e:
+                self._failed("extract", [case_id], e, start)
+                continue
+            self.stage_stats["extract"].record(time.perf_counter() - start)
+            await self.extracted.put((case_id, case, submitted))
+
+    async def _filter_worker(self):
+        while (item := await self.extracted.get()) is not None:
+            case_id, case, submitted = item
+            start = time.perf_counter()
+            try:
+                case_data = await self.client.afilter_case(case, self.rate_limiter)
+                self.client.save_filtered_case(case_data, output_dir=self.filtered_dir)
+            except Exception as e:
+                self._failed("filter", [case_id], e, start)
+                continue
+            self.stage_stats["filter"].record(time.perf_counter() - start)
+            await self.filtered.put((case_id, case_data, submitted))
+
+    async def _index_worker(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                # With cases waiting to be published, wake up when their version is due.
+                item = await asyncio.wait_for(self.filtered.get(), self._publish_due_in())
+            except asyncio.TimeoutError:
+                await self._publish()
+                continue
+            deadline = loop.time() + self.max_wait_seconds
+            # Take what has arrived, waiting up to max_wait_seconds for the batch to fill.
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.filtered.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            stopping = item is None
+
+            if batch:
+                start = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._append, batch)
+                except Exception as e:
+                    self._failed("index", [case_id for case_id, _, _ in batch], e, start)
+                else:
+                    self.stage_stats["index"].record(time.perf_counter() - start, len(batch))
+                    self.unpublished.extend((case_id, submitted) for case_id, _, submitted in batch)
+            if stopping or self._publish_due_in() == 0:
+                await self._publish()
+
+        # Stopping: a failed publish is retried until it succeeds or the cases are given up.
+        while self.unpublished:
+            await asyncio.sleep(self._publish_due_in())
+            await self._publish()
+
+    def _publish_due_in(self):
+        if not self.unpublished:
+            return None
+        due = max(self.last_publish + self.publish_interval, self.publish_retry_at)
+        return max(0.0, due - time.perf_counter())
+
+    async def _publish(self):
+        if not self.unpublished:
+            return
+        start = time.perf_counter()
+        try:
+            version = await asyncio.to_thread(self.embedder.publish_vector_store, self.store, self.vector_store_path)
+        except Exception as e:
+            ERRORS.inc(stage="ingest_publish", reason=type(e).__name__)
+            self._publish_failed(e, start)
+            return
+        self.publish_failures = 0
+        self.versions.append(version)
+        self.last_publish = now = time.perf_counter()
+        self.stage_stats["index"].record(now - start, items=0)  # Publishing is index work too
+        published, self.unpublished = self.unpublished, []
+        for case_id, submitted in published:
+            self.searchable_seconds.append(now - submitted)
+            if self.on_complete is not None:
+                self.on_complete(case_id, None)
+
+    def _publish_failed(self, error, start):
+        # Back off so a persistent failure (disk full, permissions) does not rewrite the index in a loop.
+        self.publish_failures += 1
+        if self.publish_failures < self.publish_max_attempts:
+            delay = min(self.publish_retry_seconds * 2 ** (self.publish_failures - 1),
+                        Config.INGEST_PUBLISH_RETRY_MAX_SECONDS)
+            self.publish_retry_at = time.perf_counter() + delay
+            print(f"[index] publish failed (attempt {self.publish_failures}/{self.publish_max_attempts}), "
+                  f"retrying in {delay:.1f}s: {error}")
+            return
+
+        # Given up: take the cases out of the index, so a later version does not publish cases
+        # already reported failed (the watcher retries them from their PDFs).
+        case_ids = list(dict.fromkeys(case_id for case_id, _ in self.unpublished))
+        stale = [doc_id for case_id in case_ids for doc_id in self.case_doc_ids.pop(case_id, [])]
+        if stale:
+            self.store.delete(stale)
+        self.unpublished = []
+        self.publish_failures = 0
+        self.publish_retry_at = 0.0
+        self._failed("index", case_ids, error, start, counted=True)
+
+    async def _monitor(self):
+        last_report = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.1)
+            for stats in self.queue_stats.values():
+                stats.sample()
+            if time.perf_counter() - last_report >= Config.INGEST_REPORT_INTERVAL:
+                last_report = time.perf_counter()
+                self.print_progress()
+
+    def _extract(self, case_id, pdf_path):
+        self.extractor.run_item(case_id, pdf_path)
+        with open(self.extractor.outputs(case_id)[0], "r") as f:
+            return json.load(f)
+
+    def _append(self, batch):
+        texts, metadatas = [], []
+        for case_id, _, _ in batch:
+            self.chunker.run_item(case_id, self.filtered_dir / f"{case_id}_filtered.json")
+            with open(self.chunker.outputs(case_id)[0], "r", encoding="utf-8") as f:
+                for chunk in json.load(f):
+                    texts.append(chunk["text"])
+                    metadatas.append(chunk["metadata"])
+
+        with span("embed.batch", documents=len(texts), chars=sum(len(text) for text in texts)):
+            vectors = self.embeddings.embed_documents(texts)
+
+        with span("index.append", vectors=len(vectors)):
+            from langchain_community.vectorstores import FAISS
+
+            if self.store is None:
+                self.store = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas)
+                ids = list(self.store.index_to_docstore_id.values())
+            else:
+                # A case ingested again replaces its earlier documents.
+                stale = [doc_id for case_id, _, _ in batch for doc_id in self.case_doc_ids.pop(case_id, [])]
+                if stale:
+                    self.store.delete(stale)
+                ids = self.store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+            for doc_id, metadata in zip(ids, metadatas):
+                self.case_doc_ids.setdefault(metadata["case_id"], []).append(doc_id)
+
+    def _load_store(self):
+        from langchain_community.vectorstores import FAISS
+
+        versions = IndexVersionManager(self.vector_store_path)
+        path = versions.resolve()
+        if not (path / "index.faiss").exists():
+            return  # No index yet, the first batch creates it
+        if (path / SHARD_MANIFEST).exists() or (path / QUANTIZED_MANIFEST).exists():
+            raise ValueError(f"{path} is sharded or quantized, streaming ingestion appends to a flat index")
+
+        # Copied into memory: a memory-mapped index (INDEX_MMAP) is read-only and cannot be appended to.
+        self.store = FAISS.load_local(str(path), self.embeddings)
+        for doc_id in self.store.index_to_docstore_id.values():
+            case_id = self.store.docstore.search(doc_id).metadata.get("case_id")
+            self.case_doc_ids.setdefault(case_id, []).append(doc_id)
+        print(f"Appending to index version {versions.current_version()} ({self.store.index.ntotal} vectors)")
+
+    def _failed(self, stage, case_ids, error, start, counted=False):
+        # counted: the cases were already recorded as items of the stage, only the failure is new.
+        print(f"[{stage}] {', '.join(case_ids)} failed: {error}")
+        ERRORS.inc(stage=f"ingest_{stage}", reason=type(error).__name__)
+        stats = self.stage_stats[stage]
+        if counted:
+            stats.record(time.perf_counter() - start, items=0)
+            stats.failed += len(case_ids)
+        else:
+            stats.record(time.perf_counter() - start, len(case_ids), failed=True)
+        if self.on_complete is not None:
+            for case_id in case_ids:
+                self.on_complete(case_id, error)
+
+    def report(self):
+        """
+        :return: per-stage items, failures, throughput and utilization (busy share of its workers),
+            per-queue occupancy, the bottleneck stage and the time from submit to searchable.
+        """
+        elapsed = time.perf_counter() - self.started
+        stages = {name: stats.summary(elapsed) for name, stats in self.stage_stats.items()}
+        searchable = {}
+        if self.searchable_seconds:
+            searchable = {f"p{q}_seconds": float(np.percentile(self.searchable_seconds, q)) for q in (50, 95)}
+            searchable["max_seconds"] = max(self.searchable_seconds)
+        return {
+            "seconds": elapsed,
+            "stages": stages,
+            "queues": {name: stats.summary() for name, stats in self.queue_stats.items()},
+            "bottleneck": max(stages, key=lambda name: stages[name]["utilization"]) if self.stage_stats["extract"].items
+            else None,
+            "searchable": searchable,
+            "versions_published": len(self.versions)
+        }
+
+    def print_progress(self):
+        elapsed = time.perf_counter() - self.started
+        stages = " | ".join(f"{name} {stats.items} ({stats.items / elapsed:.2f}/s)"
+                            for name, stats in self.stage_stats.items())
+        queues = " ".join(f"{name} {stats.queue.qsize()}/{stats.queue.maxsize}"
+                          for name, stats in self.queue_stats.items())
+        print(f"[ingest {elapsed:.0f}s] {stages} | queues {queues}")
+
+    @staticmethod
+    def print_report(report):
+        print(f"\n{'stage':<10}{'items':>7}{'failed':>8}{'items/s':>10}{'busy':>8}")
+        for name, stats in report["stages"].items():
+            print(f"{name:<10}{stats['items']:>7}{stats['failed']:>8}{stats['items_per_second']:>10.2f}"
+                  f"{stats['utilization']:>8.0%}")
+        print(f"\n{'queue':<10}{'capacity':>9}{'mean':>7}{'max':>5}{'full':>7}")
+        for name, stats in report["queues"].items():
+            print(f"{name:<10}{stats['capacity']:>9}{stats['mean']:>7.1f}{stats['max']:>5}{stats['full_fraction']:>7.0%}")
+        print(f"\nBottleneck: {report['bottleneck']} | {report['versions_published']} versions published "
+              f"in {report['seconds']:.1f}s")
+        if report["searchable"]:
+            print(f"Submit to searchable: p50 {report['searchable']['p50_seconds']:.1f}s | "
+                  f"p95 {report['searchable']['p95_seconds']:.1f}s | max {report['searchable']['max_seconds']:.1f}s")
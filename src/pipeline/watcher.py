@@ -0,0 +1,301 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from config.settings import Config
+from src.pipeline.runner import file_md5
+from src.pipeline.streaming import StreamingIngestion
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Optional: without it the folder is only polled
+    FileSystemEventHandler = object
+    Observer = None
+
+STATUS_TIMEOUT_SECONDS = 5  # A /status request gives up (503) if the event loop does not answer in time
+
+
+class WatchState:
+    """
+    Ingestion status of every PDF seen, by case id. Written atomically on every change, so after
+    a crash or restart the PDFs that were queued but never published are ingested again.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.files = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.files = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Watch state {self.path} unreadable, every PDF will be checked again")
+
+    def get(self, case_id):
+        with self.lock:
+            return dict(self.files.get(case_id, {}))
+
+    def update(self, case_id, **fields):
+        with self.lock:
+            self.files.setdefault(case_id, {}).update(fields, updated=time.time())
+            self._save()
+
+    def counts(self):
+        with self.lock:
+            counts = {}
+            for entry in self.files.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            return counts
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.files, f)
+        os.replace(temp_path, self.path)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path and str(path).endswith(".pdf"):
+                self.callback(Path(path))
+
+
+class IngestionDaemon:
+    """
+    Watches a folder of case reports and streams new or modified PDFs into the live index.
+
+    Changes come from inotify (watchdog) when installed, and from a folder scan every
+    poll_interval either way, so nothing is missed on file systems without events. A PDF is
+    submitted once it has been unchanged for debounce_seconds, which skips files still being
+    copied, and only if its content differs from what was last published. Cases go through
+    StreamingIngestion, which publishes a new index version at most every publish_interval.
+    """
+
+    def __init__(self, watch_dir=Config.RAW_DATA_DIR, state_path=Config.WATCH_STATE_FILE,
+                 debounce_seconds=Config.WATCH_DEBOUNCE_SECONDS, poll_interval=Config.WATCH_POLL_INTERVAL,
+                 publish_interval=Config.WATCH_PUBLISH_INTERVAL, max_attempts=Config.WATCH_MAX_ATTEMPTS,
+                 status_port=Config.WATCH_STATUS_PORT, ingestion=None):
+        """
+        :param watch_dir: folder of PDFs.
+        :param state_path: JSON file with the status of every PDF.
+        :param debounce_seconds: a PDF must be unchanged this long before it is ingested.
+        :param poll_interval: seconds between folder scans.
+        :param publish_interval: least seconds between published index versions.
+        :param max_attempts: failed PDFs are retried this many times, then only once modified.
+        :param status_port: port of the GET /status endpoint (None = no endpoint, 0 = any free port).
+        :param ingestion: StreamingIngestion to use (created if not given).
+        """
+        self.watch_dir = Path(watch_dir)
+        self.state = WatchState(state_path)
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.status_port = status_port
+        self.ingestion = ingestion or StreamingIngestion()
+        self.ingestion.publish_interval = publish_interval
+        self.ingestion.on_complete = self._completed
+
+        self.changes = {}  # path -> (last change seen, size, mtime_ns), waiting to settle
+        self.in_flight = {}  # case_id -> submissions not yet published or failed
+        self.paths = {}  # case_id -> path of the PDF
+        self.mode = "polling"
+        self.status_server = None
+        self.started = time.time()
+
+    async def run(self, stop_event=None):
+        """
+        Run until stop_event is set (or SIGINT/SIGTERM when not given), then let the cases in
+        flight finish and publish them.
+        """
+        self.loop = asyncio.get_running_loop()
+        if stop_event is None:
+            stop_event = asyncio.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                self.loop.add_signal_handler(sig, stop_event.set)
+
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        await self.ingestion.start()
+        observer = self._start_observer()
+        self._start_status_server()
+        print(f"Watching {self.watch_dir} ({self.mode}), debounce {self.debounce_seconds}s, "
+              f"publishing at most every {self.ingestion.publish_interval}s")
+
+        last_scan = 0.0
+        try:
+            while not stop_event.is_set():
+                if time.monotonic() - last_scan >= self.poll_interval:
+                    self._scan()
+                    last_scan = time.monotonic()
+                await self._submit_settled()
+                try:
+                    await asyncio.wait_for(stop_event.wait(), min(0.5, self.debounce_seconds or 0.5))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            print("Stopping: finishing the cases in flight...")
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            report = await self.ingestion.close()
+            if self.status_server is not None:
+                self.status_server.shutdown()
+            StreamingIngestion.print_report(report)
+
+    def _start_observer(self):
+        if Observer is None:
+            return None
+        observer = Observer()
+        observer.schedule(_EventHandler(lambda path: self.loop.call_soon_threadsafe(self._touch, path)),
+                          str(self.watch_dir), recursive=False)
+        observer.start()
+        self.mode = "inotify"
+        return observer
+
+    def _scan(self):
+        """Mark every PDF whose size or mtime differs from its last ingested version"""
+        for path in self.watch_dir.glob("*.pdf"):
+            if path in self.changes or self.in_flight.get(path.stem):
+                continue
+            stat = path.stat()
+            entry = self.state.get(path.stem)
+            unchanged = entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+            if unchanged and (entry.get("status") == "done" or
+                              (entry.get("status") == "failed" and entry["attempts"] >= self.max_attempts)):
+                continue
+            self._touch(path)
+
+    def _touch(self, path):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.changes.pop(path, None)  # Deleted (or moved away) before it settled
+            return
+        self.changes[path] = (time.monotonic(), stat.st_size, stat.st_mtime_ns)
+
+    async def _submit_settled(self):
+        now = time.monotonic()
+        for path, (seen, size, mtime_ns) in list(self.changes.items()):
+            if now - seen < self.debounce_seconds:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self.changes[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self.changes[path] = (now, stat.st_size, stat.st_mtime_ns)  # Still being written
+                continue
+            del self.changes[path]
+
+            case_id = path.stem
+            md5 = await asyncio.to_thread(file_md5, path)
+            entry = self.state.get(case_id)
+            if entry.get("md5") == md5 and entry.get("status") == "done":
+                # Touched but not changed: remember the new mtime so scans skip it.
+                self.state.update(case_id, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                continue
+
+            attempts = entry.get("attempts", 0) if entry.get("md5") == md5 else 0
+            self.state.update(case_id, status="queued", md5=md5, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                              attempts=attempts, error=None)
+            self.in_flight[case_id] = self.in_flight.get(case_id, 0) + 1
+            self.paths[case_id] = path
+            print(f"Queued {path.name}")
+            await self.ingestion.submit(path)  # Waits while the ingestion queues are full
+
+    def _completed(self, case_id, error):
+        self.in_flight[case_id] = self.in_flight.get(case_id, 1) - 1
+        if error is None:
+            if self.in_flight[case_id] == 0:  # A newer copy still in flight keeps the case queued
+                self.state.update(case_id, status="done", published=time.time())
+            return
+
+        attempts = self.state.get(case_id).get("attempts", 0) + 1
+        self.state.update(case_id, status="failed", attempts=attempts, error=str(error))
+        if attempts < self.max_attempts and case_id in self.paths:
+            self._touch(self.paths[case_id])  # Retried once the debounce delay has passed
+
+    def status(self):
+        """
+        Call on the event loop, which owns the backlog and the ingestion stats (see status_threadsafe).
+
+        :return: backlog (debouncing, in flight, queue sizes), file counts by status, throughput
+            per stage and the last published version.
+        """
+        ingestion = self.ingestion
+        report = ingestion.report() if ingestion.started else {"stages": {}}
+        return {
+            "watching": str(self.watch_dir),
+            "mode": self.mode,
+            "uptime_seconds": time.time() - self.started,
+            "backlog": {
+                "debouncing": len(self.changes),
+                "in_flight": sum(self.in_flight.values()),
+                "unpublished": len(ingestion.unpublished),
+                "queues": {name: stats.queue.qsize() for name, stats in getattr(ingestion, "queue_stats", {}).items()}
+            },
+            "files": self.state.counts(),
+            "throughput": {name: {"items": stats["items"], "failed": stats["failed"],
+                                  "items_per_second": stats["items_per_second"]}
+                           for name, stats in report["stages"].items()},
+            "bottleneck": report.get("bottleneck"),
+            "searchable": report.get("searchable"),
+            "last_version": ingestion.versions[-1] if ingestion.versions else None
+        }
+
+    def status_threadsafe(self, timeout=STATUS_TIMEOUT_SECONDS):
+        """
+        status() from another thread: the snapshot is taken on the event loop, so it never sees the
+        backlog or the ingestion stats while the loop is changing them.
+
+        :param timeout: seconds to wait for the loop.
+        :return: the status dict.
+        :raises TimeoutError: when the loop does not answer in time.
+        """
+        async def snapshot():
+            return self.status()
+
+        return asyncio.run_coroutine_threadsafe(snapshot(), self.loop).result(timeout)
+
+    def _start_status_server(self):
+        if self.status_port is None:
+            return
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/status"):
+                    self.send_error(404)
+                    return
+                try:
+                    status = daemon.status_threadsafe()
+                except TimeoutError:
+                    self.send_error(503, "Ingestion loop busy, try again")
+                    return
+                body = json.dumps(status, default=str).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per status poll would drown the ingestion output
+
+        self.status_server = ThreadingHTTPServer((Config.API_HOST, self.status_port), StatusHandler)
+        threading.Thread(target=self.status_server.serve_forever, name="watch-status", daemon=True).start()
+        print(f"Status on http://{Config.API_HOST}:{self.status_server.server_address[1]}/status")
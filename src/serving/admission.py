@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+import numpy as np
+
+from src.utils.rate_limit import ClientRateLimiter
+
+PRIORITIES = {"interactive": 0, "batch": 1}  # Lower is served first
+WAIT_SAMPLES = 1000  # Recent queue waits kept for the percentiles
+
+
+class Rejected(Exception):
+    """Request shed by the admission controller, answered right away instead of queued"""
+
+    def __init__(self, status_code, reason, retry_after):
+        """
+        :param status_code: 429 (client over its rate limit) or 503 (server overloaded).
+        :param reason: rate_limited, queue_full, overloaded, evicted or queue_timeout.
+        :param retry_after: seconds the client should wait before retrying.
+        """
+        super().__init__(f"{reason} (retry after {retry_after:.1f}s)")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionSlot:
+    """Permission to run one request. Release it when the request is finished."""
+
+    def __init__(self, controller, started):
+        self.controller = controller
+        self.started = started
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(time.monotonic() - self.started)
+
+
+class AdmissionController:
+    """
+    Bounds the diagnosis requests of one worker: at most max_concurrent run, up to
+    max_queue_depth wait in priority order (interactive before batch), and the rest are
+    rejected immediately. A request is also rejected up front when its expected wait
+    exceeds max_wait_seconds, so accepted requests keep a stable latency under overload
+    instead of all of them timing out together. Runs on the worker's event loop.
+    """
+
+    def __init__(self, max_concurrent, max_queue_depth, max_wait_seconds, rate_per_minute=None, burst=None):
+        """
+        :param max_concurrent: requests running at once.
+        :param max_queue_depth: requests waiting for a slot.
+        :param max_wait_seconds: longest a request may wait in the queue.
+        :param rate_per_minute: requests allowed per client (None = no per-client limit).
+        :param burst: requests a client may send at once.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue_depth = max_queue_depth
+        self.max_wait_seconds = max_wait_seconds
+        self.rate_limiter = None
+        if rate_per_minute:
+            self.rate_limiter = ClientRateLimiter(rate_per_minute / 60, burst or 1)
+
+        self.active = 0
+        self.waiters = []  # Heap of (priority, sequence, enqueued, future)
+        self.sequence = itertools.count()
+        self.service_seconds = None  # Moving average of the time a request holds a slot
+
+        self.admitted = 0
+        self.rejected = {}
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    async def acquire(self, client_id=None, priority="interactive"):
+        """
+        :param client_id: identifies the client for rate limiting.
+        :param priority: "interactive" or "batch".
+        :return: an AdmissionSlot, to be released when the request is done.
+        :raises Rejected: when the request is shed.
+        """
+        if self.rate_limiter is not None and client_id is not None:
+            allowed, retry_after = self.rate_limiter.try_acquire(client_id)
+            if not allowed:
+                self._reject(429, "rate_limited", retry_after)
+
+        enqueued = time.monotonic()
+        if self.active < self.max_concurrent and not self.queue_depth():
+            self.active += 1
+            return self._admit(enqueued)
+
+        expected_wait = self.expected_wait()
+        if expected_wait is not None and expected_wait > self.max_wait_seconds:
+            self._reject(503, "overloaded", expected_wait)
+        if self.queue_depth() >= self.max_queue_depth:
+            if not self._evict_lower(PRIORITIES[priority]):
+                self._reject(503, "queue_full", expected_wait or self.max_wait_seconds)
+
+        if len(self.waiters) > 2 * self.max_queue_depth:
+            self._prune()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (PRIORITIES[priority], next(self.sequence), enqueued, future))
+        timer = asyncio.get_running_loop().call_later(self.max_wait_seconds, self._expire, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Client went away. If a slot was handed over meanwhile, give it back.
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release(None)
+            raise
+        finally:
+            timer.cancel()
+        return self._admit(enqueued)
+
+    def queue_depth(self):
+        """
+        :return: requests waiting for a slot.
+        """
+        return sum(1 for *_, future in self.waiters if not future.done())
+
+    def expected_wait(self):
+        """
+        :return: estimated queue wait in seconds for a new request, None before any request finished.
+        """
+        if self.service_seconds is None:
+            return None
+        return (self.queue_depth() + 1) * self.service_seconds / self.max_concurrent
+
+    def stats(self):
+        """
+        :return: queue depth, running requests, admissions, rejections by reason and queue wait percentiles.
+        """
+        waits = np.array(self.waits) * 1000 if self.waits else None
+        return {
+            "queue_depth": self.queue_depth(),
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_p50_ms": float(np.percentile(waits, 50)) if waits is not None else None,
+            "wait_p99_ms": float(np.percentile(waits, 99)) if waits is not None else None,
+            "service_seconds": self.service_seconds
+        }
+
+    def _admit(self, enqueued):
+        now = time.monotonic()
+        self.admitted += 1
+        self.waits.append(now - enqueued)
+        return AdmissionSlot(self, now)
+
+    def _reject(self, status_code, reason, retry_after):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise Rejected(status_code, reason, retry_after)
+
+    def _release(self, service_seconds):
+        if service_seconds is not None:
+            self.service_seconds = service_seconds if self.service_seconds is None \
+                else 0.9 * self.service_seconds + 0.1 * service_seconds
+        self.active -= 1
+        while self.waiters and self.active < self.max_concurrent:
+            *_, future = heapq.heappop(self.waiters)
+            if not future.done():  # Skip expired, evicted and cancelled entries
+                self.active += 1
+                future.set_result(None)
+
+    def _evict_lower(self, priority):
+        # Make room for a higher priority request by shedding the newest lower priority one.
+        candidates = [entry for entry in self.waiters if entry[0] > priority and not entry[3].done()]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        self.rejected["evicted"] = self.rejected.get("evicted", 0) + 1
+        victim[3].set_exception(Rejected(503, "evicted", self.max_wait_seconds))
+        self._prune()
+        return True
+
+    def _prune(self):
+        self.waiters = [entry for entry in self.waiters if not entry[3].done()]
+        heapq.heapify(self.waiters)
+
+    def _expire(self, future):
+        if not future.done():
+            self.rejected["queue_timeout"] = self.rejected.get("queue_timeout", 0) + 1
+            future.set_exception(Rejected(503, "queue_timeout", self.max_wait_seconds))
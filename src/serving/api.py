@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Literal, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+
+from config.settings import Config
+from src.generation.rag_generator import ClinicalRAG
+from src.serving.admission import AdmissionController, Rejected
+from src.utils.metrics import METRICS
+from src.utils.tracing import TRACER
+
+# Index and embedding model are loaded at import. Under gunicorn --preload that happens once in
+# the master, and the forked workers share those pages copy-on-write instead of loading their own.
+rag = ClinicalRAG(retrieval_only=True, micro_batching=Config.API_MICRO_BATCHING)
+
+# Sheds diagnosis requests that would only pile up behind the LLM quota and time out.
+admission = AdmissionController(
+    max_concurrent=Config.ADMISSION_MAX_CONCURRENT,
+    max_queue_depth=Config.ADMISSION_QUEUE_DEPTH,
+    max_wait_seconds=Config.ADMISSION_MAX_WAIT_SECONDS,
+    rate_per_minute=Config.RATE_LIMIT_PER_MINUTE,
+    burst=Config.RATE_LIMIT_BURST
+)
+
+# Searches get their own slots and client limits: they must not queue behind LLM calls, since
+# /retrieve is the fallback that keeps working when generation is saturated.
+retrieve_admission = AdmissionController(
+    max_concurrent=Config.RETRIEVE_MAX_CONCURRENT,
+    max_queue_depth=Config.RETRIEVE_QUEUE_DEPTH,
+    max_wait_seconds=Config.RETRIEVE_MAX_WAIT_SECONDS,
+    rate_per_minute=Config.RETRIEVE_RATE_LIMIT_PER_MINUTE,
+    burst=Config.RETRIEVE_RATE_LIMIT_BURST
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Runs in each worker after the fork: the Gemini gRPC client and background threads
+    # (index watcher, caches) must be created per process.
+    if Config.GOOGLE_API_KEY:
+        rag.enable_generation()
+    else:
+        print("GOOGLE_API_KEY not set, serving /retrieve only")
+    rag.start_index_watcher()
+    if Config.TRACE_FILE:
+        TRACER.enable()
+    yield
+    if Config.TRACE_FILE:
+        # One file per worker, they would overwrite each other's trace otherwise.
+        path = Path(Config.TRACE_FILE)
+        TRACER.export(path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}"))
+
+
+app = FastAPI(title="Clinical Diagnosis API", lifespan=lifespan)
+
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request, exc):
+    # Answered right away, Retry-After tells the client when a new attempt has a chance.
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"status": "rejected", "reason": exc.reason, "retry_after_seconds": round(exc.retry_after, 1)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
+class DiagnoseRequest(BaseModel):
+    question: str = Field(..., min_length=1, description="Patient symptom description")
+    priority: Literal["interactive", "batch"] = Field("interactive", description="Batch requests queue behind interactive ones")
+
+
+class RetrieveRequest(BaseModel):
+    question: str = Field(..., min_length=1, description="Patient symptom description")
+    k: Optional[int] = Field(None, ge=1, le=50, description="Number of similar cases (default TOP_K_RETRIEVAL)")
+
+
+def client_id(http_request):
+    """
+    :param http_request: the incoming request.
+    :return: the X-Client-ID header if sent, the client address otherwise.
+    """
+    if http_request.headers.get("x-client-id"):
+        return http_request.headers["x-client-id"]
+    return http_request.client.host if http_request.client else None
+
+
+def serialize_case(doc, score=None, matched_fields=None, score_kind=None):
+    """
+    :param doc: a retrieved Langchain document.
+    :param score: its retrieval score, if known.
+    :param matched_fields: highlighted fields from search(), if any.
+    :param score_kind: "distance" (lower is better) or "cross_encoder" (higher is better), sent with the score.
+    :return: JSON-ready dict for the case.
+    """
+    case = {"case_id": doc.metadata["case_id"], "content": doc.page_content}
+    if score is not None:
+        case["score"] = float(score)  # FAISS returns numpy floats
+        case["score_kind"] = score_kind
+    if matched_fields is not None:
+        case["matched_fields"] = matched_fields
+    return case
+
+
+def serialize_event(event):
+    """
+    :param event: an event from ClinicalRAG.astream_query.
+    :return: the event as one NDJSON line.
+    """
+    if event["type"] == "sources":
+        event = {**event, "source_documents": [serialize_case(doc) for doc in event["source_documents"]]}
+    return json.dumps(event) + "\n"
+
+
+def generation_unavailable():
+    # Same shape as ClinicalRAG._degraded, for workers started without an API key.
+    return {
+        "status": "generation_unavailable",
+        "reason": "not_configured",
+        "detail": "GOOGLE_API_KEY is not set on the server",
+        "message": "The diagnosis could not be generated right now. The similar cases retrieved are shown below."
+    }
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "index_version": rag.index_version,
+        "generation": rag.generator is not None,
+        "micro_batching": rag.batcher.stats() if rag.batcher is not None else None,
+        "admission": admission.stats(),
+        "retrieve_admission": retrieve_admission.stats(),
+        "llm": rag.generator.stats() if rag.generator is not None else None
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format. Each gunicorn worker keeps its own metrics, so scrape them per worker.
+    return PlainTextResponse(METRICS.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/retrieve")
+async def retrieve(request: RetrieveRequest, http_request: Request):
+    slot = await retrieve_admission.acquire(client_id(http_request))
+    try:
+        # Embedding and search are CPU bound, keep them off the event loop.
+        result = await asyncio.to_thread(rag.search, request.question, request.k or Config.TOP_K_RETRIEVAL)
+    finally:
+        slot.release()
+    return {
+        "query": result["query"],
+        "index_version": result["index_version"],
+        "cases": [
+            serialize_case(case["document"], case["score"], case["matched_fields"], result["score_kind"])
+            for case in result["cases"]
+        ],
+        "timing": result["timing"]
+    }
+
+
+@app.post("/diagnose")
+async def diagnose(request: DiagnoseRequest, http_request: Request):
+    slot = await admission.acquire(client_id(http_request), request.priority)
+    try:
+        if rag.generator is None:
+            found = await asyncio.to_thread(rag.search, request.question)
+            return {
+                "query": request.question,
+                "result": generation_unavailable()["message"],
+                "source_documents": [serialize_case(case["document"], case["score"], score_kind=found["score_kind"])
+                                     for case in found["cases"]],
+                "degraded": generation_unavailable()
+            }
+        result = await rag.aquery(request.question)
+    finally:
+        slot.release()
+    return {
+        "query": result["query"],
+        "result": result["result"],
+        "source_documents": [serialize_case(doc) for doc in result["source_documents"]],
+        "context_tokens": result["context_tokens"],
+        "degraded": result["degraded"],
+        "timing": result["timing"]
+    }
+
+
+@app.post("/diagnose/stream")
+async def diagnose_stream(request: DiagnoseRequest, http_request: Request):
+    """Same events as ClinicalRAG.stream_query, one JSON object per line"""
+    # Admitted before the response starts, so a rejection is still a plain 429/503.
+    slot = await admission.acquire(client_id(http_request), request.priority)
+
+    async def events():
+        try:
+            if rag.generator is None:
+                docs_and_scores = await asyncio.to_thread(rag.retrieve, request.question)
+                yield serialize_event({"type": "sources", "source_documents": [doc for doc, _ in docs_and_scores]})
+                yield serialize_event({"type": "unavailable", **generation_unavailable()})
+                yield serialize_event({"type": "done", "timing": None, "context_tokens": 0,
+                                       "degraded": generation_unavailable()})
+                return
+            async for event in rag.astream_query(request.question):
+                yield serialize_event(event)
+        finally:
+            slot.release()
+
+    # The background task covers a client that disconnects before the stream starts.
+    return StreamingResponse(events(), media_type="application/x-ndjson", background=BackgroundTask(slot.release))
@@ -0,0 +1,18 @@
+# Gunicorn settings for the API: gunicorn -c src/serving/gunicorn_conf.py src.serving.api:app
+import os
+
+from config.settings import Config
+
+bind = f"{Config.API_HOST}:{Config.API_PORT}"
+workers = Config.API_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"  # Async handlers
+
+# Import the app (index + embedding model) once in the master, then fork: workers share the
+# loaded pages copy-on-write, so memory does not grow with the worker count.
+preload_app = True
+
+timeout = Config.LLM_TIMEOUT_SECONDS * 2 + 30  # Above the slowest allowed request
+graceful_timeout = 30
+
+# Tokenizer thread pools created before the fork can deadlock in the workers.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
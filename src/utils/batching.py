@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item calls into batches for a batch handler. A background
+    thread takes the first waiting item, keeps collecting until max_batch_size items or
+    max_wait_ms have passed, runs the handler once and hands each caller its own result.
+    With max_wait_ms = 0 nothing is waited for: items that queued up while the previous
+    batch ran form the next one, so a lone request is never delayed.
+    """
+
+    def __init__(self, handler, max_batch_size=32, max_wait_ms=2, name="micro-batcher"):
+        """
+        :param handler: function(list of items) -> list of results in the same order.
+        :param max_batch_size: most items per handler call.
+        :param max_wait_ms: longest time the first item of a batch waits for company.
+        :param name: name of the background thread.
+        """
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """
+        :param item: one input for the handler.
+        :return: Future with the handler's result for this item.
+        """
+        self._ensure_started()
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Submit an item and wait for its result"""
+        return self.submit(item).result()
+
+    def stats(self):
+        """
+        :return: batches run and the average batch size.
+        """
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0
+        }
+
+    def _ensure_started(self):
+        # Started on first use, and again in a forked child, where the parent's thread does not exist.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    self.queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self.queue.get()]  # Block until there is work
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.handler(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
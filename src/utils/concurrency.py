@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+
+
+class RequestGate:
+    """
+    Lets many requests run at the same time (shared), while a maintenance task such as
+    an index swap can wait for them to drain and hold new ones back (exclusive).
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._exclusive:
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            while self._exclusive:
+                self._condition.wait()
+            self._exclusive = True  # Stop admitting new requests first, then wait for the running ones
+            while self._active:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cached lookup (100us) to a slow LLM call (1 min)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic count, optionally split by labels"""
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def to_prometheus(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def summary(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in values}
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets, optionally split by labels"""
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.series = {}  # label key -> [bucket counts (last one is +Inf), sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q, **labels):
+        """
+        :param q: quantile between 0 and 1.
+        :return: estimate interpolated within the bucket, like Prometheus' histogram_quantile, or None.
+        """
+        series = self.series.get(_label_key(labels))
+        if series is None or not series[2]:
+            return None
+        return self._quantile(series, q)
+
+    def _quantile(self, series, q):
+        counts, _, total = series
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Above the last bound, report the bound
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def _snapshot(self):
+        with self.lock:
+            return [(key, [list(counts), total, count]) for key, (counts, total, count) in sorted(self.series.items())]
+
+    def to_prometheus(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._snapshot():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def summary(self):
+        result = {}
+        for key, series in self._snapshot():
+            counts, total, count = series
+            result[",".join(f"{k}={v}" for k, v in key) or "all"] = {
+                "count": count,
+                "mean_ms": total / count * 1000 if count else None,
+                "p50_ms": self._quantile(series, 0.5) * 1000,
+                "p95_ms": self._quantile(series, 0.95) * 1000,
+                "p99_ms": self._quantile(series, 0.99) * 1000
+            }
+        return result
+
+
+class MetricsRegistry:
+    """All metrics of the process, exported for Prometheus or as a JSON-ready summary"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def counter(self, name, description):
+        return self._get_or_create(Counter, name, description)
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, description, buckets)
+
+    def _get_or_create(self, cls, name, *args):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args)
+            return self.metrics[name]
+
+    def to_prometheus(self):
+        """
+        :return: every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.to_prometheus())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        :return: {metric name: {labels: value}}, histograms as count, mean and p50/p95/p99 in milliseconds.
+        """
+        summaries = {name: metric.summary() for name, metric in self.metrics.items()}
+        return {name: summary for name, summary in summaries.items() if summary}
+
+    def reset(self):
+        for metric in self.metrics.values():
+            with metric.lock:
+                if isinstance(metric, Histogram):
+                    metric.series.clear()
+                else:
+                    metric.values.clear()
+
+
+METRICS = MetricsRegistry()
+
+# Query path
+QUERY_EMBEDDING = METRICS.histogram("clinical_rag_query_embedding_seconds",
+                                    "Embedding model call for one query or one batch of queries")
+INDEX_SEARCH = METRICS.histogram("clinical_rag_index_search_seconds",
+                                 "FAISS search for one query or one batch of queries, without the docstore")
+DOCSTORE_FETCH = METRICS.histogram("clinical_rag_docstore_fetch_seconds",
+                                   "Fetching the documents of the search hits from the docstore")
+PROMPT_BUILD = METRICS.histogram("clinical_rag_prompt_build_seconds",
+                                 "Packing the retrieved cases into the context and filling the prompt")
+LLM_TIME_TO_FIRST_TOKEN = METRICS.histogram("clinical_rag_llm_time_to_first_token_seconds",
+                                            "From the LLM request to its first token (whole answer when not streamed)")
+LLM_GENERATION = METRICS.histogram("clinical_rag_llm_generation_seconds", "Whole LLM call")
+QUERY_TOTAL = METRICS.histogram("clinical_rag_query_seconds", "End-to-end diagnosis query")
+PIPELINE_STAGE = METRICS.histogram("clinical_rag_pipeline_stage_seconds", "Pipeline stage run (main.py --stage)",
+                                   buckets=(1, 10, 60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600))
+
+CACHE_REQUESTS = METRICS.counter("clinical_rag_cache_requests_total", "Cache lookups by cache and result (hit/miss)")
+ERRORS = METRICS.counter("clinical_rag_errors_total", "Failed operations by stage and reason")
+TOKENS = METRICS.counter("clinical_rag_tokens_total", "Estimated tokens by kind (context/answer)")
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """
+    Allows `rate` operations per second on average, with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: tokens added per second.
+        :param burst: bucket capacity (the bucket starts full).
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """
+        :param tokens: tokens the operation costs.
+        :return: (allowed, seconds until enough tokens are available if not allowed).
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until the operation is allowed, safe to share between threads"""
+        while True:
+            allowed, wait = self.try_acquire(tokens)
+            if allowed:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """acquire() for coroutines, waits without blocking the event loop"""
+        while True:
+            allowed, wait = self.try_acquire(tokens)
+            if allowed:
+                return
+            await asyncio.sleep(wait)
+
+
+class ClientRateLimiter:
+    """
+    One token bucket per client. Only the most recently seen max_clients are kept, an evicted
+    client starts again with a full bucket, as it would after being idle.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        """
+        :param rate: requests per second allowed for each client.
+        :param burst: requests a client may send at once.
+        :param max_clients: buckets kept in memory.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, client_id):
+        """
+        :param client_id: API key, user or address identifying the client.
+        :return: (allowed, seconds to wait before retrying if not allowed).
+        """
+        with self.lock:
+            bucket = self.buckets.pop(client_id, None) or TokenBucket(self.rate, self.burst)
+            self.buckets[client_id] = bucket
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return bucket.try_acquire()
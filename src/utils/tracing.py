@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+MAX_EVENTS = 1_000_000  # Spans kept per process, later ones are dropped (and counted)
+
+
+class Span:
+    """One timed operation, recorded as a Chrome trace 'complete' event when it ends"""
+
+    __slots__ = ("tracer", "name", "attributes", "start")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+
+    def set(self, **attributes):
+        """Add attributes known only once the work is done (tokens, bytes, ...)"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._record(self, time.perf_counter_ns())
+        return False
+
+
+class _NoopSpan:
+    """Returned while tracing is off: entering, setting and leaving do nothing"""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Collects spans in memory and writes them as a Chrome trace (chrome://tracing, Perfetto).
+    Spans nest by time on each thread, so no parent ids are needed. While disabled, span()
+    returns a shared no-op object and costs one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter_ns()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, **attributes):
+        """
+        :param name: operation name, e.g. "extract.page".
+        :param attributes: values shown with the span (case_id, tokens, bytes, ...).
+        :return: context manager timing the with block.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def _record(self, span, end):
+        event = {
+            "name": span.name,
+            "cat": span.name.split(".", 1)[0],
+            "ph": "X",
+            "ts": (span.start - self.origin) / 1000,  # Microseconds
+            "dur": (end - span.start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": span.attributes
+        }
+        with self.lock:
+            if len(self.events) < MAX_EVENTS:
+                self.events.append(event)
+            else:
+                self.dropped += 1
+
+    def export(self, path):
+        """
+        :param path: JSON file to write, opens in chrome://tracing or ui.perfetto.dev.
+        :return: number of spans written.
+        """
+        with self.lock:
+            events = list(self.events)
+        thread_names = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread.ident, "args": {"name": thread.name}}
+            for thread in threading.enumerate()
+        ]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": thread_names + events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_spans": self.dropped}}, f, default=str)
+        print(f"Trace with {len(events)} spans written to: {path}")
+        return len(events)
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+            self.dropped = 0
+
+
+TRACER = Tracer()
+
+
+def span(name, **attributes):
+    """Shortcut for TRACER.span"""
+    return TRACER.span(name, **attributes)
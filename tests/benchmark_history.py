@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Benchmark History
+
+Append-only record of benchmark and evaluation runs (BENCHMARK_HISTORY_FILE, one JSON run per
+line), tagged with the git commit, the host and the configuration, and a comparison that flags
+regressions against a chosen baseline.
+
+Each run stores its metrics as samples: per-query latencies and per-query scores where the
+benchmark has them, a single value otherwise. Samples pooled over the selected runs are
+compared with Welch's t-test, so a metric is only flagged when it got worse by more than the
+threshold and the difference is unlikely to be noise. A metric with fewer than two samples on
+a side cannot be tested and is judged by the threshold alone (rerun the benchmark, or compare
+commits with several runs each, to test it).
+
+    python tests/benchmark_history.py list --benchmark retrieval_latency
+    python tests/benchmark_history.py compare --benchmark retrieval_latency --baseline 3d06cc4
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import Config
+
+PROJECT_ROOT = Path(__file__).parent.parent
+HISTORY_FILE = PROJECT_ROOT / Config.BENCHMARK_HISTORY_FILE
+SECRET_SUFFIXES = ("_KEY", "_SECRET", "_PASSWORD")  # Settings never written to the history
+
+
+def metric(samples, better: str = "lower", unit: str = "") -> dict:
+    """
+    Args:
+        samples: One value or a list of values (per query, per repeat), None values are dropped
+        better: "lower" for latencies and sizes, "higher" for throughput and accuracy
+        unit: Shown in the comparison table
+
+    Returns:
+        Metric entry of a run
+    """
+    if better not in ("lower", "higher"):
+        raise ValueError(f"better must be 'lower' or 'higher', not '{better}'")
+    if not isinstance(samples, (list, tuple)):
+        samples = [samples]
+    return {"better": better, "unit": unit,
+            "samples": [round(float(value), 6) for value in samples if value is not None]}
+
+
+def git_info() -> dict:
+    """Commit, branch and whether tracked files have uncommitted changes (None outside a git checkout)."""
+    def git(*args):
+        try:
+            process = subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        return process.stdout.strip() if process.returncode == 0 else None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(status) if status is not None else None}
+
+
+def settings_snapshot() -> dict:
+    """The Config settings of the run, without secrets."""
+    return {name: value if isinstance(value, (bool, int, float, str, type(None))) else str(value)
+            for name, value in vars(Config).items()
+            if name.isupper() and not name.endswith(SECRET_SUFFIXES)}
+
+
+class BenchmarkHistory:
+    """Runs are only ever appended, a truncated last line (interrupted write) is skipped on load."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = Path(path)
+
+    def append(self, benchmark: str, metrics: dict, args=None) -> dict:
+        """
+        Args:
+            benchmark: Name runs are compared under (e.g. "retrieval_latency")
+            metrics: Dictionary of {name: metric(...)}
+            args: The benchmark's parameters (argparse namespace or dictionary)
+
+        Returns:
+            The recorded run
+        """
+        now = datetime.now()
+        run = {
+            "run_id": f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}",
+            "benchmark": benchmark,
+            "timestamp": now.isoformat(),
+            "git": git_info(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "config": {"args": vars(args) if isinstance(args, argparse.Namespace) else (args or {}),
+                       "settings": settings_snapshot()},
+            "metrics": metrics
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(run, default=str) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:  # O_APPEND, concurrent runs do not overwrite each other
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        return run
+
+    def runs(self, benchmark: str = None) -> list:
+        """Recorded runs, oldest first."""
+        if not self.path.exists():
+            return []
+        runs = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    run = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipping unreadable line {number} of {self.path}")
+                    continue
+                if benchmark is None or run.get("benchmark") == benchmark:
+                    runs.append(run)
+        return runs
+
+
+def record_run(benchmark: str, metrics: dict, args=None, path=HISTORY_FILE) -> dict:
+    """Append a run to the history and say where it went."""
+    run = BenchmarkHistory(path).append(benchmark, metrics, args)
+    commit = (run["git"]["commit"] or "no commit")[:10]
+    print(f"Recorded run {run['run_id']} ({benchmark} @ {commit}{' + changes' if run['git']['dirty'] else ''}) "
+          f"in {path}")
+    return run
+
+
+def select_runs(runs: list, spec: str, exclude=()) -> list:
+    """
+    Args:
+        runs: Runs of one benchmark, oldest first
+        spec: "latest", "previous" (the last run before the excluded ones), a run id prefix
+              or a git commit prefix (every run of that commit)
+        exclude: Runs that cannot be selected (the other side of the comparison)
+
+    Returns:
+        The selected runs, empty if none match
+    """
+    excluded = {run["run_id"] for run in exclude}
+    if spec == "latest":
+        candidates = [run for run in runs if run["run_id"] not in excluded]
+        return candidates[-1:]
+    if spec == "previous":
+        first = min((i for i, run in enumerate(runs) if run["run_id"] in excluded), default=len(runs))
+        return runs[max(first - 1, 0):first]
+    selected = [run for run in runs if run["run_id"].startswith(spec)]
+    if not selected:
+        selected = [run for run in runs if (run["git"].get("commit") or "").startswith(spec)]
+    return [run for run in selected if run["run_id"] not in excluded]
+
+
+def _continued_fraction(x: float, a: float, b: float) -> float:
+    """Continued fraction of the incomplete beta function (modified Lentz)."""
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return result
+
+
+def regularized_beta(x: float, a: float, b: float) -> float:
+    """I_x(a, b), the regularized incomplete beta function."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _continued_fraction(x, a, b) / a
+    return 1.0 - front * _continued_fraction(1.0 - x, b, a) / b
+
+
+def welch_t_test(baseline: list, candidate: list) -> float:
+    """
+    Args:
+        baseline: Samples of the baseline (at least two)
+        candidate: Samples of the candidate (at least two)
+
+    Returns:
+        Two-sided p-value of the difference of the means, without assuming equal variances
+    """
+    baseline_error = statistics.variance(baseline) / len(baseline)
+    candidate_error = statistics.variance(candidate) / len(candidate)
+    error = baseline_error + candidate_error
+    difference = statistics.fmean(candidate) - statistics.fmean(baseline)
+    if error == 0.0:
+        return 1.0 if difference == 0.0 else 0.0  # No spread: any difference is real
+    t = difference / math.sqrt(error)
+    df = error ** 2 / (baseline_error ** 2 / (len(baseline) - 1) + candidate_error ** 2 / (len(candidate) - 1))
+    return regularized_beta(df / (df + t * t), df / 2.0, 0.5)
+
+
+def compare_metric(baseline: list, candidate: list, better: str, threshold: float, alpha: float) -> dict:
+    """
+    Args:
+        baseline: Pooled samples of the baseline runs
+        candidate: Pooled samples of the candidate runs
+        better: "lower" or "higher"
+        threshold: Percent the mean may get worse before it is a regression
+        alpha: Significance level of Welch's t-test
+
+    Returns:
+        Dictionary with the means, the change in percent, the p-value (None when untestable)
+        and a status: regression, improved, noise (beyond the threshold but not significant) or ok
+    """
+    baseline_mean = statistics.fmean(baseline)
+    candidate_mean = statistics.fmean(candidate)
+    if baseline_mean != 0:
+        change = (candidate_mean - baseline_mean) / abs(baseline_mean) * 100
+    else:
+        change = 0.0 if candidate_mean == 0 else math.copysign(math.inf, candidate_mean)
+    worse = change if better == "lower" else -change
+
+    p_value = welch_t_test(baseline, candidate) if len(baseline) > 1 and len(candidate) > 1 else None
+    significant = p_value is None or p_value < alpha
+    if abs(worse) <= threshold:
+        status = "ok"
+    elif not significant:
+        status = "noise"
+    else:
+        status = "regression" if worse > 0 else "improved"
+    return {"baseline_mean": baseline_mean, "baseline_n": len(baseline), "candidate_mean": candidate_mean,
+            "candidate_n": len(candidate), "change_percent": change, "p_value": p_value, "status": status}
+
+
+def compare_runs(baseline_runs: list, candidate_runs: list, threshold: float = Config.BENCHMARK_REGRESSION_THRESHOLD,
+                 alpha: float = Config.BENCHMARK_SIGNIFICANCE, patterns=None) -> dict:
+    """
+    Args:
+        baseline_runs: Runs whose samples are pooled as the baseline
+        candidate_runs: Runs whose samples are pooled as the candidate
+        threshold: Percent a metric may get worse before it is a regression
+        alpha: Significance level of Welch's t-test
+        patterns: fnmatch patterns of the metrics to compare (all if not given)
+
+    Returns:
+        Dictionary of {metric: comparison} and the metrics missing from the candidate
+    """
+    def pooled(runs):
+        metrics = {}
+        for run in runs:
+            for name, entry in run["metrics"].items():
+                if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    continue
+                pooled_entry = metrics.setdefault(name, {"better": entry["better"], "unit": entry.get("unit", ""),
+                                                         "samples": []})
+                pooled_entry["samples"].extend(entry["samples"])
+        return {name: entry for name, entry in metrics.items() if entry["samples"]}
+
+    baseline = pooled(baseline_runs)
+    candidate = pooled(candidate_runs)
+    comparisons = {}
+    for name in sorted(baseline.keys() & candidate.keys()):
+        comparisons[name] = {"better": baseline[name]["better"], "unit": baseline[name]["unit"],
+                             **compare_metric(baseline[name]["samples"], candidate[name]["samples"],
+                                              baseline[name]["better"], threshold, alpha)}
+    return {"metrics": comparisons, "missing": sorted(baseline.keys() - candidate.keys())}
+
+
+def describe(runs: list) -> str:
+    commits = sorted({(run["git"].get("commit") or "no commit")[:10] for run in runs})
+    return f"{len(runs)} run(s) @ {', '.join(commits)} ({runs[0]['run_id']}{' ...' if len(runs) > 1 else ''})"
+
+
+def print_runs(runs: list):
+    """Print the recorded runs as a table."""
+    print(f"\n{'Run ID':<23} {'Benchmark':<28} {'Time':<19} {'Commit':<11} {'Host':<16} {'Metrics':>7}")
+    print(f"{'-' * 108}")
+    for run in runs:
+        commit = (run["git"].get("commit") or "-")[:10] + ("*" if run["git"].get("dirty") else "")
+        print(f"{run['run_id']:<23} {run['benchmark'][:28]:<28} {run['timestamp'][:19]:<19} {commit:<11} "
+              f"{(run.get('host') or '-')[:16]:<16} {len(run['metrics']):>7}")
+    print("(* uncommitted changes)")
+
+
+def print_comparison(comparison: dict, threshold: float, alpha: float):
+    """Print the output of compare_runs as a table."""
+    print(f"\n{'Metric':<40} {'Better':<7} {'Baseline':>12} {'n':>5} {'Candidate':>12} {'n':>5} "
+          f"{'Change':>9} {'p':>8}  Status")
+    print(f"{'-' * 114}")
+    for name, c in comparison["metrics"].items():
+        p_value = "-" if c["p_value"] is None else f"{c['p_value']:.4f}"
+        flag = "  <--" if c["status"] == "regression" else ""
+        print(f"{name[:40]:<40} {c['better']:<7} {c['baseline_mean']:>12.4f} {c['baseline_n']:>5} "
+              f"{c['candidate_mean']:>12.4f} {c['candidate_n']:>5} {c['change_percent']:>+8.1f}% {p_value:>8}  "
+              f"{c['status']}{flag}")
+    for name in comparison["missing"]:
+        print(f"{name[:40]:<40} missing from the candidate runs")
+    print(f"\nRegression: worse by more than {threshold}% and p < {alpha} (p '-': fewer than two samples, "
+          f"threshold only)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark run history and regression detection")
+    parser.add_argument("--history", default=str(HISTORY_FILE), help="History file (JSONL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List the recorded runs")
+    list_parser.add_argument("--benchmark", help="Only runs of this benchmark")
+
+    compare_parser = commands.add_parser("compare", help="Compare runs, exit 1 on a regression")
+    compare_parser.add_argument("--benchmark", required=True, help="Benchmark whose runs are compared")
+    compare_parser.add_argument("--baseline", default="previous",
+                                help="previous (default), latest, a run id prefix or a git commit prefix")
+    compare_parser.add_argument("--candidate", default="latest",
+                                help="latest (default), a run id prefix or a git commit prefix")
+    compare_parser.add_argument("--threshold", type=float, default=Config.BENCHMARK_REGRESSION_THRESHOLD,
+                                help="Percent a metric may get worse before it fails")
+    compare_parser.add_argument("--alpha", type=float, default=Config.BENCHMARK_SIGNIFICANCE,
+                                help="Significance level of Welch's t-test")
+    compare_parser.add_argument("--metrics", nargs="+", help="Only metrics matching these patterns (e.g. '*/search_ms')")
+    compare_parser.add_argument("--output", help="Also write the comparison as JSON")
+    args = parser.parse_args()
+
+    history = BenchmarkHistory(args.history)
+    if args.command == "list":
+        runs = history.runs(args.benchmark)
+        if not runs:
+            sys.exit(f"No runs recorded in {args.history}")
+        print_runs(runs)
+        sys.exit(0)
+
+    runs = history.runs(args.benchmark)
+    candidate_runs = select_runs(runs, args.candidate)
+    if not candidate_runs:
+        parser.error(f"No {args.benchmark} run matches candidate '{args.candidate}'")
+    baseline_runs = select_runs(runs, args.baseline, exclude=candidate_runs)
+    if not baseline_runs:
+        parser.error(f"No {args.benchmark} run matches baseline '{args.baseline}'")
+
+    print(f"Baseline:  {describe(baseline_runs)}")
+    print(f"Candidate: {describe(candidate_runs)}")
+    comparison = compare_runs(baseline_runs, candidate_runs, args.threshold, args.alpha, args.metrics)
+    if not comparison["metrics"]:
+        sys.exit("No metric in common between the baseline and the candidate")
+    print_comparison(comparison, args.threshold, args.alpha)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"baseline": [run["run_id"] for run in baseline_runs],
+                       "candidate": [run["run_id"] for run in candidate_runs],
+                       "threshold_percent": args.threshold, "alpha": args.alpha, **comparison}, f, indent=2)
+
+    regressions = [name for name, c in comparison["metrics"].items() if c["status"] == "regression"]
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nPASS: no regression")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Quantized Search Benchmark
+
+Compares flat float32 search (IndexFlatL2) with the two-stage quantized search
+(binary or int8 codes, then exact re-ranking from a memory-mapped float file).
+Reports memory reduction, speedup and recall@k at several corpus sizes.
+Uses synthetic clustered vectors, so it runs offline without the embedding model.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import faiss
+import numpy as np
+
+from src.indexing.quantized_store import QuantizedVectorStore, build_code_index, QUANTIZATION_MODES
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+def synthetic_vectors(num_vectors: int, num_queries: int, seed: int = 42):
+    """
+    Generate unit-length vectors grouped around topic centroids, like sentence embeddings.
+
+    Args:
+        num_vectors: Corpus size
+        num_queries: Number of query vectors (noisy copies of corpus vectors)
+        seed: Random seed
+
+    Returns:
+        Tuple of (corpus vectors, query vectors)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((max(16, num_vectors // 500), EMBEDDING_DIM)).astype(np.float32)
+    labels = rng.integers(0, len(centroids), num_vectors)
+
+    vectors = np.empty((num_vectors, EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, num_vectors, 100_000):  # Chunked to keep temporaries small at 1M
+        end = min(start + 100_000, num_vectors)
+        vectors[start:end] = centroids[labels[start:end]] + 0.8 * rng.standard_normal((end - start, EMBEDDING_DIM))
+    faiss.normalize_L2(vectors)
+
+    queries = vectors[rng.integers(0, num_vectors, num_queries)] + 0.1 * rng.standard_normal(
+        (num_queries, EMBEDDING_DIM)).astype(np.float32)
+    queries = queries.astype(np.float32)
+    faiss.normalize_L2(queries)
+    return vectors, queries
+
+
+def timed_search(search_fn, queries: np.ndarray) -> tuple:
+    """Run one query at a time (like the app does) and return (ids, per-query latencies in ms)."""
+    ids = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = search_fn(query[None, :])
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    return np.array(ids), np.array(latencies)
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    """Average fraction of the exact top-k that the approximate search also returned."""
+    hits = [len(set(f[f >= 0]) & set(e)) / len(e) for f, e in zip(found, exact)]
+    return float(np.mean(hits))
+
+
+def benchmark_size(num_vectors: int, num_queries: int, k: int, rerank_factor: int, work_dir: Path) -> list:
+    """
+    Benchmark flat search and every quantization mode at one corpus size.
+
+    Args:
+        num_vectors: Corpus size
+        num_queries: Number of timed queries
+        k: Results per query
+        rerank_factor: Candidates re-scored per requested result
+        work_dir: Directory for the memory-mapped float vectors
+
+    Returns:
+        List of result dictionaries, one per search method
+    """
+    vectors, queries = synthetic_vectors(num_vectors, num_queries)
+
+    flat = faiss.IndexFlatL2(EMBEDDING_DIM)
+    flat.add(vectors)
+    exact_ids, flat_latencies = timed_search(lambda q: flat.search(q, k), queries)
+    flat_bytes = vectors.nbytes
+
+    results = [{
+        "num_vectors": num_vectors,
+        "method": "flat",
+        "resident_mb": round(flat_bytes / 1e6, 2),
+        "memory_reduction": 1.0,
+        "p50_ms": round(float(np.percentile(flat_latencies, 50)), 3),
+        "speedup": 1.0,
+        f"recall_at_{k}": 1.0
+    }]
+
+    # Float vectors go to disk once and are memory-mapped, as in a published index.
+    vectors_path = work_dir / f"vectors_{num_vectors}.f32"
+    vectors.tofile(vectors_path)
+    mapped = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=vectors.shape)
+    del flat
+
+    for mode in QUANTIZATION_MODES:
+        code_index = build_code_index(vectors, mode)
+        store = QuantizedVectorStore(code_index, mode, mapped, None, None, None, rerank_factor)
+        found, latencies = timed_search(lambda q: store.search_ids(q, k), queries)
+
+        # Resident memory is the codes; the float file is only paged in for candidates.
+        code_bytes = num_vectors * (EMBEDDING_DIM // 8 if mode == "binary" else EMBEDDING_DIM)
+        results.append({
+            "num_vectors": num_vectors,
+            "method": f"{mode}+rerank",
+            "resident_mb": round(code_bytes / 1e6, 2),
+            "memory_reduction": round(flat_bytes / code_bytes, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "speedup": round(float(np.percentile(flat_latencies, 50) / np.percentile(latencies, 50)), 2),
+            f"recall_at_{k}": round(recall_at_k(found, exact_ids), 4)
+        })
+
+    del mapped
+    vectors_path.unlink()
+    return results
+
+
+def print_results(results: list, k: int):
+    """Print the benchmark results as a table."""
+    print(f"\n{'Vectors':<10} {'Method':<15} {'Resident (MB)':>14} {'Mem. reduction':>15} {'p50 (ms)':>10} {'Speedup':>8} {f'Recall@{k}':>10}")
+    print(f"{'-' * 88}")
+    for r in results:
+        print(f"{r['num_vectors']:<10} {r['method']:<15} {r['resident_mb']:>14.2f} {r['memory_reduction']:>14.1f}x "
+              f"{r['p50_ms']:>10.3f} {r['speedup']:>7.2f}x {r[f'recall_at_{k}']:>10.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quantized two-stage search against flat search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Corpus sizes")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("--k", type=int, default=3, help="Results per query")
+    parser.add_argument("--rerank-factor", type=int, default=10, help="Candidates re-scored per result")
+    args = parser.parse_args()
+
+    all_results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in args.sizes:
+            print(f"Benchmarking {size} vectors...")
+            all_results.extend(benchmark_size(size, args.queries, args.k, args.rerank_factor, Path(work_dir)))
+
+    print_results(all_results, args.k)
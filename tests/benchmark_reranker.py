@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Re-ranking Benchmark
+
+Measures the precision@k gain of the cross-encoder re-ranking stage over the dense
+FAISS ranking on the ground truth queries, against the latency it adds (p50/p99).
+Runs on the local index and models only, no LLM calls.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from config.settings import Config
+from src.embedding.embedder import ClinicalEmbedder
+from src.indexing.reranker import CrossEncoderReranker
+from tests.evaluate_rag import is_case_relevant
+from tests.ground_truth import GROUND_TRUTH
+
+
+def precision(docs, test_case) -> float:
+    """Fraction of the retrieved cases relevant to the test case."""
+    if not docs:
+        return 0.0
+    relevant = sum(
+        1 for doc in docs
+        if is_case_relevant(doc.metadata['case_id'], test_case['expected_diagnosis'], test_case['expected_keywords'])
+    )
+    return relevant / len(docs)
+
+
+def run_benchmark(k: int, candidates: int, repeats: int) -> dict:
+    """
+    Compare dense and re-ranked retrieval on GROUND_TRUTH.
+
+    Args:
+        k: Number of final results
+        candidates: Dense candidates passed to the re-ranker
+        repeats: Times each query is run (for stable latency percentiles)
+
+    Returns:
+        Dictionary of precision and latency metrics
+    """
+    embedder = ClinicalEmbedder()
+    vector_store = embedder.load_vector_store(model_name=Config.TEXT_EMBEDDING_MODEL)
+    # No budget and no cache, so every query pays the full scoring cost.
+    reranker = CrossEncoderReranker(Config.RERANK_MODEL, time_budget_ms=None, cache_size=0)
+
+    dense_latencies, rerank_latencies = [], []
+    dense_precisions, rerank_precisions = [], []
+    for _ in range(repeats):
+        for test_case in GROUND_TRUTH:
+            start = time.perf_counter()
+            vector = vector_store.embeddings.embed_query(test_case['query'])
+            docs_and_scores = vector_store.similarity_search_with_score_by_vector(vector, max(k, candidates))
+            searched = time.perf_counter()
+            reranked = reranker.rerank(test_case['query'], docs_and_scores, k)
+            finished = time.perf_counter()
+
+            dense_latencies.append((searched - start) * 1000)
+            rerank_latencies.append((finished - searched) * 1000)
+            dense_precisions.append(precision([doc for doc, _ in docs_and_scores[:k]], test_case))
+            rerank_precisions.append(precision([doc for doc, _ in reranked], test_case))
+
+    rerank_latencies = np.array(rerank_latencies)
+    return {
+        "k": k,
+        "candidates": candidates,
+        "queries": len(dense_latencies),
+        "dense_precision_at_k": float(np.mean(dense_precisions)),
+        "reranked_precision_at_k": float(np.mean(rerank_precisions)),
+        "dense_p50_ms": float(np.percentile(dense_latencies, 50)),
+        "dense_p99_ms": float(np.percentile(dense_latencies, 99)),
+        "added_p50_ms": float(np.percentile(rerank_latencies, 50)),
+        "added_p99_ms": float(np.percentile(rerank_latencies, 99)),
+        "over_budget_percent": float(np.mean(rerank_latencies > Config.RERANK_TIME_BUDGET_MS) * 100)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cross-encoder re-ranking against dense retrieval")
+    parser.add_argument("--k", type=int, default=Config.TOP_K_RETRIEVAL, help="Final results per query")
+    parser.add_argument("--candidates", type=int, default=Config.RERANK_CANDIDATES, help="Dense candidates to re-rank")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per query")
+    args = parser.parse_args()
+
+    m = run_benchmark(args.k, args.candidates, args.repeats)
+
+    print(f"\n{'#' * 80}")
+    print(f"RE-RANKING BENCHMARK ({m['queries']} queries, top-{m['candidates']} -> top-{m['k']})")
+    print(f"{'#' * 80}\n")
+    print(f"{'Metric':<35} {'Dense':>15} {'Re-ranked':>15}")
+    print(f"{'-' * 67}")
+    precision_label = f"Precision@{m['k']} (%)"
+    print(f"{precision_label:<35} {m['dense_precision_at_k'] * 100:>15.2f} {m['reranked_precision_at_k'] * 100:>15.2f}")
+    print(f"{'Retrieval p50 (ms)':<35} {m['dense_p50_ms']:>15.2f} {m['dense_p50_ms'] + m['added_p50_ms']:>15.2f}")
+    print(f"{'Retrieval p99 (ms)':<35} {m['dense_p99_ms']:>15.2f} {m['dense_p99_ms'] + m['added_p99_ms']:>15.2f}")
+    print(f"\nAdded latency: p50 {m['added_p50_ms']:.2f} ms, p99 {m['added_p99_ms']:.2f} ms")
+    print(f"Over the {Config.RERANK_TIME_BUDGET_MS} ms budget: {m['over_budget_percent']:.1f}% of queries\n")
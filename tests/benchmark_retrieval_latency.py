@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Retrieval-only Latency Benchmark
+
+Times ClinicalRAG.search (query embedding + index search + highlighting) on the local
+index with the LLM disabled, and checks the p99 against RETRIEVAL_P99_TARGET_MS.
+The target is checked with the retrieval cache off; repeat queries served from the
+cache are reported separately. Exits with status 1 when the target is missed.
+Every run is recorded in the benchmark history.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from config.settings import Config
+from src.generation.rag_generator import ClinicalRAG
+from tests.benchmark_history import metric, record_run
+from tests.ground_truth import GROUND_TRUTH
+
+
+def run_benchmark(repeats: int, warmup: int) -> dict:
+    """
+    Args:
+        repeats: Times each ground truth query is run
+        warmup: Untimed queries run first (model and page cache warm-up)
+
+    Returns:
+        Dictionary of the startup time, and latency percentiles and samples in milliseconds
+        (cached_* in microseconds)
+    """
+    start = time.perf_counter()
+    rag = ClinicalRAG(retrieval_only=True)
+    startup_seconds = time.perf_counter() - start
+    queries = [test_case['query'] for test_case in GROUND_TRUTH]
+    retrieval_cache, rag.retrieval_cache = rag.retrieval_cache, None  # Uncached first
+
+    for i in range(warmup):
+        rag.search(queries[i % len(queries)])
+
+    retrieval, total = [], []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            result = rag.search(query)
+            total.append((time.perf_counter() - start) * 1000)
+            retrieval.append(result['timing']['retrieval_seconds'] * 1000)
+
+    cached = []
+    if retrieval_cache is not None:
+        rag.retrieval_cache = retrieval_cache
+        for query in queries:
+            rag.search(query)  # Fill the cache
+        for _ in range(repeats):
+            for query in queries:
+                cached.append(rag.search(query)['timing']['retrieval_seconds'] * 1e6)
+
+    return {
+        "queries": len(total),
+        "startup_seconds": startup_seconds,
+        "retrieval_p50_ms": float(np.percentile(retrieval, 50)),
+        "retrieval_p99_ms": float(np.percentile(retrieval, 99)),
+        "total_p50_ms": float(np.percentile(total, 50)),
+        "total_p95_ms": float(np.percentile(total, 95)),
+        "total_p99_ms": float(np.percentile(total, 99)),
+        "cached_p50_us": float(np.percentile(cached, 50)) if cached else None,
+        "cached_p99_us": float(np.percentile(cached, 99)) if cached else None,
+        "target_p99_ms": Config.RETRIEVAL_P99_TARGET_MS,
+        "retrieval_samples_ms": retrieval,
+        "total_samples_ms": total,
+        "cached_samples_us": cached
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval-only lookups against the p99 target")
+    parser.add_argument("--repeats", type=int, default=20, help="Runs per ground truth query")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed warm-up queries")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the run in the benchmark history")
+    args = parser.parse_args()
+
+    m = run_benchmark(args.repeats, args.warmup)
+
+    print(f"\n{'#' * 80}")
+    print(f"RETRIEVAL-ONLY LATENCY ({m['queries']} queries)")
+    print(f"{'#' * 80}\n")
+    print(f"Startup:         {m['startup_seconds']:.2f} s (index load)")
+    print(f"Embed + search:  p50 {m['retrieval_p50_ms']:.2f} ms | p99 {m['retrieval_p99_ms']:.2f} ms")
+    print(f"With highlights: p50 {m['total_p50_ms']:.2f} ms | p95 {m['total_p95_ms']:.2f} ms | "
+          f"p99 {m['total_p99_ms']:.2f} ms")
+    if m['cached_p50_us'] is not None:
+        print(f"Repeat queries:  p50 {m['cached_p50_us']:.1f} us | p99 {m['cached_p99_us']:.1f} us (retrieval cache)")
+
+    if not args.no_history:
+        record_run("retrieval_latency", {
+            "startup_seconds": metric(m['startup_seconds'], "lower", "s"),
+            "retrieval_ms": metric(m['retrieval_samples_ms'], "lower", "ms"),
+            "search_ms": metric(m['total_samples_ms'], "lower", "ms"),
+            "search_p99_ms": metric(m['total_p99_ms'], "lower", "ms"),
+            "cached_us": metric(m['cached_samples_us'], "lower", "us")
+        }, args)
+
+    if m['total_p99_ms'] > m['target_p99_ms']:
+        print(f"\nFAIL: p99 above the {m['target_p99_ms']} ms target")
+        sys.exit(1)
+    print(f"\nPASS: p99 within the {m['target_p99_ms']} ms target")
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Offline Retrieval Benchmark
+
+Measures retrieval quality and speed separately from the LLM. Every index configuration
+(flat, IVF, HNSW, binary/int8 quantized, hybrid BM25 + dense, cross-encoder re-ranked) is
+built over the same filtered corpus and vectors, then runs the same labelled query sets:
+GROUND_TRUTH, an optional JSONL file and queries generated from the corpus. Reports
+recall@k, precision@k, nDCG@k, MRR, QPS, p50/p95/p99 search latency, build time and index
+size as JSON plus a comparison table, and records the run in the benchmark history. No
+network: the embedding model must be cached locally, and document vectors are reused from
+the pipeline's embedding cache.
+
+    python tests/benchmark_retrieval_quality.py --configs flat ivf hnsw hybrid --generated 500
+"""
+
+import os
+
+# Offline: fail fast instead of reaching out to the HuggingFace Hub
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import faiss
+import numpy as np
+
+from config.settings import Config
+from src.embedding.embedder import ClinicalEmbedder, FILTERED_DATA_PATH
+from src.embedding.embedding_cache import CachedEmbeddings
+from src.indexing.quantized_store import QuantizedVectorStore, build_code_index
+from tests.benchmark_history import metric, record_run
+from tests.ground_truth import GROUND_TRUTH
+from tests.relevance_index import RelevanceIndex
+
+CONFIGS = ("flat", "ivf", "hnsw", "binary", "int8", "hybrid", "rerank")
+RRF_K = 60  # Reciprocal rank fusion constant (Cormack et al.), damps the weight of the top ranks
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def load_corpus(filtered_dir: str) -> dict:
+    """
+    Args:
+        filtered_dir: Directory of <case_id>_filtered.json files
+
+    Returns:
+        Dictionary with case 'ids', embedded 'texts', the raw 'cases' and the RelevanceIndex
+        labelling them
+    """
+    embedder = ClinicalEmbedder(filtered_dir)
+    cases = sorted(embedder.load_filtered_cases(), key=lambda case: case['case_id'])
+    return {
+        "ids": [case['case_id'] for case in cases],
+        "index_of": {case['case_id']: i for i, case in enumerate(cases)},
+        "texts": [embedder.prepare_text_for_embedding(case) for case in cases],
+        "cases": cases,
+        "relevance": RelevanceIndex.load(filtered_dir)
+    }
+
+
+def relevant_cases(corpus: dict, expected_diagnosis: str, expected_keywords: list) -> set:
+    """Indices of the cases is_case_relevant would accept: the diagnosis or any keyword appears."""
+    index_of = corpus['index_of']
+    return {index_of[case_id] for case_id in corpus['relevance'].relevant_cases(expected_diagnosis, expected_keywords)
+            if case_id in index_of}
+
+
+def load_query_sets(corpus: dict, queries_file: str = None, generated: int = 0, seed: int = 42) -> dict:
+    """
+    Build the labelled query sets.
+
+    Args:
+        corpus: Output of load_corpus
+        queries_file: JSONL with 'query' and either 'relevant_case_ids' or
+            'expected_diagnosis' + 'expected_keywords' per line
+        generated: Number of queries generated from the corpus: a case's symptoms and risk
+            factors, relevant = every other case sharing one of its diseases. The source case
+            would trivially rank first, so it is excluded from both the relevant set and the ranking
+        seed: Random seed for picking the generating cases
+
+    Returns:
+        Dictionary of {set name: [{'query', 'relevant': set of corpus indices, 'exclude': set of
+        corpus indices not to rank}]}
+    """
+    query_sets = {"ground_truth": [
+        {"query": test_case['query'],
+         "relevant": relevant_cases(corpus, test_case['expected_diagnosis'], test_case['expected_keywords'])}
+        for test_case in GROUND_TRUTH
+    ]}
+
+    if queries_file:
+        index_of = corpus['index_of']
+        labelled = []
+        with open(queries_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if 'relevant_case_ids' in item:
+                    relevant = {index_of[case_id] for case_id in item['relevant_case_ids'] if case_id in index_of}
+                else:
+                    relevant = relevant_cases(corpus, item['expected_diagnosis'], item.get('expected_keywords', []))
+                labelled.append({"query": item['query'], "relevant": relevant})
+        query_sets[Path(queries_file).stem] = labelled
+
+    if generated:
+        by_disease = defaultdict(set)
+        for i, case in enumerate(corpus['cases']):
+            for disease in case.get('diseases', []):
+                by_disease[disease.strip().lower()].add(i)
+        candidates = [i for i, case in enumerate(corpus['cases']) if case.get('symptoms') and case.get('diseases')]
+        rng = random.Random(seed)
+        picked = rng.sample(candidates, min(generated, len(candidates)))
+        query_sets["generated"] = [
+            {"query": ", ".join(corpus['cases'][i]['symptoms'] + corpus['cases'][i].get('risk_factors', [])),
+             "relevant": set().union(*(by_disease[d.strip().lower()] for d in corpus['cases'][i]['diseases'])) - {i},
+             "exclude": {i}}
+            for i in picked
+        ]
+
+    for name, queries in query_sets.items():
+        unlabelled = sum(1 for query in queries if not query['relevant'])
+        if unlabelled:
+            print(f"{name}: {unlabelled}/{len(queries)} queries have no relevant case in the corpus and are skipped")
+        query_sets[name] = [query for query in queries if query['relevant']]
+    return query_sets
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25:
+    """Okapi BM25 over an inverted index of numpy posting arrays"""
+
+    def __init__(self, texts: list, k1: float = 1.5, b: float = 0.75):
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.empty(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[i] = sum(counts.values())
+            for term, count in counts.items():
+                postings[term][0].append(i)
+                postings[term][1].append(count)
+
+        num_docs = len(texts)
+        norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+        self.postings = {}
+        for term, (ids, counts) in postings.items():
+            ids = np.array(ids, dtype=np.int32)
+            tf = np.array(counts, dtype=np.float32)
+            idf = math.log(1 + (num_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            # Term weights are precomputed, a query only sums the postings of its terms.
+            self.postings[term] = (ids, (idf * tf * (k1 + 1) / (tf + norm[ids])).astype(np.float32))
+        self.num_docs = num_docs
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ids.nbytes + weights.nbytes for ids, weights in self.postings.values())
+
+    def search(self, query: str, k: int) -> list:
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term in self.postings:
+                ids, weights = self.postings[term]
+                scores[ids] += weights
+        k = min(k, self.num_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [int(i) for i in top if scores[i] > 0]
+
+
+class Retriever:
+    """One index configuration: build() over the corpus, then search() one query at a time."""
+
+    name = None
+
+    def build(self, vectors: np.ndarray, corpus: dict):
+        raise NotImplementedError
+
+    def search(self, query: str, vector: np.ndarray, k: int) -> list:
+        """Corpus indices of the top k cases, best first"""
+        raise NotImplementedError
+
+    def nbytes(self) -> int:
+        """Resident size of the index structures"""
+        raise NotImplementedError
+
+    def params(self) -> dict:
+        return {}
+
+
+class FaissRetriever(Retriever):
+    def search(self, query, vector, k):
+        _, ids = self.index.search(vector[None, :], k)
+        return [int(i) for i in ids[0] if i >= 0]
+
+    def nbytes(self):
+        return len(faiss.serialize_index(self.index))
+
+
+class FlatRetriever(FaissRetriever):
+    """Exact search, what the app uses (IndexFlatL2)"""
+
+    name = "flat"
+
+    def build(self, vectors, corpus):
+        self.index = faiss.IndexFlatL2(vectors.shape[1])
+        self.index.add(vectors)
+
+
+class IVFRetriever(FaissRetriever):
+    """Inverted file: k-means cells, only the nprobe nearest cells are scanned"""
+
+    name = "ivf"
+
+    def __init__(self, nlist: int = None, nprobe: int = 8):
+        self.nlist = nlist
+        self.nprobe = nprobe
+
+    def build(self, vectors, corpus):
+        # ~4 sqrt(N) cells, with at least 39 training points each (FAISS warns below that)
+        self.nlist = self.nlist or int(4 * math.sqrt(len(vectors)))
+        self.nlist = max(1, min(self.nlist, len(vectors) // 39))
+        quantizer = faiss.IndexFlatL2(vectors.shape[1])
+        self.index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], self.nlist, faiss.METRIC_L2)
+        self.index.train(vectors)
+        self.index.add(vectors)
+        self.index.nprobe = min(self.nprobe, self.nlist)
+
+    def params(self):
+        return {"nlist": self.nlist, "nprobe": self.index.nprobe}
+
+
+class HNSWRetriever(FaissRetriever):
+    """Hierarchical navigable small-world graph"""
+
+    name = "hnsw"
+
+    def __init__(self, m: int = 32, ef_search: int = 64, ef_construction: int = 200):
+        self.m = m
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+
+    def build(self, vectors, corpus):
+        self.index = faiss.IndexHNSWFlat(vectors.shape[1], self.m, faiss.METRIC_L2)
+        self.index.hnsw.efConstruction = self.ef_construction
+        self.index.add(vectors)
+        self.index.hnsw.efSearch = self.ef_search
+
+    def params(self):
+        return {"M": self.m, "efSearch": self.ef_search, "efConstruction": self.ef_construction}
+
+
+class QuantizedRetriever(Retriever):
+    """Binary or int8 codes, candidates re-scored with the float vectors (INDEX_QUANTIZATION)"""
+
+    def __init__(self, mode: str, rerank_factor: int = Config.QUANTIZED_RERANK_FACTOR):
+        self.name = mode
+        self.mode = mode
+        self.rerank_factor = rerank_factor
+
+    def build(self, vectors, corpus):
+        self.code_index = build_code_index(vectors, self.mode)
+        self.store = QuantizedVectorStore(self.code_index, self.mode, vectors, None, None, None, self.rerank_factor)
+
+    def search(self, query, vector, k):
+        _, ids = self.store.search_ids(vector[None, :], k)
+        return [int(i) for i in ids[0] if i >= 0]
+
+    def nbytes(self):
+        # Float vectors stay memory-mapped on disk in a published index, only the codes are resident.
+        if self.mode == "binary":
+            return len(faiss.serialize_index_binary(self.code_index))
+        return len(faiss.serialize_index(self.code_index))
+
+    def params(self):
+        return {"rerank_factor": self.rerank_factor}
+
+
+class HybridRetriever(Retriever):
+    """Dense (flat) and BM25 rankings fused with reciprocal rank fusion"""
+
+    name = "hybrid"
+
+    def __init__(self, depth: int = 50):
+        self.depth = depth  # Candidates taken from each ranking
+
+    def build(self, vectors, corpus):
+        self.dense = FlatRetriever()
+        self.dense.build(vectors, corpus)
+        self.bm25 = BM25(corpus['texts'])
+
+    def search(self, query, vector, k):
+        scores = defaultdict(float)
+        for ranking in (self.dense.search(query, vector, self.depth), self.bm25.search(query, self.depth)):
+            for rank, i in enumerate(ranking):
+                scores[i] += 1 / (RRF_K + rank + 1)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+    def nbytes(self):
+        return self.dense.nbytes() + self.bm25.nbytes
+
+    def params(self):
+        return {"depth": self.depth, "rrf_k": RRF_K}
+
+
+class RerankRetriever(Retriever):
+    """Flat candidates re-scored by the cross-encoder (RERANK_ENABLED), no time budget"""
+
+    name = "rerank"
+
+    def __init__(self, candidates: int = Config.RERANK_CANDIDATES):
+        self.candidates = candidates
+
+    def build(self, vectors, corpus):
+        from langchain.docstore.document import Document
+        from src.indexing.reranker import CrossEncoderReranker
+
+        self.dense = FlatRetriever()
+        self.dense.build(vectors, corpus)
+        self.documents = [Document(page_content=text, metadata={"case_id": i})
+                          for i, text in enumerate(corpus['texts'])]
+        # Cache off, repeats must pay for the scoring every time
+        self.reranker = CrossEncoderReranker(Config.RERANK_MODEL, time_budget_ms=None, cache_size=0)
+
+    def search(self, query, vector, k):
+        candidates = [(self.documents[i], 0.0) for i in self.dense.search(query, vector, self.candidates)]
+        return [doc.metadata['case_id'] for doc, _ in self.reranker.rerank(query, candidates, k)]
+
+    def nbytes(self):
+        return self.dense.nbytes()
+
+    def params(self):
+        return {"candidates": self.candidates, "model": Config.RERANK_MODEL}
+
+
+def create_retriever(name: str, args) -> Retriever:
+    if name == "flat":
+        return FlatRetriever()
+    if name == "ivf":
+        return IVFRetriever(args.nlist, args.nprobe)
+    if name == "hnsw":
+        return HNSWRetriever(args.hnsw_m, args.ef_search)
+    if name in ("binary", "int8"):
+        return QuantizedRetriever(name)
+    if name == "hybrid":
+        return HybridRetriever(args.hybrid_depth)
+    if name == "rerank":
+        return RerankRetriever()
+    raise ValueError(f"Unknown configuration: {name}, expected one of {CONFIGS}")
+
+
+def quality_metrics(rankings: list, relevant: list, ks: list) -> dict:
+    """
+    Args:
+        rankings: Retrieved corpus indices per query, best first
+        relevant: Set of relevant corpus indices per query
+        ks: Cut-offs
+
+    Returns:
+        Dictionary with recall@k, precision@k and nDCG@k (binary relevance) per cut-off, and MRR
+        over the deepest cut-off, averaged over the queries
+    """
+    metrics = defaultdict(list)
+    for ranking, rel in zip(rankings, relevant):
+        hits = [i in rel for i in ranking]
+        for k in ks:
+            found = sum(hits[:k])
+            metrics[f"recall@{k}"].append(found / len(rel))
+            metrics[f"precision@{k}"].append(found / k)
+            dcg = sum(1 / math.log2(rank + 2) for rank, hit in enumerate(hits[:k]) if hit)
+            ideal = sum(1 / math.log2(rank + 2) for rank in range(min(len(rel), k)))
+            metrics[f"ndcg@{k}"].append(dcg / ideal)
+        first = next((rank for rank, hit in enumerate(hits) if hit), None)
+        metrics["mrr"].append(0.0 if first is None else 1 / (first + 1))
+    return {name: round(float(np.mean(values)), 4) for name, values in metrics.items()}
+
+
+def run_config(retriever: Retriever, vectors: np.ndarray, corpus: dict, query_sets: dict,
+               query_vectors: dict, ks: list, repeats: int, warmup: int) -> list:
+    """
+    Build one configuration and run every query set against it.
+
+    Returns:
+        One result dictionary per query set
+    """
+    start = time.perf_counter()
+    retriever.build(vectors, corpus)
+    build_seconds = time.perf_counter() - start
+    index_mb = retriever.nbytes() / 1e6
+    depth = max(ks)
+
+    results = []
+    for name, queries in query_sets.items():
+        if not queries:
+            continue
+        texts = [query['query'] for query in queries]
+        excluded = [query.get('exclude', set()) for query in queries]
+        search_depth = depth + max(len(exclude) for exclude in excluded)
+        for i in range(min(warmup, len(texts))):
+            retriever.search(texts[i], query_vectors[name][i], search_depth)
+
+        latencies = []
+        rankings = None
+        for _ in range(repeats):
+            rankings = []
+            for text, vector, exclude in zip(texts, query_vectors[name], excluded):
+                search_start = time.perf_counter()
+                ranking = retriever.search(text, vector, search_depth)
+                latencies.append((time.perf_counter() - search_start) * 1000)
+                rankings.append([i for i in ranking if i not in exclude][:depth])
+
+        latencies = np.array(latencies)
+        results.append({
+            "config": retriever.name,
+            "params": retriever.params(),
+            "query_set": name,
+            "queries": len(queries),
+            "build_seconds": round(build_seconds, 3),
+            "index_mb": round(index_mb, 3),
+            "qps": round(len(latencies) / (latencies.sum() / 1000), 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            **quality_metrics(rankings, [query['relevant'] for query in queries], ks),
+            "latency_samples_ms": [round(float(latency), 4) for latency in latencies]
+        })
+    return results
+
+
+def history_metrics(results: list, query_latencies: list) -> dict:
+    """
+    Returns:
+        The results as benchmark history metrics, named <config>/<query set>/<metric>
+    """
+    metrics = {"query_embedding_ms": metric(query_latencies, "lower", "ms")}
+    for r in results:
+        prefix = f"{r['config']}/{r['query_set']}/"
+        metrics[prefix + "search_ms"] = metric(r['latency_samples_ms'], "lower", "ms")
+        metrics[prefix + "build_seconds"] = metric(r['build_seconds'], "lower", "s")
+        metrics[prefix + "index_mb"] = metric(r['index_mb'], "lower", "MB")
+        for name, value in r.items():
+            if "@" in name or name == "mrr":
+                metrics[prefix + name] = metric(value, "higher")
+    return metrics
+
+
+def print_results(results: list, k: int):
+    """Print the benchmark results as a comparison table."""
+    print(f"\n{'Config':<8} {'Query set':<14} {'Queries':>7} {f'R@{k}':>7} {f'P@{k}':>7} {f'nDCG@{k}':>8} {'MRR':>7} "
+          f"{'QPS':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Build s':>8} {'Index MB':>9}")
+    print(f"{'-' * 118}")
+    for r in results:
+        print(f"{r['config']:<8} {r['query_set'][:14]:<14} {r['queries']:>7} {r[f'recall@{k}']:>7.4f} "
+              f"{r[f'precision@{k}']:>7.4f} {r[f'ndcg@{k}']:>8.4f} {r['mrr']:>7.4f} {r['qps']:>9.1f} "
+              f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['build_seconds']:>8.2f} "
+              f"{r['index_mb']:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency per index configuration")
+    parser.add_argument("--configs", nargs="+", choices=CONFIGS, default=["flat", "ivf", "hnsw", "hybrid"],
+                        help="Index configurations to compare")
+    parser.add_argument("--filtered-dir", default=FILTERED_DATA_PATH, help="Directory of filtered case JSON files")
+    parser.add_argument("--queries", help="Extra labelled queries (JSONL)")
+    parser.add_argument("--generated", type=int, default=0, help="Number of labelled queries generated from the corpus")
+    parser.add_argument("--k", type=int, nargs="+", default=sorted({Config.TOP_K_RETRIEVAL, 5, 10}),
+                        help="Cut-offs for recall, precision and nDCG")
+    parser.add_argument("--repeats", type=int, default=3, help="Times each query set is run for the latency samples")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed queries per query set")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells (default ~4 sqrt(N))")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF cells scanned per query")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW graph degree")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW search beam width")
+    parser.add_argument("--hybrid-depth", type=int, default=50, help="Candidates fused from each hybrid ranking")
+    parser.add_argument("--output", help="JSON results file (default tests/results/retrieval_benchmark_<time>.json)")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the run in the benchmark history")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.filtered_dir)
+    if not corpus['ids']:
+        sys.exit(f"No filtered cases in {args.filtered_dir}")
+    query_sets = load_query_sets(corpus, args.queries, args.generated)
+
+    embedder = ClinicalEmbedder()
+    embeddings = CachedEmbeddings(embedder.load_embeddings(Config.TEXT_EMBEDDING_MODEL),
+                                  Config.PIPELINE_EMBEDDING_CACHE, Config.TEXT_EMBEDDING_MODEL)
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(corpus['texts']), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+    print(f"Embedded {len(vectors)} cases in {embed_seconds:.1f}s ({embeddings.hits} from the embedding cache)")
+
+    query_vectors = {}
+    query_latencies = []
+    for name, queries in query_sets.items():
+        query_vectors[name] = []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors[name].append(np.asarray(embeddings.embed_query(query['query']), dtype=np.float32))
+            query_latencies.append((time.perf_counter() - start) * 1000)
+
+    results = []
+    for name in args.configs:
+        retriever = create_retriever(name, args)
+        try:
+            results.extend(run_config(retriever, vectors, corpus, query_sets, query_vectors,
+                                      sorted(args.k), args.repeats, args.warmup))
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+
+    print_results(results, Config.TOP_K_RETRIEVAL if Config.TOP_K_RETRIEVAL in args.k else min(args.k))
+    if query_latencies:
+        print(f"\nQuery embedding (not included above): p50 {np.percentile(query_latencies, 50):.2f} ms | "
+              f"p99 {np.percentile(query_latencies, 99):.2f} ms")
+
+    output = Path(args.output) if args.output else (
+        Path(__file__).parent / "results" / f"retrieval_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "embedding_model": Config.TEXT_EMBEDDING_MODEL,
+            "corpus_size": len(corpus['ids']),
+            "embedding_dim": int(vectors.shape[1]),
+            "embed_seconds": round(embed_seconds, 3),
+            "query_embedding_p50_ms": round(float(np.percentile(query_latencies, 50)), 3) if query_latencies else None,
+            "query_sets": {name: len(queries) for name, queries in query_sets.items()},
+            "k": sorted(args.k),
+            "results": results
+        }, f, indent=2)
+    print(f"Results saved to: {output}")
+
+    if not args.no_history:
+        record_run("retrieval_quality", history_metrics(results, query_latencies),
+                   {**vars(args), "corpus_size": len(corpus['ids'])})
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Scale Benchmark
+
+Builds, publishes and serves indexes over synthetic corpora of growing size (10k, 100k and
+1M cases by default) and reports, per size: corpus load time (load_filtered_as_document),
+embedding and index build time, publish time, index size on disk, peak build RSS,
+ClinicalRAG startup time and resident memory, and search latency percentiles.
+
+Each build and each serving run happens in a fresh process, so memory figures belong to that
+size alone (a run killed for lack of memory is reported as failed). Runs offline: by default
+documents are embedded with a feature-hashing embedder of the model's dimension, since the
+real model would take hours at 1M cases; --embedder model uses the locally cached model.
+Index settings (INDEX_NUM_SHARDS, INDEX_QUANTIZATION, INDEX_MMAP) come from the config or
+--shards / --quantization. Every run is recorded in the benchmark history.
+
+    python tests/benchmark_scale.py --sizes 10000 100000 1000000
+"""
+
+import os
+
+# Offline: fail fast instead of reaching out to the HuggingFace Hub
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.settings import Config
+from tests.benchmark_history import metric, record_run
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+RESULT_PREFIX = "RESULT "  # Marks the JSON line a child process reports
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of the words of a text into EMBEDDING_DIM dimensions. Deterministic
+    across processes and thousands of times faster than the model, so index behaviour can be
+    measured at sizes the model cannot embed in reasonable time. Texts sharing words are close.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.buckets = {}  # token -> (dimension, sign)
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            bucket = self.buckets.get(token)
+            if bucket is None:
+                digest = zlib.crc32(token.encode("utf-8"))
+                bucket = self.buckets[token] = (digest % self.dim, 1.0 if digest & 0x80000000 else -1.0)
+            vector[bucket[0]] += bucket[1]
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def load_embeddings(embedder_name: str):
+    if embedder_name == "hashing":
+        return HashingEmbeddings()
+    from src.embedding.embedder import ClinicalEmbedder
+    return ClinicalEmbedder().load_embeddings(Config.TEXT_EMBEDDING_MODEL)
+
+
+def rss_mb() -> float:
+    """Current resident memory (Linux), else the peak."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB on Linux
+
+
+def directory_mb(path: Path) -> float:
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file()) / 1e6
+
+
+def build_phase(filtered_dir: str, index_root: str, embedder_name: str) -> dict:
+    """Load the corpus, embed it, build the configured index and publish it (child process)."""
+    from src.embedding.embedder import ClinicalEmbedder
+
+    embedder = ClinicalEmbedder(filtered_dir)
+    embeddings = load_embeddings(embedder_name)
+
+    start = time.perf_counter()
+    documents = embedder.load_filtered_as_document()
+    loaded = time.perf_counter()
+    vector_store = embedder.create_index(documents, Config.TEXT_EMBEDDING_MODEL, embeddings)
+    built = time.perf_counter()
+    embedder.publish_vector_store(vector_store, index_root)
+    published = time.perf_counter()
+
+    return {
+        "documents": len(documents),
+        "load_cases_seconds": round(loaded - start, 3),
+        "build_seconds": round(built - loaded, 3),
+        "build_docs_per_second": round(len(documents) / (built - loaded), 1),
+        "publish_seconds": round(published - built, 3),
+        "build_peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def serve_phase(index_root: str, embedder_name: str, repeats: int) -> dict:
+    """Start ClinicalRAG on the published index and time searches (child process)."""
+    from src.generation.rag_generator import ClinicalRAG
+    from tests.ground_truth import GROUND_TRUTH
+
+    Config.RETRIEVAL_CACHE_ENABLED = False  # Every search hits the index
+    embeddings = load_embeddings(embedder_name)
+    embeddings.embed_query("warm-up")  # Model weights are not part of the index footprint
+    before = rss_mb()
+
+    start = time.perf_counter()
+    rag = ClinicalRAG(retrieval_only=True, vector_store_path=index_root, embeddings=embeddings)
+    startup = time.perf_counter() - start
+    after = rss_mb()
+
+    queries = [test_case['query'] for test_case in GROUND_TRUTH]
+    for query in queries[:3]:
+        rag.search(query)
+    total, retrieval = [], []
+    for _ in range(repeats):
+        for query in queries:
+            search_start = time.perf_counter()
+            result = rag.search(query)
+            total.append((time.perf_counter() - search_start) * 1000)
+            retrieval.append(result['timing']['retrieval_seconds'] * 1000)
+
+    return {
+        "startup_seconds": round(startup, 3),
+        "serve_rss_mb": round(after, 1),
+        "index_rss_mb": round(after - before, 1),
+        "search_p50_ms": round(float(np.percentile(total, 50)), 3),
+        "search_p95_ms": round(float(np.percentile(total, 95)), 3),
+        "search_p99_ms": round(float(np.percentile(total, 99)), 3),
+        "retrieval_p50_ms": round(float(np.percentile(retrieval, 50)), 3),
+        "queries": len(total),
+        "search_samples_ms": [round(latency, 4) for latency in total]
+    }
+
+
+def run_child(args: list, overrides: list) -> dict:
+    """Run a phase in a fresh process, returns its result (or the error if it failed or was killed)."""
+    process = subprocess.run([sys.executable, __file__, *args, *overrides], capture_output=True, text=True)
+    for line in reversed(process.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    tail = (process.stderr or process.stdout).strip().splitlines()[-5:]
+    reason = "killed (out of memory?)" if process.returncode < 0 else "\n".join(tail)
+    print(f"  {args[1]} phase failed with exit code {process.returncode}: {reason}")
+    return {"error": f"exit code {process.returncode}: {reason}"}
+
+
+def benchmark_size(size: int, work_dir: Path, args, overrides: list) -> dict:
+    from tests.generate_synthetic_corpus import generate_corpus
+
+    filtered_dir = work_dir / f"filtered_{size}"
+    index_root = work_dir / f"index_{size}"
+    result = {"cases": size}
+
+    existing = sum(1 for _ in filtered_dir.glob("*_filtered.json")) if filtered_dir.exists() else 0
+    if existing != size:
+        print(f"Generating {size} synthetic cases...")
+        result["generate_seconds"] = round(generate_corpus(size, str(filtered_dir), seed=args.seed,
+                                                           workers=args.workers), 1)
+
+    print(f"[{size}] building the index...")
+    result.update(run_child(["--phase", "build", "--filtered-dir", str(filtered_dir), "--index-root",
+                             str(index_root), "--embedder", args.embedder], overrides))
+    if "error" in result:
+        return result
+
+    from src.indexing.versioning import IndexVersionManager
+    result["index_mb"] = round(directory_mb(IndexVersionManager(index_root).resolve()), 1)
+
+    print(f"[{size}] starting ClinicalRAG and searching...")
+    result.update(run_child(["--phase", "serve", "--index-root", str(index_root), "--embedder", args.embedder,
+                             "--repeats", str(args.repeats)], overrides))
+    return result
+
+
+def history_metrics(results: list) -> dict:
+    """
+    Returns:
+        The results of the sizes that completed as benchmark history metrics, named <cases>/<metric>
+    """
+    metrics = {}
+    for r in results:
+        if "error" in r:
+            continue
+        prefix = f"{r['cases']}/"
+        metrics[prefix + "load_cases_seconds"] = metric(r['load_cases_seconds'], "lower", "s")
+        metrics[prefix + "build_docs_per_second"] = metric(r['build_docs_per_second'], "higher", "docs/s")
+        metrics[prefix + "publish_seconds"] = metric(r['publish_seconds'], "lower", "s")
+        metrics[prefix + "index_mb"] = metric(r['index_mb'], "lower", "MB")
+        metrics[prefix + "build_peak_rss_mb"] = metric(r['build_peak_rss_mb'], "lower", "MB")
+        metrics[prefix + "startup_seconds"] = metric(r['startup_seconds'], "lower", "s")
+        metrics[prefix + "serve_rss_mb"] = metric(r['serve_rss_mb'], "lower", "MB")
+        metrics[prefix + "search_ms"] = metric(r['search_samples_ms'], "lower", "ms")
+    return metrics
+
+
+def print_results(results: list):
+    """Print the benchmark results as a table."""
+    print(f"\n{'Cases':>9} {'Load s':>8} {'Build s':>9} {'Docs/s':>9} {'Publish s':>10} {'Index MB':>9} "
+          f"{'Build RSS':>10} {'Startup s':>10} {'Serve RSS':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print(f"{'-' * 118}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['cases']:>9} failed: {r['error'][:100]}")
+            continue
+        print(f"{r['cases']:>9} {r['load_cases_seconds']:>8.1f} {r['build_seconds']:>9.1f} "
+              f"{r['build_docs_per_second']:>9.0f} {r['publish_seconds']:>10.1f} {r['index_mb']:>9.1f} "
+              f"{r['build_peak_rss_mb']:>10.0f} {r['startup_seconds']:>10.2f} {r['serve_rss_mb']:>10.0f} "
+              f"{r['search_p50_ms']:>8.2f} {r['search_p95_ms']:>8.2f} {r['search_p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark build, startup and search at growing corpus sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Corpus sizes")
+    parser.add_argument("--work-dir", default="data/synthetic", help="Synthetic corpora and indexes (kept for reruns)")
+    parser.add_argument("--embedder", choices=["hashing", "model"], default="hashing",
+                        help="hashing: fast offline stand-in, model: the locally cached embedding model")
+    parser.add_argument("--shards", type=int, help="Override INDEX_NUM_SHARDS")
+    parser.add_argument("--quantization", choices=["none", "binary", "int8"], help="Override INDEX_QUANTIZATION")
+    parser.add_argument("--repeats", type=int, default=20, help="Times each ground truth query is searched")
+    parser.add_argument("--seed", type=int, default=42, help="Synthetic corpus seed")
+    parser.add_argument("--workers", type=int, default=4, help="Processes generating the corpus")
+    parser.add_argument("--output", help="JSON results file (default tests/results/scale_benchmark_<time>.json)")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the run in the benchmark history")
+    # Internal: one phase in a child process
+    parser.add_argument("--phase", choices=["build", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--filtered-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--index-root", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.shards:
+        Config.INDEX_NUM_SHARDS = args.shards
+    if args.quantization:
+        Config.INDEX_QUANTIZATION = None if args.quantization == "none" else args.quantization
+
+    if args.phase == "build":
+        print(RESULT_PREFIX + json.dumps(build_phase(args.filtered_dir, args.index_root, args.embedder)))
+        sys.exit(0)
+    if args.phase == "serve":
+        print(RESULT_PREFIX + json.dumps(serve_phase(args.index_root, args.embedder, args.repeats)))
+        sys.exit(0)
+
+    overrides = []
+    if args.shards:
+        overrides += ["--shards", str(args.shards)]
+    if args.quantization:
+        overrides += ["--quantization", args.quantization]
+
+    work_dir = Path(args.work_dir)
+    results = [benchmark_size(size, work_dir, args, overrides) for size in sorted(args.sizes)]
+    print_results(results)
+
+    output = Path(args.output) if args.output else (
+        Path(__file__).parent / "results" / f"scale_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "embedder": args.embedder,
+            "embedding_model": Config.TEXT_EMBEDDING_MODEL if args.embedder == "model" else "hashing",
+            "index": {"num_shards": Config.INDEX_NUM_SHARDS, "quantization": Config.INDEX_QUANTIZATION,
+                      "mmap": Config.INDEX_MMAP},
+            "results": results
+        }, f, indent=2)
+    print(f"Results saved to: {output}")
+
+    if not args.no_history:
+        record_run("scale", history_metrics(results), args)
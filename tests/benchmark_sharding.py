@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Sharded Index Benchmark
+
+Measures search latency and resident memory of the sharded FAISS index against shard count,
+and checks that every shard count returns exactly the results of a single unsharded index.
+Each configuration is built and searched in a fresh process, so its memory figures are its own.
+Uses synthetic vectors, so it runs offline without the embedding model.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from src.indexing.sharded_store import ShardedVectorStore, shard_for_case
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+def rss_mb() -> float:
+    """Current resident memory (Linux), else the peak."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB on Linux
+
+
+def synthetic_data(num_vectors: int, num_queries: int):
+    """Same seeded corpus and queries in every process."""
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((num_vectors, EMBEDDING_DIM)).astype(np.float32)
+    queries = rng.standard_normal((num_queries, EMBEDDING_DIM)).astype(np.float32)
+    return vectors, queries
+
+
+def build_sharded_store(vectors: np.ndarray, num_shards: int, num_workers: int) -> ShardedVectorStore:
+    """
+    Build an in-memory sharded store from synthetic vectors.
+
+    Args:
+        vectors: Matrix of document vectors (one row per case)
+        num_shards: Number of shards to hash the cases into
+        num_workers: Threads used to search the shards
+
+    Returns:
+        ShardedVectorStore over the synthetic cases
+    """
+    embedding = FakeEmbeddings(size=vectors.shape[1])
+    grouped = {}
+    for i, vector in enumerate(vectors):
+        case_id = f"case_{i}"
+        grouped.setdefault(shard_for_case(case_id, num_shards), []).append((case_id, vector))
+
+    shards = {}
+    for shard_id, items in grouped.items():
+        shards[shard_id] = FAISS.from_embeddings(
+            [(case_id, vector.tolist()) for case_id, vector in items],
+            embedding,
+            metadatas=[{"case_id": case_id} for case_id, _ in items]
+        )
+    return ShardedVectorStore(shards, embedding, num_shards, num_workers=num_workers)
+
+
+def build_single_store(vectors: np.ndarray) -> FAISS:
+    """
+    Build the unsharded reference index over the same synthetic cases.
+
+    Args:
+        vectors: Matrix of document vectors (one row per case)
+
+    Returns:
+        FAISS store holding every case
+    """
+    case_ids = [f"case_{i}" for i in range(len(vectors))]
+    return FAISS.from_embeddings(
+        [(case_id, vector.tolist()) for case_id, vector in zip(case_ids, vectors)],
+        FakeEmbeddings(size=vectors.shape[1]),
+        metadatas=[{"case_id": case_id} for case_id in case_ids]
+    )
+
+
+def run_configuration(num_vectors: int, num_shards: int, num_queries: int, k: int, num_workers: int) -> dict:
+    """
+    Build and search one configuration (runs in its own process).
+
+    Args:
+        num_vectors: Size of the synthetic corpus
+        num_shards: Number of shards, 0 for the single unsharded index
+        num_queries: Number of timed queries
+        k: Number of results per query
+        num_workers: Threads used to search the shards
+
+    Returns:
+        Timings, memory and the case ids found per query
+    """
+    vectors, queries = synthetic_data(num_vectors, num_queries)
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    store = build_sharded_store(vectors, num_shards, num_workers) if num_shards else build_single_store(vectors)
+    build_time = time.perf_counter() - start
+    rss_built = rss_mb()
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.similarity_search_with_score_by_vector(query.tolist(), k=k)
+        latencies.append(time.perf_counter() - start)
+        found.append([doc.metadata["case_id"] for doc, _ in hits])
+
+    latencies_ms = np.array(latencies) * 1000
+    result = {
+        "num_shards": num_shards,
+        "build_time_seconds": round(build_time, 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "index_rss_mb": round(rss_built - rss_before, 1),  # Held by the built store
+        "serving_rss_mb": round(rss_mb() - rss_before, 1),  # Also counts the search threads' buffers
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "found": found
+    }
+    if num_shards:
+        store.executor.shutdown()
+    return result
+
+
+def benchmark(num_vectors: int, shard_counts: list, num_queries: int, k: int, num_workers: int) -> list:
+    """
+    Run the latency and memory benchmark for the unsharded index and every shard count.
+
+    Args:
+        num_vectors: Size of the synthetic corpus
+        shard_counts: Shard counts to compare
+        num_queries: Number of timed queries per configuration
+        k: Number of results per query
+        num_workers: Threads used to search the shards
+
+    Returns:
+        List of result dictionaries, the unsharded reference first
+    """
+    results = []
+    for num_shards in [0] + list(shard_counts):
+        # A fresh process per configuration: memory freed by the previous one cannot hide or inflate its RSS.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results.append(pool.submit(run_configuration, num_vectors, num_shards, num_queries, k,
+                                       num_workers).result())
+
+    # The merge is exact, so every shard count must return the single-index results.
+    reference = results[0]["found"]
+    for result in results:
+        result["exact"] = result.pop("found") == reference
+    return results
+
+
+def print_results(results: list):
+    """Print the benchmark results as a table."""
+    print(f"\n{'Shards':<10} {'Build (s)':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'Index RSS (MB)':>15} "
+          f"{'Serving RSS (MB)':>17} {'Peak RSS (MB)':>14} {'Exact':>7}")
+    print(f"{'-' * 100}")
+    for r in results:
+        label = r["num_shards"] or "unsharded"
+        print(f"{label:<10} {r['build_time_seconds']:>10.3f} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['index_rss_mb']:>15.1f} {r['serving_rss_mb']:>17.1f} {r['peak_rss_mb']:>14.1f} "
+              f"{str(r['exact']):>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sharded FAISS search against shard count")
+    parser.add_argument("--vectors", type=int, default=100_000, help="Number of synthetic cases")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Shard counts to compare")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("--k", type=int, default=3, help="Results per query")
+    parser.add_argument("--workers", type=int, default=4, help="Search threads")
+    args = parser.parse_args()
+
+    print(f"Benchmarking {args.vectors} vectors, shard counts {args.shards}...")
+    results = benchmark(args.vectors, args.shards, args.queries, args.k, args.workers)
+    print_results(results)
+    sys.exit(0 if all(r["exact"] for r in results) else 1)
@@ -15,9 +15,12 @@ sys.path.insert(0, str(project_root))
 import json
 from typing import List, Dict, Tuple
 from src.generation.rag_generator import ClinicalRAG
+from tests.benchmark_history import metric, record_run
 from tests.ground_truth import GROUND_TRUTH
+from tests.relevance_index import RelevanceIndex
 from datetime import datetime
 from config.settings import Config
+from src.utils.metrics import METRICS
 
 
 def get_project_root():
@@ -25,28 +28,33 @@ def get_project_root():
     return Path(__file__).parent.parent
 
 
-def run_all_test(rag_system: ClinicalRAG, test_cases: List[Dict]) -> List[Dict]:
+def run_all_test(rag_system: ClinicalRAG, test_cases: List[Dict],
+                 max_concurrency: int = Config.LLM_MAX_CONCURRENCY) -> List[Dict]:
     """
     Run RAG system on all test cases.
 
     Args:
         rag_system: ClinicalRAG instance
         test_cases: List of test case dictionaries with 'query', 'expected_diagnosis', and 'expected_keywords'
+        max_concurrency: Maximum number of LLM calls in flight
 
     Returns:
-        List of response dictionaries with actual responses and retrieved cases
+        List of response dictionaries with actual responses, retrieved cases and per-query
+        latency split into retrieval (embedding and search) and generation
     """
     responses = []
 
-    for i, test_case in enumerate(test_cases):
+    # Embed and search all queries at once, the LLM calls then run concurrently.
+    results = rag_system.query_many([test_case['query'] for test_case in test_cases],
+                                    max_concurrency=max_concurrency)
+
+    for i, (test_case, result) in enumerate(zip(test_cases, results)):
         print(f"\n{'=' * 80}")
         print(f"TEST CASE {i + 1}/{len(test_cases)}: {test_case['expected_diagnosis'].upper()}")
         print(f"{'=' * 80}")
         print(f"Query: {test_case['query'][:100]}...")
 
-        try:
-            result = rag_system.query(test_case['query'])
-
+        if result['error'] is None:
             response = {
                 "test_index": i,
                 "test_case": test_case['query'],
@@ -55,13 +63,15 @@ def run_all_test(rag_system: ClinicalRAG, test_cases: List[Dict]) -> List[Dict]:
                 "actual_response": result["result"].lower(),
                 "retrieved_cases": [doc.metadata['case_id'] for doc in result['source_documents']],
                 "num_retrieved": len(result['source_documents']),
+                "context_tokens": result['context_tokens'],
+                "inference_time_seconds": result['timing']['total_seconds'],
+                **query_timing(result['timing']),
                 "error": None
             }
             responses.append(response)
             print(f"✓ Success - Retrieved {len(result['source_documents'])} cases")
-
-        except Exception as e:
-            print(f"✗ Error: {str(e)}")
+        else:
+            print(f"✗ Error: {result['error']}")
             response = {
                 "test_index": i,
                 "test_case": test_case['query'],
@@ -70,13 +80,67 @@ def run_all_test(rag_system: ClinicalRAG, test_cases: List[Dict]) -> List[Dict]:
                 "actual_response": "",
                 "retrieved_cases": [],
                 "num_retrieved": 0,
-                "error": str(e)
+                "context_tokens": 0,
+                "inference_time_seconds": result['timing']['total_seconds'],
+                **query_timing(result['timing']),
+                "error": result['error']
             }
             responses.append(response)
 
     return responses
 
 
+def query_timing(timing: Dict) -> Dict:
+    """
+    Per-query latency of a query_many result.
+
+    Args:
+        timing: The 'timing' dict of a query_many result
+
+    Returns:
+        Dictionary with retrieval, queue (waiting for an LLM slot) and generation seconds
+    """
+    return {
+        "retrieval_seconds": timing['embedding_seconds'] + timing['search_seconds'],
+        "queue_seconds": timing['queue_seconds'],
+        "generation_seconds": timing['generation_seconds'],
+        "semantic_cache_hit": timing['semantic_cache_hit']
+    }
+
+
+def summarize_latency(responses: List[Dict], keys=("retrieval_seconds", "generation_seconds",
+                                                   "inference_time_seconds")) -> Dict:
+    """
+    Mean and percentiles of the per-query latencies.
+
+    Args:
+        responses: List of response dictionaries
+        keys: Latency fields to summarize
+
+    Returns:
+        Dictionary of {field: {mean, p50, p95, max}} over the responses that have the field
+    """
+    summary = {}
+    for key in keys:
+        values = sorted(r[key] for r in responses if r.get(key) is not None)
+        if not values:
+            continue
+        summary[key] = {
+            "mean": sum(values) / len(values),
+            "p50": values[int(0.50 * (len(values) - 1))],
+            "p95": values[int(0.95 * (len(values) - 1))],
+            "max": values[-1]
+        }
+    return summary
+
+
+def print_latency(summary: Dict):
+    """Print the output of summarize_latency as a table."""
+    print(f"{'Latency (s)':<25} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8}")
+    for key, stats in summary.items():
+        print(f"{key:<25} {stats['mean']:>8.3f} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['max']:>8.3f}")
+
+
 def calculate_diagnosis_accuracy(responses: List[Dict]) -> Tuple[float, int, int]:
     """
     Calculate diagnosis accuracy by checking if expected diagnosis appears in actual response.
@@ -132,6 +196,18 @@ def calculate_match_keywords(responses: List[Dict]) -> float:
     return sum(matches) / len(matches) if matches else 0.0
 
 
+_relevance_index = None
+
+
+def get_relevance_index() -> RelevanceIndex:
+    """The relevance index of the filtered corpus, loaded (or built) once per process."""
+    global _relevance_index
+    if _relevance_index is None:
+        _relevance_index = RelevanceIndex.load(get_project_root() / "data" / "processed" / "filtered",
+                                               get_project_root() / Config.RELEVANCE_INDEX_FILE)
+    return _relevance_index
+
+
 def is_case_relevant(case_id: str, expected_disease: str, expected_keywords: List[str]) -> bool:
     """
     Check if a case file is relevant to the expected disease and keywords.
@@ -144,37 +220,10 @@ def is_case_relevant(case_id: str, expected_disease: str, expected_keywords: Lis
     Returns:
         True if case contains expected disease or keywords, False otherwise
     """
-    project_root = get_project_root()
-    case_path = project_root / "data" / "processed" / "filtered" / f"{case_id}_filtered.json"
-
-    if not case_path.exists():
-        return False
-
-    try:
-        with open(case_path, 'r') as f:
-            case_data = json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return False
-
-    diseases_text = " ".join(case_data.get('diseases', [])).lower()
-    history_text = case_data.get('patient_history', '').lower()
-    symptoms_text = " ".join(case_data.get('symptoms', [])).lower()
+    return get_relevance_index().is_relevant(case_id, expected_disease, expected_keywords)
 
-    combined_text = diseases_text + " " + history_text + " " + symptoms_text
 
-    # Check if expected disease is in combined text
-    if expected_disease.lower() in combined_text:
-        return True
-
-    # Check if any expected keywords are in combined text
-    for keyword in expected_keywords:
-        if keyword.lower() in combined_text:
-            return True
-
-    return False
-
-
-def calculate_precision_at_k(results: List[Dict], k: int = 5) -> float:
+def calculate_precision_at_k(results: List[Dict], k: int = Config.TOP_K_RETRIEVAL) -> float:
     """
     Calculate average Precision@K metric.
 
@@ -183,7 +232,7 @@ def calculate_precision_at_k(results: List[Dict], k: int = 5) -> float:
 
     Args:
         results: List of response dictionaries containing 'retrieved_cases' key
-        k: Number of top results to consider (default: 5)
+        k: Number of top results to consider (default: TOP_K_RETRIEVAL, the number the RAG system retrieves)
 
     Returns:
         Average precision@k across all test cases (0.0-1.0)
@@ -217,6 +266,66 @@ def calculate_precision_at_k(results: List[Dict], k: int = 5) -> float:
     return sum(precisions) / len(precisions) if precisions else 0.0
 
 
+def calculate_recall_at_k(results: List[Dict], k: int = Config.TOP_K_RETRIEVAL) -> float:
+    """
+    Calculate average Recall@K metric.
+
+    Recall@K measures the proportion of all relevant cases in the corpus that appear in the
+    top-K retrieved cases.
+
+    Args:
+        results: List of response dictionaries containing 'retrieved_cases' key
+        k: Number of top results to consider (default: TOP_K_RETRIEVAL)
+
+    Returns:
+        Average recall@k across the test cases that have relevant cases (0.0-1.0)
+    """
+    recalls = []
+
+    for result in results:
+        if result['error'] is not None:
+            continue
+
+        relevant = get_relevance_index().relevant_cases(result['expected_diagnosis'], result['expected_keywords'])
+        if not relevant:
+            continue
+
+        retrieved_cases = set(result.get('retrieved_cases', [])[:k])
+        recalls.append(len(retrieved_cases & relevant) / len(relevant))
+
+    return sum(recalls) / len(recalls) if recalls else 0.0
+
+
+def history_metrics(responses: List[Dict], precision_at_k: float, recall_at_k: float) -> Dict:
+    """
+    Benchmark history metrics of an evaluation, per query where possible so runs can be
+    compared with Welch's t-test.
+
+    Args:
+        responses: List of response dictionaries
+        precision_at_k: Output of calculate_precision_at_k
+        recall_at_k: Output of calculate_recall_at_k
+
+    Returns:
+        Dictionary of {name: metric}
+    """
+    answered = [r for r in responses if r['error'] is None]
+    keyword_matches = [
+        sum(keyword.lower() in r['actual_response'].lower() for keyword in r['expected_keywords']) /
+        len(r['expected_keywords'])
+        for r in answered if r['expected_keywords']
+    ]
+    return {
+        "diagnosis_correct": metric([float(r['expected_diagnosis'].lower() in r['actual_response'].lower())
+                                     for r in answered], "higher"),
+        "keyword_match": metric(keyword_matches, "higher"),
+        "precision_at_k": metric(precision_at_k, "higher"),
+        "recall_at_k": metric(recall_at_k, "higher"),
+        **{key: metric([r[key] for r in responses], "lower", "s")
+           for key in ("retrieval_seconds", "generation_seconds", "inference_time_seconds")}
+    }
+
+
 if __name__ == "__main__":
     print(f"\n{'#' * 80}")
     print(f"RAG SYSTEM EVALUATION")
@@ -234,7 +343,12 @@ if __name__ == "__main__":
         # Calculate metrics
         accuracy, correct, total = calculate_diagnosis_accuracy(results)
         keyword_match = calculate_match_keywords(results)
-        precision_at_5 = calculate_precision_at_k(results, k=5)
+        precision_at_k = calculate_precision_at_k(results, k=Config.TOP_K_RETRIEVAL)
+        recall_at_k = calculate_recall_at_k(results, k=Config.TOP_K_RETRIEVAL)
+        context_tokens = [r['context_tokens'] for r in results if r['error'] is None]
+        avg_context_tokens = sum(context_tokens) / len(context_tokens) if context_tokens else 0.0
+        inference_times = [r['inference_time_seconds'] for r in results]
+        avg_inference_time = sum(inference_times) / len(inference_times) if inference_times else 0.0
 
         # Print results
         print(f"\n{'#' * 80}")
@@ -242,7 +356,12 @@ if __name__ == "__main__":
         print(f"{'#' * 80}\n")
         print(f"Diagnosis Accuracy: {correct}/{total} = {accuracy:.2%}")
         print(f"Keyword Match Rate: {keyword_match:.2%}")
-        print(f"Precision@5: {precision_at_5:.2%}\n")
+        print(f"Precision@{Config.TOP_K_RETRIEVAL}: {precision_at_k:.2%}")
+        print(f"Recall@{Config.TOP_K_RETRIEVAL}: {recall_at_k:.2%}")
+        print(f"Avg Context Tokens: {avg_context_tokens:.0f}")
+        print(f"Avg Inference Time: {avg_inference_time:.2f}s\n")
+        latency_summary = summarize_latency(results)
+        print_latency(latency_summary)
 
         # Prepare metrics dictionary
         metrics = {
@@ -255,7 +374,14 @@ if __name__ == "__main__":
             "failed_tests": len([r for r in results if r['error'] is not None]),
             "diagnosis_accuracy_percent": round(accuracy * 100, 2),
             "keyword_match_percent": round(keyword_match * 100, 2),
-            "precision_at_5_percent": round(precision_at_5 * 100, 2),
+            "precision_at_k": Config.TOP_K_RETRIEVAL,
+            "precision_at_k_percent": round(precision_at_k * 100, 2),
+            "recall_at_k_percent": round(recall_at_k * 100, 2),
+            "context_token_budget": Config.CONTEXT_TOKEN_BUDGET,
+            "avg_context_tokens": round(avg_context_tokens, 1),
+            "avg_inference_time_seconds": avg_inference_time,
+            "query_latency": latency_summary,
+            "latency": METRICS.summary(),  # Per-stage histograms: embedding, search, docstore, prompt, LLM
             "correct_diagnoses": correct,
             "results": results
         }
@@ -279,6 +405,8 @@ if __name__ == "__main__":
             json.dump(serialize_obj(metrics), f, indent=2)
 
         print(f"Results saved to: {results_file}\n")
+        record_run("rag_evaluation", history_metrics(results, precision_at_k, recall_at_k),
+                   {"model": Config.GEMINI_MODEL, "test_cases": len(GROUND_TRUTH)})
         print(f"{'#' * 80}\n")
 
     except Exception as e:
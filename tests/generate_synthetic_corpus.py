@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Synthetic Corpus Generator
+
+Writes filtered case JSON files with the schema GeminiClient produces
+(<case_id>_filtered.json: diseases, symptoms, vital signs, ... and patient history), so
+the embedding, indexing and serving paths can be tested at sizes far beyond the committed
+corpus. Each case is built around one tropical disease with its characteristic symptoms,
+findings and treatments, mixed with generic terms, so similarity search stays meaningful.
+List lengths and history length follow log-normal distributions, which can be fitted to a
+real filtered corpus with --fit-from. Optionally writes a text PDF per case (PyMuPDF) for
+the extraction stage.
+
+    python tests/generate_synthetic_corpus.py --cases 100000 --output data/synthetic/filtered
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+LIST_FIELDS = ("diseases", "symptoms", "vital_signs", "anatomical_terms", "laboratory_findings", "treatments",
+               "pathogens", "procedures", "misc_medical_terms", "risk_factors")
+
+# (median, spread) of log-normal list lengths, and of the number of words in patient_history
+DEFAULT_PROFILE = {
+    "diseases": (2, 0.5),
+    "symptoms": (7, 0.5),
+    "vital_signs": (3, 0.6),
+    "anatomical_terms": (5, 0.6),
+    "laboratory_findings": (7, 0.6),
+    "treatments": (4, 0.5),
+    "pathogens": (1, 0.5),
+    "procedures": (3, 0.6),
+    "misc_medical_terms": (6, 0.7),
+    "risk_factors": (2, 0.6),
+    "patient_history": (90, 0.5)
+}
+
+# Disease -> characteristic terms per field
+DISEASES = {
+    "Ebola virus disease": {
+        "symptoms": ["fever", "bleeding gums", "vomiting", "diarrhea", "subconjunctival hemorrhage", "myalgia"],
+        "pathogens": ["Zaire ebolavirus"], "laboratory_findings": ["thrombocytopenia", "elevated transaminases",
+                                                                   "positive RT-PCR for Ebola"],
+        "treatments": ["supportive care", "oral rehydration", "monoclonal antibodies"],
+        "risk_factors": ["outbreak area", "contact with bodily fluids", "funeral attendance"]},
+    "Visceral leishmaniasis": {
+        "symptoms": ["prolonged fever", "massive splenomegaly", "weight loss", "darkened skin", "hepatomegaly"],
+        "pathogens": ["Leishmania donovani"], "laboratory_findings": ["pancytopenia", "hypergammaglobulinemia",
+                                                                      "positive rK39 test"],
+        "treatments": ["liposomal amphotericin B", "miltefosine", "sodium stibogluconate"],
+        "risk_factors": ["sandfly exposure", "rural residence", "malnutrition"]},
+    "Leptospirosis": {
+        "symptoms": ["fever", "jaundice", "calf pain", "conjunctival suffusion", "oliguria"],
+        "pathogens": ["Leptospira interrogans"], "laboratory_findings": ["acute kidney injury", "elevated bilirubin",
+                                                                         "positive MAT"],
+        "treatments": ["doxycycline", "penicillin G", "hemodialysis"],
+        "risk_factors": ["floodwater exposure", "contact with rats", "farming"]},
+    "Malaria": {
+        "symptoms": ["cyclical fever", "chills", "sweating", "headache", "splenomegaly"],
+        "pathogens": ["Plasmodium falciparum", "Plasmodium vivax"], "laboratory_findings": [
+            "ring forms on blood smear", "anemia", "positive rapid diagnostic test"],
+        "treatments": ["artemether-lumefantrine", "intravenous artesunate", "primaquine"],
+        "risk_factors": ["travel to endemic area", "no chemoprophylaxis", "mosquito bites"]},
+    "Dengue fever": {
+        "symptoms": ["high fever", "retro-orbital pain", "rash", "bleeding gums", "arthralgia"],
+        "pathogens": ["dengue virus serotype 2"], "laboratory_findings": ["thrombocytopenia", "leukopenia",
+                                                                          "positive NS1 antigen"],
+        "treatments": ["fluid management", "paracetamol", "platelet monitoring"],
+        "risk_factors": ["Aedes mosquito exposure", "urban residence", "previous dengue infection"]},
+    "Typhoid fever": {
+        "symptoms": ["stepladder fever", "rose spots", "abdominal pain", "relative bradycardia", "constipation"],
+        "pathogens": ["Salmonella Typhi"], "laboratory_findings": ["positive blood culture", "leukopenia",
+                                                                   "elevated CRP"],
+        "treatments": ["ceftriaxone", "azithromycin", "ciprofloxacin"],
+        "risk_factors": ["street food", "contaminated water", "travel to South Asia"]},
+    "Tuberculosis": {
+        "symptoms": ["chronic cough", "hemoptysis", "night sweats", "weight loss", "fever"],
+        "pathogens": ["Mycobacterium tuberculosis"], "laboratory_findings": ["acid-fast bacilli on sputum smear",
+                                                                             "positive GeneXpert", "cavitary lesion"],
+        "treatments": ["isoniazid", "rifampicin", "pyrazinamide", "ethambutol"],
+        "risk_factors": ["homelessness", "HIV infection", "close contact with TB patient"]},
+    "Schistosomiasis": {
+        "symptoms": ["hematuria", "bloody diarrhea", "hepatosplenomegaly", "abdominal pain", "fatigue"],
+        "pathogens": ["Schistosoma mansoni", "Schistosoma haematobium"], "laboratory_findings": [
+            "eosinophilia", "eggs in urine", "periportal fibrosis on ultrasound"],
+        "treatments": ["praziquantel", "corticosteroids"],
+        "risk_factors": ["freshwater swimming", "lake exposure", "irrigation work"]},
+    "Chikungunya": {
+        "symptoms": ["high fever", "severe polyarthralgia", "rash", "joint swelling", "myalgia"],
+        "pathogens": ["chikungunya virus"], "laboratory_findings": ["lymphopenia", "positive chikungunya IgM",
+                                                                    "positive RT-PCR"],
+        "treatments": ["NSAIDs", "paracetamol", "physiotherapy"],
+        "risk_factors": ["Aedes mosquito exposure", "travel to Caribbean", "outbreak area"]},
+    "Strongyloidiasis": {
+        "symptoms": ["diarrhea", "wheezing", "larva currens", "abdominal pain", "pruritus"],
+        "pathogens": ["Strongyloides stercoralis"], "laboratory_findings": ["marked eosinophilia",
+                                                                            "larvae in stool", "positive serology"],
+        "treatments": ["ivermectin", "albendazole"],
+        "risk_factors": ["corticosteroid therapy", "HTLV-1 infection", "barefoot walking"]},
+}
+
+GENERIC = {
+    "symptoms": ["fatigue", "malaise", "nausea", "anorexia", "dizziness", "cough", "dyspnea", "chest pain",
+                 "lymphadenopathy", "confusion", "seizures", "neck stiffness", "photophobia", "pallor", "edema"],
+    "vital_signs": ["temperature 39.2 C", "heart rate 112 bpm", "blood pressure 90/60 mmHg", "respiratory rate 24",
+                    "oxygen saturation 93%", "temperature 38.5 C", "heart rate 58 bpm", "blood pressure 130/85 mmHg"],
+    "anatomical_terms": ["liver", "spleen", "kidney", "lungs", "skin", "conjunctiva", "lymph nodes", "bone marrow",
+                         "gastrointestinal tract", "central nervous system", "heart", "bladder"],
+    "laboratory_findings": ["elevated creatinine", "hyponatremia", "elevated lactate", "low albumin",
+                            "elevated D-dimer", "normal white cell count", "elevated LDH", "hypoglycemia",
+                            "prolonged prothrombin time", "elevated ferritin"],
+    "treatments": ["intravenous fluids", "oxygen therapy", "blood transfusion", "antipyretics", "empirical antibiotics"],
+    "procedures": ["chest X-ray", "abdominal ultrasound", "lumbar puncture", "bone marrow aspiration", "CT scan",
+                   "blood culture", "echocardiography", "endoscopy", "liver biopsy"],
+    "misc_medical_terms": ["differential diagnosis", "case report", "tropical medicine", "notifiable disease",
+                           "intensive care", "follow-up", "outpatient clinic", "public health", "endemic",
+                           "immunocompromised", "complication", "prognosis"],
+    "risk_factors": ["diabetes", "pregnancy", "smoking", "alcohol use", "malnutrition", "elderly age"],
+    "pathogens": [],
+}
+
+COUNTRIES = ["Uganda", "Bangladesh", "Philippines", "Brazil", "Tanzania", "India", "Nigeria", "Thailand",
+             "Cambodia", "Sudan", "Peru", "Kenya", "Vietnam", "Ghana", "Indonesia", "Colombia"]
+OCCUPATIONS = ["farmer", "teacher", "student", "nurse", "fisherman", "trader", "miner", "soldier", "tourist",
+               "construction worker", "aid worker", "safari guide"]
+HISTORY_SENTENCES = [
+    "The patient presented with {symptom} for {days} days.",
+    "There was a history of {risk}.",
+    "On examination the {anatomy} was notable.",
+    "Initial investigations showed {lab}.",
+    "{procedure} was performed on admission.",
+    "The patient was treated with {treatment} and improved over {days} days.",
+    "There was no relevant past medical history apart from {generic_risk}.",
+    "Symptoms worsened despite {treatment}.",
+    "Family members reported similar complaints.",
+]
+
+
+def fit_profile(filtered_dir: str) -> dict:
+    """
+    Fit the log-normal length distributions to a real filtered corpus.
+
+    Returns:
+        Dictionary of {field: (median, spread)} in the format of DEFAULT_PROFILE
+    """
+    lengths = {field: [] for field in DEFAULT_PROFILE}
+    for path in Path(filtered_dir).glob("*_filtered.json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            case = json.load(f)
+        for field in LIST_FIELDS:
+            lengths[field].append(len(case.get(field, [])))
+        lengths["patient_history"].append(len(case.get("patient_history", "").split()))
+
+    profile = dict(DEFAULT_PROFILE)
+    for field, values in lengths.items():
+        logs = [math.log(1 + value) for value in values]
+        if len(logs) < 2:
+            continue
+        mean = sum(logs) / len(logs)
+        spread = math.sqrt(sum((value - mean) ** 2 for value in logs) / (len(logs) - 1))
+        profile[field] = (math.exp(mean) - 1, max(spread, 0.05))
+    print(f"Fitted length profile on {len(lengths['diseases'])} cases from {filtered_dir}")
+    return profile
+
+
+def sample_length(rng: random.Random, median: float, spread: float) -> int:
+    return max(0, int(round(math.exp(rng.gauss(math.log(1 + median), spread)) - 1)))
+
+
+def pick(rng: random.Random, specific: list, generic: list, count: int) -> list:
+    """count distinct terms, the disease-specific ones first."""
+    terms = rng.sample(specific, min(len(specific), max(1, (count + 1) // 2))) if specific and count else []
+    pool = [term for term in generic if term not in terms]
+    terms += rng.sample(pool, min(len(pool), count - len(terms)))
+    return terms[:count]
+
+
+def generate_case(case_id: str, rng: random.Random, profile: dict) -> dict:
+    """
+    Returns:
+        A filtered case with every field of GeminiClient.new_case_data
+    """
+    disease = rng.choice(list(DISEASES))
+    terms = DISEASES[disease]
+    lengths = {field: sample_length(rng, *profile[field]) for field in DEFAULT_PROFILE}
+
+    case = {"case_id": case_id}
+    others = [name for name in DISEASES if name != disease]
+    case["diseases"] = [disease] + rng.sample(others, min(len(others), max(0, lengths["diseases"] - 1)))
+    for field in ("symptoms", "vital_signs", "anatomical_terms", "laboratory_findings", "treatments"):
+        case[field] = pick(rng, terms.get(field, []), GENERIC[field], max(1, lengths[field]))
+    case["pathogens"] = pick(rng, terms["pathogens"], GENERIC["pathogens"], lengths["pathogens"])
+    case["procedures"] = pick(rng, [], GENERIC["procedures"], lengths["procedures"])
+    case["misc_medical_terms"] = pick(rng, [], GENERIC["misc_medical_terms"], lengths["misc_medical_terms"])
+
+    history = [f"A {rng.randint(1, 85)}-year-old {rng.choice(['man', 'woman'])}, a {rng.choice(OCCUPATIONS)} "
+               f"from {rng.choice(COUNTRIES)}, was admitted."]
+    words = len(history[0].split())
+    while words < lengths["patient_history"]:
+        sentence = rng.choice(HISTORY_SENTENCES).format(
+            symptom=rng.choice(terms["symptoms"] + GENERIC["symptoms"]), days=rng.randint(1, 30),
+            risk=rng.choice(terms["risk_factors"]), anatomy=rng.choice(GENERIC["anatomical_terms"]),
+            lab=rng.choice(terms["laboratory_findings"] + GENERIC["laboratory_findings"]),
+            procedure=rng.choice(GENERIC["procedures"]),
+            treatment=rng.choice(terms["treatments"] + GENERIC["treatments"]),
+            generic_risk=rng.choice(GENERIC["risk_factors"]))
+        history.append(sentence[0].upper() + sentence[1:])
+        words += len(sentence.split())
+    case["patient_history"] = " ".join(history)
+    case["risk_factors"] = pick(rng, terms["risk_factors"], GENERIC["risk_factors"], lengths["risk_factors"])
+    return case
+
+
+def write_pdf(case: dict, pdf_dir: Path):
+    """Render the case as a plain text case report, one PDF page per ~3000 characters."""
+    import fitz
+
+    lines = [f"Case report {case['case_id']}", "", case["patient_history"], ""]
+    lines += [f"{field.replace('_', ' ').title()}: {', '.join(case[field])}" for field in LIST_FIELDS if case[field]]
+    text = "\n".join(lines)
+
+    document = fitz.open()
+    for start in range(0, len(text), 3000):
+        page = document.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50),
+                            text[start:start + 3000], fontsize=10)
+    document.save(pdf_dir / f"{case['case_id']}.pdf")
+    document.close()
+
+
+def generate_chunk(start: int, end: int, output: str, seed: int, profile: dict, pdf_dir: str = None,
+                   pdf_limit: int = 0) -> int:
+    """Write cases start..end-1. Seeded per case, so the corpus does not depend on the worker count."""
+    output = Path(output)
+    for i in range(start, end):
+        rng = random.Random(seed * 1_000_003 + i)
+        case = generate_case(f"synthetic_{i:07d}", rng, profile)
+        with open(output / f"{case['case_id']}_filtered.json", 'w', encoding='utf-8') as f:
+            json.dump(case, f, indent=2, ensure_ascii=False)  # As GeminiClient.save_filtered_case writes them
+        if pdf_dir and i < pdf_limit:
+            write_pdf(case, Path(pdf_dir))
+    return end - start
+
+
+def generate_corpus(num_cases: int, output: str, seed: int = 42, profile: dict = None, workers: int = 4,
+                    pdf_dir: str = None, pdf_limit: int = 0) -> float:
+    """
+    Args:
+        num_cases: Number of cases to write
+        output: Filtered case directory
+        seed: Random seed, the same seed gives the same corpus
+        profile: Length distributions (DEFAULT_PROFILE if not given)
+        workers: Processes writing in parallel
+        pdf_dir: Directory for synthetic PDFs (None = no PDFs)
+        pdf_limit: Number of cases that also get a PDF
+
+    Returns:
+        Seconds taken
+    """
+    Path(output).mkdir(parents=True, exist_ok=True)
+    if pdf_dir:
+        import fitz  # noqa: F401 (fail before writing anything when PyMuPDF is missing)
+        Path(pdf_dir).mkdir(parents=True, exist_ok=True)
+    profile = profile or DEFAULT_PROFILE
+
+    start = time.perf_counter()
+    chunk = max(1, min(10_000, num_cases // max(1, workers * 4) or 1))
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(generate_chunk, first, min(first + chunk, num_cases), str(output), seed, profile,
+                                   pdf_dir, pdf_limit)
+                   for first in range(0, num_cases, chunk)]
+        written = 0
+        for future in futures:
+            written += future.result()
+    seconds = time.perf_counter() - start
+    print(f"Generated {written} cases in {output} ({seconds:.1f}s, {written / seconds:.0f} cases/s)")
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic filtered case reports")
+    parser.add_argument("--cases", type=int, default=10_000, help="Number of cases")
+    parser.add_argument("--output", default="data/synthetic/filtered", help="Filtered case directory")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--workers", type=int, default=4, help="Processes writing in parallel")
+    parser.add_argument("--fit-from", help="Real filtered directory to fit the field length distributions to")
+    parser.add_argument("--pdfs", help="Also write a synthetic PDF per case to this directory (needs PyMuPDF)")
+    parser.add_argument("--pdf-limit", type=int, default=1000, help="Number of cases that get a PDF")
+    args = parser.parse_args()
+
+    generate_corpus(args.cases, args.output, args.seed, fit_profile(args.fit_from) if args.fit_from else None,
+                    args.workers, args.pdfs, args.pdf_limit)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+LLM Record/Replay Cassette
+
+Wraps a chat model and stores every answer in a JSON file keyed by the hash of the model
+name and the prompt. In replay mode the answers come from the file, so an evaluation rerun
+after a retriever change makes no API call for the prompts it has seen (identical retrieved
+context gives an identical prompt) and scores the same answers every time.
+
+    cassette = LLMCassette("tests/cassettes/llm.json", llm=gemini_chat_model(), mode="auto")
+    rag = ClinicalRAG(llm=cassette)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from config.settings import Config
+
+MODES = ("record", "replay", "auto")
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode for a prompt the cassette has no answer for"""
+
+
+def gemini_chat_model():
+    """
+    :return: the Gemini chat model the evaluations call, with the settings ClinicalRAG uses.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=Config.GEMINI_MODEL,
+        google_api_key=Config.GOOGLE_API_KEY,
+        temperature=0.7,
+        max_output_tokens=512
+    )
+
+
+class LLMCassette:
+    """
+    Chat model with the invoke/ainvoke/stream/astream calls of ChatGoogleGenerativeAI.
+
+    record: always call the model and store (or overwrite) the answer.
+    replay: answer from the cassette only, a prompt not recorded raises CassetteMiss.
+    auto: answer from the cassette, call the model and record on a miss.
+    """
+
+    def __init__(self, path, llm=None, mode="auto", model_name=Config.GEMINI_MODEL):
+        """
+        :param path: JSON file holding the recorded answers.
+        :param llm: chat model doing the actual calls (not needed in replay mode).
+        :param mode: record, replay or auto.
+        :param model_name: part of the key, answers of another model are never replayed.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {', '.join(MODES)}")
+        if llm is None and mode != "replay":
+            raise ValueError(f"Cassette mode '{mode}' needs a chat model to record from")
+        self.path = Path(path)
+        self.llm = llm
+        self.mode = mode
+        self.model_name = model_name
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def key(self, prompt):
+        return hashlib.sha256(f"{self.model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, prompt):
+        if self.mode == "record":
+            return None
+        with self.lock:
+            entry = self.entries.get(self.key(prompt))
+            if entry is not None:
+                self.hits += 1
+                return entry["response"]
+            self.misses += 1
+        if self.mode == "replay":
+            raise CassetteMiss(f"No recorded answer for prompt {self.key(prompt)[:12]} in {self.path}")
+        return None
+
+    def _record(self, prompt, response, seconds):
+        with self.lock:
+            self.entries[self.key(prompt)] = {
+                "model": self.model_name,
+                "prompt": prompt,
+                "response": response,
+                "seconds": round(seconds, 3)  # Latency of the recorded call, replays return at once
+            }
+            self.recorded += 1
+            self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, ensure_ascii=False)
+        os.replace(temp_path, self.path)  # Atomic, an interrupted run keeps what it recorded
+
+    def invoke(self, prompt):
+        response = self._lookup(prompt)
+        if response is None:
+            start = time.perf_counter()
+            response = self.llm.invoke(prompt).content
+            self._record(prompt, response, time.perf_counter() - start)
+        return AIMessage(content=response)
+
+    async def ainvoke(self, prompt):
+        response = self._lookup(prompt)
+        if response is None:
+            start = time.perf_counter()
+            response = (await self.llm.ainvoke(prompt)).content
+            self._record(prompt, response, time.perf_counter() - start)
+        return AIMessage(content=response)
+
+    def stream(self, prompt):
+        response = self._lookup(prompt)
+        if response is not None:
+            yield AIMessageChunk(content=response)
+            return
+        start = time.perf_counter()
+        parts = []
+        for chunk in self.llm.stream(prompt):
+            parts.append(chunk.content)
+            yield chunk
+        self._record(prompt, "".join(parts), time.perf_counter() - start)
+
+    async def astream(self, prompt):
+        response = self._lookup(prompt)
+        if response is not None:
+            yield AIMessageChunk(content=response)
+            return
+        start = time.perf_counter()
+        parts = []
+        async for chunk in self.llm.astream(prompt):
+            parts.append(chunk.content)
+            yield chunk
+        self._record(prompt, "".join(parts), time.perf_counter() - start)
+
+    def stats(self):
+        return {"mode": self.mode, "path": str(self.path), "entries": len(self.entries),
+                "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
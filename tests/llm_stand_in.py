@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Local LLM Stand-in
+
+A small HTTP server that answers like the LLM with configurable latency and errors,
+plus a chat model client for it with the same invoke/ainvoke/stream/astream calls as
+ChatGoogleGenerativeAI. Used to exercise timeouts, hedging and the circuit breaker
+without calling the Gemini API.
+
+    python tests/llm_stand_in.py --port 8765 --latency-ms 200 --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+ANSWER = ("1. Most likely diagnosis: Ebola virus disease\n2. Key supporting evidence: fever, bleeding, "
+          "travel to West Africa\n3. Recommended diagnostic tests: RT-PCR\n4. Suggested treatment: supportive care")
+
+
+class StandInServer:
+    """
+    Serves POST /generate (JSON answer) and POST /stream (NDJSON chunks). Behaviour can be
+    changed while running with configure(): base latency, a share of slow requests, an
+    error rate and the delay between streamed chunks.
+    """
+
+    def __init__(self, port=0, latency_ms=50, slow_rate=0.0, slow_ms=1000, error_rate=0.0, chunk_delay_ms=10):
+        self.settings = {}
+        self.configure(latency_ms=latency_ms, slow_rate=slow_rate, slow_ms=slow_ms,
+                       error_rate=error_rate, chunk_delay_ms=chunk_delay_ms)
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def configure(self, **settings):
+        self.settings.update(settings)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _delay(self):
+        settings = self.settings
+        slow = random.random() < settings["slow_rate"]
+        return (settings["slow_ms"] if slow else settings["latency_ms"]) / 1000
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with server.lock:
+                    server.requests += 1
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)  # The prompt does not change the answer
+
+                time.sleep(server._delay())
+                if random.random() < server.settings["error_rate"]:
+                    self.send_error(503, "Injected failure")
+                    return
+
+                if self.path == "/stream":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.end_headers()
+                    try:
+                        for word in ANSWER.split(" "):
+                            self.wfile.write((json.dumps({"text": word + " "}) + "\n").encode())
+                            self.wfile.flush()
+                            time.sleep(server.settings["chunk_delay_ms"] / 1000)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # The client stopped reading (closed stream), as real clients do
+                else:
+                    body = json.dumps({"text": ANSWER}).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output readable
+
+        return Handler
+
+
+class StandInChatModel:
+    """Client for StandInServer with the chat model calls ClinicalRAG uses"""
+
+    def __init__(self, url, timeout_seconds=120):
+        """
+        :param url: base URL of a StandInServer.
+        :param timeout_seconds: socket timeout, far above any deadline under test.
+        """
+        self.url = url
+        self.timeout_seconds = timeout_seconds
+
+    def _post(self, path, prompt):
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps({"prompt": prompt}).encode(),
+                                         headers={"Content-Type": "application/json"})
+        return urllib.request.urlopen(request, timeout=self.timeout_seconds)
+
+    def invoke(self, prompt):
+        with self._post("/generate", prompt) as response:
+            return AIMessage(content=json.loads(response.read())["text"])
+
+    async def ainvoke(self, prompt):
+        return await asyncio.to_thread(self.invoke, prompt)
+
+    def stream(self, prompt):
+        with self._post("/stream", prompt) as response:
+            for line in response:
+                if line.strip():
+                    yield AIMessageChunk(content=json.loads(line)["text"])
+
+    async def astream(self, prompt):
+        chunks = self.stream(prompt)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local LLM stand-in server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Normal response latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests that are slow")
+    parser.add_argument("--slow-ms", type=float, default=1000, help="Latency of slow requests")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, args.latency_ms, args.slow_rate, args.slow_ms, args.error_rate)
+    print(f"LLM stand-in listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
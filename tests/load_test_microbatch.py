@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Micro-batching Load Test
+
+Runs closed-loop clients against ClinicalRAG(retrieval_only=True).retrieve at several
+concurrency levels, with query micro-batching on and off, and reports throughput
+against p50/p99 latency. The retrieval cache is off so every request embeds and
+searches; queries are the ground truth cases with a per-request suffix.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from config.settings import Config
+from src.generation.rag_generator import ClinicalRAG
+from tests.ground_truth import GROUND_TRUTH
+
+
+def run_level(rag: ClinicalRAG, concurrency: int, requests_per_client: int) -> dict:
+    """
+    Args:
+        rag: Loaded retrieval-only ClinicalRAG
+        concurrency: Number of client threads, each sending one request at a time
+        requests_per_client: Requests sent by each client
+
+    Returns:
+        Dictionary with throughput, latency percentiles and the average batch size
+    """
+    queries = [test_case['query'] for test_case in GROUND_TRUTH]
+    latencies = [[] for _ in range(concurrency)]
+    before = rag.batcher.stats() if rag.batcher is not None else None
+
+    def client(i):
+        for j in range(requests_per_client):
+            query = f"{queries[(i + j) % len(queries)]} ({i}-{j})"  # Distinct text, no cache effects
+            start = time.perf_counter()
+            rag.retrieve(query)
+            latencies[i].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [latency for client_latencies in latencies for latency in client_latencies]
+    avg_batch_size = None
+    if rag.batcher is not None:
+        after = rag.batcher.stats()
+        batches = after['batches'] - before['batches']
+        avg_batch_size = (after['items'] - before['items']) / batches if batches else 0.0
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(all_latencies),
+        "qps": len(all_latencies) / elapsed,
+        "p50_ms": float(np.percentile(all_latencies, 50)),
+        "p99_ms": float(np.percentile(all_latencies, 99)),
+        "avg_batch_size": avg_batch_size
+    }
+
+
+def run_load_test(levels: list, requests_per_client: int, warmup: int) -> dict:
+    """
+    Returns:
+        Dictionary with the per-level results for "unbatched" and "batched"
+    """
+    results = {}
+    for mode, micro_batching in [("unbatched", False), ("batched", True)]:
+        rag = ClinicalRAG(retrieval_only=True, micro_batching=micro_batching)
+        rag.retrieval_cache = None
+        for i in range(warmup):
+            rag.retrieve(f"warm-up query {i}")
+        results[mode] = [run_level(rag, concurrency, requests_per_client) for concurrency in levels]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput vs latency of query micro-batching")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Concurrent clients per level")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed warm-up queries")
+    args = parser.parse_args()
+
+    results = run_load_test(args.concurrency, args.requests, args.warmup)
+
+    print(f"\n{'#' * 80}")
+    print(f"QUERY MICRO-BATCHING (max batch {Config.MICRO_BATCH_MAX_SIZE}, max wait {Config.MICRO_BATCH_MAX_WAIT_MS} ms)")
+    print(f"{'#' * 80}\n")
+    print(f"{'Clients':>8} | {'Mode':>9} | {'QPS':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'Avg batch':>9}")
+    print("-" * 64)
+    for unbatched, batched in zip(results["unbatched"], results["batched"]):
+        for mode, m in [("unbatched", unbatched), ("batched", batched)]:
+            batch = f"{m['avg_batch_size']:.1f}" if m['avg_batch_size'] is not None else "-"
+            print(f"{m['concurrency']:>8} | {mode:>9} | {m['qps']:>8.1f} | {m['p50_ms']:>8.2f} | "
+                  f"{m['p99_ms']:>8.2f} | {batch:>9}")
+        print(f"{'':>8}   speedup {batched['qps'] / unbatched['qps']:.2f}x")
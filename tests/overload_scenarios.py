@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Admission Control Overload Scenarios
+
+Drives the API's AdmissionController with a simulated LLM backend: a fixed number of
+calls served at once (the quota) and a fixed service time. No Gemini calls are made.
+
+- overload: offered load above capacity, with and without admission control. Without it,
+  every request queues and latency grows until requests hit the LLM deadline. With it,
+  the excess is rejected within milliseconds and accepted requests keep a stable latency.
+- priorities: a flood of batch requests does not delay interactive ones.
+- rate_limit: a client over its token bucket gets 429s while others are unaffected.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from src.serving.admission import AdmissionController, Rejected
+
+
+class SimulatedBackend:
+    """LLM stand-in that serves `capacity` calls at once, each taking `service_seconds`"""
+
+    def __init__(self, capacity: int, service_seconds: float):
+        self.semaphore = asyncio.Semaphore(capacity)
+        self.service_seconds = service_seconds
+
+    async def call(self):
+        async with self.semaphore:
+            await asyncio.sleep(self.service_seconds)
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return "-"
+    return f"p50 {np.percentile(values, 50) * 1000:.0f} ms | p99 {np.percentile(values, 99) * 1000:.0f} ms"
+
+
+async def send(backend, controller, deadline_seconds, priority="interactive", client_id=None):
+    """
+    Returns:
+        (outcome, latency in seconds) with outcome "ok", "timeout" or the rejection status code
+    """
+    start = time.monotonic()
+    try:
+        slot = await controller.acquire(client_id, priority) if controller is not None else None
+    except Rejected as e:
+        return e.status_code, time.monotonic() - start
+    try:
+        await asyncio.wait_for(backend.call(), deadline_seconds - (time.monotonic() - start))
+        return "ok", time.monotonic() - start
+    except asyncio.TimeoutError:
+        return "timeout", time.monotonic() - start
+    finally:
+        if slot is not None:
+            slot.release()
+
+
+async def offered_load(rate_per_second, duration_seconds, request):
+    """Open-loop arrivals at a fixed rate, returns the results of all requests"""
+    tasks = []
+    for _ in range(int(rate_per_second * duration_seconds)):
+        tasks.append(asyncio.create_task(request()))
+        await asyncio.sleep(1 / rate_per_second)
+    return await asyncio.gather(*tasks)
+
+
+def summarize(label, results):
+    ok = [latency for outcome, latency in results if outcome == "ok"]
+    timeouts = sum(1 for outcome, _ in results if outcome == "timeout")
+    rejected = [latency for outcome, latency in results if outcome in (429, 503)]
+    print(f"{label:<20} ok {len(ok):>4} ({percentiles(ok)}) | timeouts {timeouts:>4} | "
+          f"rejected {len(rejected):>4} ({percentiles(rejected)})")
+    return ok, timeouts
+
+
+async def scenario_overload(args) -> bool:
+    capacity_qps = args.capacity / args.service
+    rate = capacity_qps * args.overload
+    print(f"\n[overload] capacity {capacity_qps:.0f} req/s, offered {rate:.0f} req/s, deadline {args.deadline}s")
+
+    backend = SimulatedBackend(args.capacity, args.service)
+    unprotected = await offered_load(rate, args.duration, lambda: send(backend, None, args.deadline))
+    _, timeouts_without = summarize("no admission", unprotected)
+
+    backend = SimulatedBackend(args.capacity, args.service)
+    controller = AdmissionController(max_concurrent=args.capacity, max_queue_depth=args.capacity * 4,
+                                     max_wait_seconds=args.deadline / 4)
+    protected = await offered_load(rate, args.duration, lambda: send(backend, controller, args.deadline))
+    ok, timeouts_with = summarize("admission control", protected)
+
+    stats = controller.stats()
+    print(f"{'':<20} queue wait p50 {stats['wait_p50_ms']:.0f} ms | p99 {stats['wait_p99_ms']:.0f} ms | "
+          f"rejected {stats['rejected']}")
+    stable = bool(ok) and timeouts_with == 0 and np.percentile(ok, 99) <= args.service + args.deadline / 4 + 0.1
+    return stable and timeouts_with < timeouts_without
+
+
+async def scenario_priorities(args) -> bool:
+    print("\n[priorities] batch flood at 2x capacity plus interactive requests at 25% of capacity")
+    backend = SimulatedBackend(args.capacity, args.service)
+    controller = AdmissionController(max_concurrent=args.capacity, max_queue_depth=args.capacity * 4,
+                                     max_wait_seconds=args.deadline)
+    capacity_qps = args.capacity / args.service
+    batch, interactive = await asyncio.gather(
+        offered_load(capacity_qps * 2, args.duration, lambda: send(backend, controller, args.deadline * 4, "batch")),
+        offered_load(capacity_qps / 4, args.duration, lambda: send(backend, controller, args.deadline * 4))
+    )
+    batch_ok, _ = summarize("batch", batch)
+    interactive_ok, _ = summarize("interactive", interactive)
+    return len(interactive_ok) == len(interactive) and \
+        np.percentile(interactive_ok, 50) < np.percentile(batch_ok, 50)
+
+
+async def scenario_rate_limit(args) -> bool:
+    print("\n[rate_limit] one client sends 20 requests at once, burst 5")
+    backend = SimulatedBackend(args.capacity * 10, args.service)
+    controller = AdmissionController(max_concurrent=args.capacity * 10, max_queue_depth=100,
+                                     max_wait_seconds=args.deadline, rate_per_minute=60, burst=5)
+    noisy, quiet = await asyncio.gather(
+        asyncio.gather(*[send(backend, controller, args.deadline, client_id="noisy") for _ in range(20)]),
+        asyncio.gather(*[send(backend, controller, args.deadline, client_id=f"quiet-{i}") for i in range(5)])
+    )
+    summarize("noisy client", noisy)
+    summarize("other clients", quiet)
+    return sum(1 for outcome, _ in noisy if outcome == "ok") == 5 and \
+        sum(1 for outcome, _ in noisy if outcome == 429) == 15 and all(outcome == "ok" for outcome, _ in quiet)
+
+
+SCENARIOS = {
+    "overload": scenario_overload,
+    "priorities": scenario_priorities,
+    "rate_limit": scenario_rate_limit,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check admission control under simulated overload")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--capacity", type=int, default=4, help="LLM calls served at once")
+    parser.add_argument("--service", type=float, default=0.2, help="Seconds per LLM call")
+    parser.add_argument("--overload", type=float, default=3.0, help="Offered load as a multiple of capacity")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of offered load")
+    parser.add_argument("--deadline", type=float, default=2.0, help="Request deadline in seconds")
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.scenarios:
+        passed = asyncio.run(SCENARIOS[name](args))
+        print(f"{'PASS' if passed else 'FAIL'}: {name}")
+        if not passed:
+            failed.append(name)
+
+    print(f"\n{len(args.scenarios) - len(failed)}/{len(args.scenarios)} scenarios passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Relevance Index
+
+Precomputed answer to "which cases are relevant to this expected diagnosis and keywords",
+so evaluation does not open and parse a filtered case file for every retrieved case.
+An inverted index maps each normalized term of the filtered corpus to the cases containing
+it, and is cached on disk until a file in the filtered directory changes.
+
+Matching keeps the semantics of the original check: a case is relevant when the expected
+diagnosis or any keyword is a substring of its diseases, patient history and symptoms.
+
+    index = RelevanceIndex.load()
+    precision = sum(index.is_relevant(case_id, "malaria", ["plasmodium"]) for case_id in retrieved[:k]) / k
+    relevant = index.relevant_cases("malaria", ["plasmodium"])
+    recall = len(set(retrieved[:k]) & relevant) / len(relevant)
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+from pathlib import Path
+
+from config.settings import Config
+
+PROJECT_ROOT = Path(__file__).parent.parent
+FILTERED_DIR = PROJECT_ROOT / "data" / "processed" / "filtered"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+INDEX_FORMAT = 1  # Bumped when the cached structure changes, older cache files are rebuilt
+
+
+def relevance_text(case: dict) -> str:
+    """The fields a case is matched on, lower-cased and joined as the original check did."""
+    diseases_text = " ".join(case.get('diseases', [])).lower()
+    history_text = case.get('patient_history', '').lower()
+    symptoms_text = " ".join(case.get('symptoms', [])).lower()
+    return diseases_text + " " + history_text + " " + symptoms_text
+
+
+def directory_fingerprint(filtered_dir: Path) -> str:
+    """Hash of the directory and the names, sizes and modification times of its files (no file is read)."""
+    digest = hashlib.sha256(str(Path(filtered_dir).resolve()).encode("utf-8"))
+    entries = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                     for entry in os.scandir(filtered_dir) if entry.name.endswith(".json"))
+    for name, size, mtime_ns in entries:
+        digest.update(f"{name}\0{size}\0{mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RelevanceIndex:
+    """
+    Term -> case_ids inverted index over the filtered corpus.
+
+    A term without separators ("malaria") is a substring of a case exactly when it is a
+    substring of one of the case's tokens, so it resolves from the postings alone. A phrase
+    ("weil's disease") is narrowed to the cases holding all of its words, then confirmed on
+    their text. Lookups are memoized, so a label shared by many queries is resolved once.
+    """
+
+    def __init__(self, postings: dict, texts: dict, fingerprint: str = None):
+        """
+        Args:
+            postings: Dictionary of {token: frozenset of case_ids}
+            texts: Dictionary of {case_id: relevance text}, used to confirm phrases
+            fingerprint: directory_fingerprint of the corpus the index was built from
+        """
+        self.postings = postings
+        self.texts = texts
+        self.fingerprint = fingerprint
+        self._word_cache = {}
+        self._term_cache = {}
+        self._label_cache = {}
+
+    @classmethod
+    def build(cls, filtered_dir=FILTERED_DIR) -> "RelevanceIndex":
+        """Read every filtered case once and index its tokens."""
+        filtered_dir = Path(filtered_dir)
+        fingerprint = directory_fingerprint(filtered_dir)
+        postings = {}
+        texts = {}
+        for case_path in filtered_dir.glob("*_filtered.json"):
+            try:
+                with open(case_path, 'r') as f:
+                    case_data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                continue  # Unreadable cases are never relevant, as before
+
+            case_id = case_path.name[:-len("_filtered.json")]
+            texts[case_id] = relevance_text(case_data)
+            for token in set(TOKEN_PATTERN.findall(texts[case_id])):
+                postings.setdefault(token, set()).add(case_id)
+
+        postings = {token: frozenset(case_ids) for token, case_ids in postings.items()}
+        print(f"Built relevance index: {len(texts)} cases, {len(postings)} terms")
+        return cls(postings, texts, fingerprint)
+
+    @classmethod
+    def load(cls, filtered_dir=FILTERED_DIR,
+             cache_path=PROJECT_ROOT / Config.RELEVANCE_INDEX_FILE) -> "RelevanceIndex":
+        """
+        Returns:
+            The cached index if the filtered directory is unchanged since it was built,
+            otherwise a new index (saved to cache_path for the next run)
+        """
+        filtered_dir = Path(filtered_dir)
+        cache_path = Path(cache_path)
+        if not filtered_dir.exists():
+            return cls({}, {})
+
+        fingerprint = directory_fingerprint(filtered_dir)
+        if cache_path.exists():
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get("format") == INDEX_FORMAT and cached.get("fingerprint") == fingerprint:
+                    return cls(cached["postings"], cached["texts"], fingerprint)
+            except (pickle.UnpicklingError, EOFError, AttributeError):
+                print(f"Relevance index {cache_path} unreadable, rebuilding")
+
+        index = cls.build(filtered_dir)
+        index.save(cache_path)
+        return index
+
+    def save(self, cache_path):
+        cache_path = Path(cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix(".tmp")
+        with open(temp_path, 'wb') as f:
+            pickle.dump({"format": INDEX_FORMAT, "fingerprint": self.fingerprint,
+                         "postings": self.postings, "texts": self.texts}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)  # Atomic, concurrent evaluations never read half a file
+
+    def _word_cases(self, word: str) -> frozenset:
+        """Cases with a token containing word (a scan of the vocabulary, once per word)."""
+        cases = self._word_cache.get(word)
+        if cases is None:
+            cases = frozenset().union(*(case_ids for token, case_ids in self.postings.items() if word in token))
+            self._word_cache[word] = cases
+        return cases
+
+    def cases_matching(self, term: str) -> frozenset:
+        """
+        Returns:
+            The case_ids whose relevance text contains term (case-insensitive substring)
+        """
+        term = term.lower()
+        cases = self._term_cache.get(term)
+        if cases is not None:
+            return cases
+
+        words = TOKEN_PATTERN.findall(term)
+        if not words:
+            cases = frozenset(case_id for case_id, text in self.texts.items() if term in text)
+        else:
+            candidates = self._word_cases(words[0])
+            for word in words[1:]:
+                candidates = candidates & self._word_cases(word)
+            if term == words[0]:
+                cases = candidates
+            else:
+                cases = frozenset(case_id for case_id in candidates if term in self.texts[case_id])
+        self._term_cache[term] = cases
+        return cases
+
+    def relevant_cases(self, expected_disease: str, expected_keywords) -> frozenset:
+        """
+        Returns:
+            The case_ids containing the expected disease or any of the expected keywords
+        """
+        key = (expected_disease, tuple(expected_keywords))
+        cases = self._label_cache.get(key)
+        if cases is None:
+            cases = self.cases_matching(expected_disease).union(
+                *(self.cases_matching(keyword) for keyword in expected_keywords))
+            self._label_cache[key] = cases
+        return cases
+
+    def is_relevant(self, case_id: str, expected_disease: str, expected_keywords) -> bool:
+        # Membership per term, no union of the (possibly large) case sets is built
+        return any(case_id in self.cases_matching(term) for term in [expected_disease, *expected_keywords])
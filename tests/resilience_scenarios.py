@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+LLM Resilience Scenarios
+
+Runs the generation resilience layer (deadlines, hedging, circuit breaker, degraded
+answers) against the local LLM stand-in with injected latency and errors.
+With --with-index the degraded response is also checked end to end through ClinicalRAG
+on the local index. Exits with status 1 if a scenario fails.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from src.generation.resilience import ResilientGenerator, CircuitBreaker, GenerationUnavailable
+from tests.llm_stand_in import StandInServer, StandInChatModel
+
+RESULTS = []
+
+
+def check(name, passed, detail=""):
+    RESULTS.append(passed)
+    print(f"{'PASS' if passed else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+
+
+def healthy(server, llm):
+    server.configure(latency_ms=20, slow_rate=0.0, error_rate=0.0)
+    generator = ResilientGenerator(llm, timeout_seconds=2)
+    answers = [generator.invoke("prompt") for _ in range(10)]
+    streamed = "".join(generator.stream("prompt"))
+    check("healthy backend answers", all(answers) and streamed.strip() == answers[0].strip())
+
+
+def deadline(server, llm):
+    server.configure(latency_ms=2000, slow_rate=0.0, error_rate=0.0)
+    generator = ResilientGenerator(llm, timeout_seconds=0.3)
+
+    start = time.perf_counter()
+    try:
+        generator.invoke("prompt")
+        reason = None
+    except GenerationUnavailable as e:
+        reason = e.reason
+    elapsed = time.perf_counter() - start
+    check("slow backend hits the deadline", reason == "timeout" and elapsed < 0.5, f"{elapsed:.2f}s")
+
+    async def async_call():
+        # Timed inside the loop: asyncio.run also waits for the stand-in client's thread to exit.
+        start = time.perf_counter()
+        try:
+            await generator.ainvoke("prompt")
+        except GenerationUnavailable as e:
+            return e.reason, time.perf_counter() - start
+        return None, time.perf_counter() - start
+    reason, elapsed = asyncio.run(async_call())
+    check("slow backend hits the deadline (async)", reason == "timeout" and elapsed < 0.5, f"{elapsed:.2f}s")
+
+    server.configure(latency_ms=20, chunk_delay_ms=200)
+    chunks = []
+    try:
+        for chunk in generator.stream("prompt"):
+            chunks.append(chunk)
+        reason = None
+    except GenerationUnavailable as e:
+        reason = e.reason
+    check("slow stream is cut at the deadline", reason == "timeout" and 0 < len(chunks) < 10,
+          f"{len(chunks)} chunks kept")
+    server.configure(chunk_delay_ms=10)
+
+
+def circuit_breaker(server, llm):
+    server.configure(latency_ms=20, slow_rate=0.0, error_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.5)
+    generator = ResilientGenerator(llm, timeout_seconds=2, breaker=breaker)
+
+    reasons = []
+    for _ in range(6):
+        try:
+            generator.invoke("prompt")
+        except GenerationUnavailable as e:
+            reasons.append(e.reason)
+    requests_before = server.requests
+    try:
+        generator.invoke("prompt")
+    except GenerationUnavailable:
+        pass
+    check("breaker opens after repeated errors",
+          reasons == ["error"] * 3 + ["circuit_open"] * 3 and server.requests == requests_before,
+          ", ".join(reasons))
+
+    server.configure(error_rate=0.0)
+    time.sleep(0.6)
+    answer = generator.invoke("prompt")
+    check("breaker closes after a successful trial call", bool(answer) and breaker.state == CircuitBreaker.CLOSED)
+
+
+def cancelled_trial(server, llm):
+    # A client disconnecting from a stream (or a cancelled request) during the half-open trial
+    # must free the trial slot, otherwise the breaker refuses every later call.
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.2)
+    generator = ResilientGenerator(llm, timeout_seconds=2, breaker=breaker)
+
+    def open_breaker():
+        server.configure(latency_ms=20, slow_rate=0.0, error_rate=1.0)
+        try:
+            generator.invoke("prompt")
+        except GenerationUnavailable:
+            pass
+        server.configure(latency_ms=300, error_rate=0.0, chunk_delay_ms=50)
+        time.sleep(0.3)
+
+    open_breaker()
+    chunks = generator.stream("prompt")
+    next(chunks)
+    chunks.close()
+    stream_released = breaker.state == CircuitBreaker.HALF_OPEN and not breaker.trial_running
+
+    async def async_cases():
+        open_breaker()
+        chunks = generator.astream("prompt")
+        await chunks.__anext__()
+        await chunks.aclose()
+        astream_released = breaker.state == CircuitBreaker.HALF_OPEN and not breaker.trial_running
+
+        open_breaker()
+        task = asyncio.ensure_future(generator.ainvoke("prompt"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return astream_released, breaker.state == CircuitBreaker.HALF_OPEN and not breaker.trial_running
+
+    astream_released, ainvoke_released = asyncio.run(async_cases())
+    server.configure(latency_ms=20, chunk_delay_ms=10)
+    answer = generator.invoke("prompt")
+    check("an abandoned trial call frees the breaker (stream close, astream aclose, ainvoke cancel)",
+          stream_released and astream_released and ainvoke_released and bool(answer)
+          and breaker.state == CircuitBreaker.CLOSED and generator.cancelled == 3,
+          f"{generator.cancelled} cancelled, breaker {breaker.state}")
+
+
+def hedging(server, llm, calls):
+    # 5% of requests stall: without hedging they set the p99, a hedge usually answers first.
+    server.configure(latency_ms=30, slow_rate=0.05, slow_ms=800, error_rate=0.0)
+
+    def run(generator):
+        latencies = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            generator.invoke("prompt")
+            latencies.append((time.perf_counter() - start) * 1000)
+        return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+    plain_p50, plain_p99 = run(ResilientGenerator(llm, timeout_seconds=5))
+    hedged = ResilientGenerator(llm, timeout_seconds=5, hedge=True, hedge_delay_seconds=0.1)
+    hedged_p50, hedged_p99 = run(hedged)
+    print(f"      no hedge: p50 {plain_p50:.0f} ms, p99 {plain_p99:.0f} ms | hedged: p50 {hedged_p50:.0f} ms, "
+          f"p99 {hedged_p99:.0f} ms | {hedged.hedges} hedges, {hedged.hedge_wins} won")
+    check("hedging cuts the tail latency", hedged_p99 < plain_p99 and hedged.hedge_wins > 0)
+
+
+def degraded_rag(server, llm):
+    # Imported here so the scenarios above run without a local index.
+    from src.generation.rag_generator import ClinicalRAG
+
+    server.configure(latency_ms=20, slow_rate=0.0, error_rate=1.0)
+    rag = ClinicalRAG(llm=llm)
+    rag.semantic_cache = None  # A cached answer would hide the failure
+    result = rag.query("Patient with fever, bleeding and recent travel to West Africa")
+    check("ClinicalRAG returns the cases with a generation unavailable note",
+          result["degraded"] is not None and result["degraded"]["status"] == "generation_unavailable"
+          and len(result["source_documents"]) > 0, result["degraded"] and result["degraded"]["reason"])
+
+    events = list(rag.stream_query("Patient with fever, bleeding and recent travel to West Africa"))
+    check("stream_query sends sources, then an unavailable event",
+          events[0]["type"] == "sources" and any(e["type"] == "unavailable" for e in events)
+          and events[-1]["degraded"] is not None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test LLM timeouts, hedging and the circuit breaker")
+    parser.add_argument("--hedge-calls", type=int, default=200, help="Calls per hedging run")
+    parser.add_argument("--with-index", action="store_true", help="Also check ClinicalRAG on the local index")
+    args = parser.parse_args()
+
+    server = StandInServer().start()
+    llm = StandInChatModel(server.url)
+    print(f"LLM stand-in on {server.url}\n")
+
+    healthy(server, llm)
+    deadline(server, llm)
+    circuit_breaker(server, llm)
+    cancelled_trial(server, llm)
+    hedging(server, llm, args.hedge_calls)
+    if args.with_index:
+        degraded_rag(server, llm)
+
+    server.stop()
+    print(f"\n{sum(RESULTS)}/{len(RESULTS)} scenarios passed")
+    sys.exit(0 if all(RESULTS) else 1)
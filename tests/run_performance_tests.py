@@ -2,10 +2,20 @@
 """
 Comprehensive test runner for comparing Gemma baseline performance with RAG system performance.
 This script runs both baseline and RAG tests and generates a comparison report.
+
+    python tests/run_performance_tests.py --tests both --concurrency 4 \
+        --cassette tests/cassettes/llm.json --cassette-mode auto
+
+With a cassette, LLM answers are recorded on the first run and replayed afterwards, so a rerun
+after a retriever change is offline and scores the same answers for unchanged prompts.
+Each evaluation is recorded in the benchmark history, runs with a cassette under their own
+benchmark name (replayed answers have no LLM latency to compare with live runs).
 """
 
+import argparse
 import json
 import sys
+import time
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any
@@ -13,6 +23,8 @@ from typing import Dict, Any
 # Ensure the project root is in the path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from config.settings import Config
+
 
 def ensure_results_directory():
     """Ensure the results directory exists."""
@@ -21,7 +33,43 @@ def ensure_results_directory():
     return results_dir
 
 
-def run_baseline_test():
+def create_llm(cassette_path=None, cassette_mode="auto"):
+    """
+    Create the chat model both tests use.
+
+    Returns:
+        An LLMCassette around Gemini when cassette_path is given (no Gemini client in replay
+        mode), otherwise None so each test creates its own live Gemini client.
+    """
+    if cassette_path is None:
+        return None
+    from llm_cassette import LLMCassette, gemini_chat_model
+
+    llm = None if cassette_mode == "replay" else gemini_chat_model()
+    cassette = LLMCassette(cassette_path, llm=llm, mode=cassette_mode)
+    print(f"LLM cassette: {cassette_path} ({cassette_mode}, {len(cassette.entries)} recorded answers)")
+    return cassette
+
+
+def history_name(evaluation: str, llm=None) -> str:
+    """Benchmark history name of an evaluation, runs with a cassette are compared among themselves."""
+    return evaluation if llm is None else f"{evaluation}_cassette"
+
+
+def baseline_history_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-query benchmark history metrics of a baseline evaluation."""
+    from benchmark_history import metric
+
+    answered = [r for r in metrics['results'] if r.get('error') is None]
+    return {
+        "diagnosis_correct": metric([float(r['diagnosis_correct']) for r in answered], "higher"),
+        "keyword_match": metric([r['keyword_match'] / 100 for r in answered], "higher"),
+        "inference_time_seconds": metric([r['inference_time'] for r in answered], "lower", "s"),
+        "wall_time_seconds": metric(metrics.get('wall_time_seconds'), "lower", "s")
+    }
+
+
+def run_baseline_test(llm=None, max_concurrency: int = Config.LLM_MAX_CONCURRENCY, record_history: bool = True):
     """Run the baseline Gemma test."""
     print(f"\n{'=' * 80}")
     print(f"RUNNING: BASELINE GEMMA TEST")
@@ -30,7 +78,7 @@ def run_baseline_test():
     try:
         from test_gemma_baseline import GemmaBaselineEvaluator
 
-        evaluator = GemmaBaselineEvaluator()
+        evaluator = GemmaBaselineEvaluator(llm=llm, max_concurrency=max_concurrency)
         metrics = evaluator.run_evaluation()
         evaluator.print_summary(metrics)
 
@@ -39,13 +87,18 @@ def run_baseline_test():
         results_file = results_dir / f"baseline_gemma_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         evaluator.save_results(metrics, filepath=str(results_file))
 
+        if record_history:
+            from benchmark_history import record_run
+            record_run(history_name("baseline_evaluation", llm), baseline_history_metrics(metrics),
+                       {"model": Config.GEMINI_MODEL, "max_concurrency": max_concurrency})
+
         return metrics
     except Exception as e:
         print(f"Error running baseline test: {str(e)}")
         return None
 
 
-def run_rag_test():
+def run_rag_test(llm=None, max_concurrency: int = Config.LLM_MAX_CONCURRENCY, record_history: bool = True):
     """Run the RAG system test."""
     print(f"\n{'=' * 80}")
     print(f"RUNNING: RAG SYSTEM TEST")
@@ -53,18 +106,30 @@ def run_rag_test():
 
     try:
         from src.generation.rag_generator import ClinicalRAG
-        from evaluate_rag import run_all_test, calculate_diagnosis_accuracy, calculate_match_keywords, calculate_precision_at_k
+        from evaluate_rag import (run_all_test, calculate_diagnosis_accuracy, calculate_match_keywords,
+                                  calculate_precision_at_k, calculate_recall_at_k, summarize_latency,
+                                  print_latency, history_metrics)
+        from benchmark_history import metric, record_run
         from ground_truth import GROUND_TRUTH
-        from config.settings import Config
+        from src.utils.metrics import METRICS
+
+        if llm is not None:
+            # Answers cached from earlier runs would bypass the cassette and the new retrieval
+            Config.SEMANTIC_CACHE_ENABLED = False
 
         # Run RAG tests
-        rag = ClinicalRAG()
-        results = run_all_test(rag, GROUND_TRUTH)
+        rag = ClinicalRAG(llm=llm)
+        start_time = time.perf_counter()
+        results = run_all_test(rag, GROUND_TRUTH, max_concurrency=max_concurrency)
+        wall_time = time.perf_counter() - start_time
 
         # Calculate metrics
         acc, correct, total = calculate_diagnosis_accuracy(results)
         avg_match = calculate_match_keywords(results)
         precision = calculate_precision_at_k(results)
+        recall = calculate_recall_at_k(results)
+        inference_times = [r['inference_time_seconds'] for r in results]
+        avg_inference_time = sum(inference_times) / len(inference_times) if inference_times else 0.0
 
         # Print results
         print(f"\n{'=' * 80}")
@@ -72,7 +137,11 @@ def run_rag_test():
         print(f"{'=' * 80}")
         print(f"Diagnosis Accuracy: {correct}/{total} = {acc:.2%}")
         print(f"Keyword Match: {avg_match:.2%}")
-        print(f"Precision@5: {precision:.2%}")
+        print(f"Precision@{Config.TOP_K_RETRIEVAL}: {precision:.2%}")
+        print(f"Recall@{Config.TOP_K_RETRIEVAL}: {recall:.2%}")
+        print(f"Wall Time: {wall_time:.2f}s ({max_concurrency} concurrent)\n")
+        latency_summary = summarize_latency(results)
+        print_latency(latency_summary)
 
         # Create metrics dict
         metrics = {
@@ -83,10 +152,16 @@ def run_rag_test():
             "successful_tests": total,
             "failed_tests": 0,
             "error_rate": 0.0,
-            "avg_inference_time_seconds": 0,
+            "avg_inference_time_seconds": avg_inference_time,
+            "wall_time_seconds": wall_time,
+            "max_concurrency": max_concurrency,
+            "query_latency": latency_summary,
+            "latency": METRICS.summary(),
             "diagnosis_accuracy_percent": acc * 100,
             "avg_keyword_match_percent": avg_match * 100,
-            "precision_at_5": precision * 100,
+            "precision_at_k": Config.TOP_K_RETRIEVAL,
+            "precision_at_k_percent": precision * 100,
+            "recall_at_k_percent": recall * 100,
             "correct_diagnoses": correct,
             "results": results
         }
@@ -108,6 +183,12 @@ def run_rag_test():
 
         print(f"\n✓ Results saved to: {results_file}")
 
+        if record_history:
+            record_run(history_name("rag_evaluation", llm),
+                       {**history_metrics(results, precision, recall),
+                        "wall_time_seconds": metric(wall_time, "lower", "s")},
+                       {"model": Config.GEMINI_MODEL, "max_concurrency": max_concurrency})
+
         return metrics
     except Exception as e:
         print(f"Error running RAG test: {str(e)}")
@@ -153,6 +234,9 @@ def compare_results(baseline_metrics: Dict[str, Any], rag_metrics: Dict[str, Any
     print(f"{'Diagnosis Accuracy (%)':<35} {baseline_accuracy:>14.2f}% {rag_accuracy:>14.2f}% {accuracy_improvement:>+14.2f}%")
     print(f"{'Keyword Match Rate (%)':<35} {baseline_keyword:>14.2f}% {rag_keyword:>14.2f}% {keyword_improvement:>+14.2f}%")
     print(f"{'Avg Inference Time (s)':<35} {baseline_time:>14.2f}s {rag_time:>14.2f}s {time_change:>+14.2f}s")
+    baseline_wall = baseline_metrics.get("wall_time_seconds", 0)
+    rag_wall = rag_metrics.get("wall_time_seconds", 0)
+    print(f"{'Wall Time (s)':<35} {baseline_wall:>14.2f}s {rag_wall:>14.2f}s {rag_wall - baseline_wall:>+14.2f}s")
 
     print(f"\n{'Percentage Improvements:':<35}")
     print(f"  Accuracy:      {accuracy_improvement_pct:>+.2f}%")
@@ -207,28 +291,47 @@ def save_comparison_report(baseline_metrics: Dict[str, Any], rag_metrics: Dict[s
     print(f"✓ Comparison report saved to: {report_file}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the Gemma baseline with the RAG system")
+    parser.add_argument("--tests", choices=["baseline", "rag", "both"], default="both",
+                        help="Which evaluations to run (comparison report only with both)")
+    parser.add_argument("--concurrency", type=int, default=Config.LLM_MAX_CONCURRENCY,
+                        help="Maximum number of LLM calls in flight")
+    parser.add_argument("--cassette", help="JSON file of recorded LLM answers (live Gemini calls if not given)")
+    parser.add_argument("--cassette-mode", choices=["record", "replay", "auto"], default="auto",
+                        help="record: always call the LLM, replay: recorded answers only (offline), "
+                             "auto: replay and record what is missing")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the runs in the benchmark history")
+    return parser.parse_args()
+
+
 def main():
     """Main function to run all tests."""
+    args = parse_args()
     print(f"\n{'#' * 80}")
     print(f"CLINICAL DIAGNOSIS SYSTEM - COMPREHENSIVE PERFORMANCE EVALUATION")
     print(f"{'#' * 80}")
     print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
-    # Run baseline test
-    baseline_metrics = run_baseline_test()
+    llm = create_llm(args.cassette, args.cassette_mode)
 
-    # Ask if user wants to run RAG test
-    print("\n" + "?" * 80)
-    response = input("Would you like to run the RAG system test for comparison? (yes/no): ").strip().lower()
+    baseline_metrics = None
+    if args.tests in ("baseline", "both"):
+        baseline_metrics = run_baseline_test(llm, args.concurrency, not args.no_history)
 
     rag_metrics = None
-    if response in ['yes', 'y']:
-        rag_metrics = run_rag_test()
-
-        # Compare results
-        if baseline_metrics and rag_metrics:
-            compare_results(baseline_metrics, rag_metrics)
-            save_comparison_report(baseline_metrics, rag_metrics)
+    if args.tests in ("rag", "both"):
+        rag_metrics = run_rag_test(llm, args.concurrency, not args.no_history)
+
+    # Compare results
+    if baseline_metrics and rag_metrics:
+        compare_results(baseline_metrics, rag_metrics)
+        save_comparison_report(baseline_metrics, rag_metrics)
+
+    if llm is not None:
+        stats = llm.stats()
+        print(f"LLM cassette: {stats['hits']} replayed, {stats['recorded']} recorded, "
+              f"{stats['misses']} missing, {stats['entries']} answers in {stats['path']}")
 
     print(f"\n{'#' * 80}")
     print(f"Evaluation Complete!")
@@ -4,6 +4,7 @@ This test evaluates the model's ability to diagnose tropical diseases without re
 """
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 from datetime import datetime
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -93,19 +94,28 @@ GEMMA_BASELINE_TESTS = [
 class GemmaBaselineEvaluator:
     """Evaluates the base Gemma model performance without RAG."""
 
-    def __init__(self):
+    def __init__(self, llm=None, max_concurrency: int = Config.LLM_MAX_CONCURRENCY):
+        """
+        Args:
+            llm: Chat model to evaluate instead of Gemini (e.g. an LLMCassette replaying recorded answers)
+            max_concurrency: Maximum number of test queries in flight
+        """
         print(f"Initializing Gemma Baseline Evaluator...")
         print(f"Model: {Config.GEMINI_MODEL}")
 
-        self.llm = ChatGoogleGenerativeAI(
-            model=Config.GEMINI_MODEL,
-            google_api_key=Config.GOOGLE_API_KEY,
-            temperature=0.7,
-            max_output_tokens=512
-        )
+        if llm is None:
+            llm = ChatGoogleGenerativeAI(
+                model=Config.GEMINI_MODEL,
+                google_api_key=Config.GOOGLE_API_KEY,
+                temperature=0.7,
+                max_output_tokens=512
+            )
+        self.llm = llm
+        self.max_concurrency = max_concurrency
 
         self.prompt = self.create_prompt()
         self.results = []
+        self.wall_time = 0.0
 
     def create_prompt(self) -> PromptTemplate:
         """Create a medical diagnosis prompt for baseline evaluation."""
@@ -165,26 +175,31 @@ class GemmaBaselineEvaluator:
         expected_diagnosis = test_case["expected_diagnosis"].lower()
         expected_keywords = test_case["expected_keywords"]
 
-        print(f"\n{'=' * 80}")
-        print(f"TEST {test_index + 1}/{len(GEMMA_BASELINE_TESTS)}")
-        print(f"{'=' * 80}")
-        print(f"\nQuery: {query}\n")
-        print(f"Expected Diagnosis: {expected_diagnosis}")
+        # Collected and printed at once, so concurrent tests do not interleave their output
+        output = [
+            f"\n{'=' * 80}",
+            f"TEST {test_index + 1}/{len(GEMMA_BASELINE_TESTS)}",
+            f"{'=' * 80}",
+            f"\nQuery: {query}\n",
+            f"Expected Diagnosis: {expected_diagnosis}"
+        ]
 
         # Measure response time
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             response = self.llm.invoke(self.prompt.format(question=query))
             response_text = response.content
-            inference_time = time.time() - start_time
+            inference_time = time.perf_counter() - start_time
         except Exception as e:
-            print(f"Error querying model: {str(e)}")
+            output.append(f"Error querying model: {str(e)}")
+            print("\n".join(output))
             return {
                 "test_index": test_index,
                 "query": query,
                 "expected_diagnosis": expected_diagnosis,
                 "error": str(e),
                 "inference_time": None,
+                "generation_seconds": None,
                 "response": None,
                 "extracted_diagnosis": None,
                 "keyword_match": 0.0,
@@ -198,12 +213,15 @@ class GemmaBaselineEvaluator:
         keyword_match = self.calculate_keyword_match(response_text, expected_keywords)
         diagnosis_correct = expected_diagnosis in extracted_diagnosis.lower()
 
-        print(f"\nModel Response:")
-        print(f"{response_text}")
-        print(f"\nExtracted Diagnosis: {extracted_diagnosis}")
-        print(f"Inference Time: {inference_time:.2f}s")
-        print(f"Keyword Match: {keyword_match:.1f}%")
-        print(f"Diagnosis Correct: {diagnosis_correct}")
+        output += [
+            f"\nModel Response:",
+            f"{response_text}",
+            f"\nExtracted Diagnosis: {extracted_diagnosis}",
+            f"Inference Time: {inference_time:.2f}s",
+            f"Keyword Match: {keyword_match:.1f}%",
+            f"Diagnosis Correct: {diagnosis_correct}"
+        ]
+        print("\n".join(output))
 
         result = {
             "test_index": test_index,
@@ -212,6 +230,7 @@ class GemmaBaselineEvaluator:
             "response": response_text,
             "extracted_diagnosis": extracted_diagnosis,
             "inference_time": inference_time,
+            "generation_seconds": inference_time,  # No retrieval, the whole time is the LLM call
             "keyword_match": keyword_match,
             "diagnosis_correct": diagnosis_correct,
             "expected_keywords": expected_keywords,
@@ -227,13 +246,15 @@ class GemmaBaselineEvaluator:
         print(f"{'#' * 80}")
         print(f"Model: {Config.GEMINI_MODEL}")
         print(f"Total Test Cases: {len(GEMMA_BASELINE_TESTS)}")
+        print(f"Concurrency: {self.max_concurrency}")
         print(f"Evaluation Start: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-        self.results = []
-
-        for i, test_case in enumerate(GEMMA_BASELINE_TESTS):
-            result = self.test_single_query(test_case, i)
-            self.results.append(result)
+        start_time = time.perf_counter()
+        # map() keeps the test order whatever order the LLM calls finish in.
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as executor:
+            self.results = list(executor.map(self.test_single_query, GEMMA_BASELINE_TESTS,
+                                             range(len(GEMMA_BASELINE_TESTS))))
+        self.wall_time = time.perf_counter() - start_time
 
         # Calculate aggregate metrics
         metrics = self.calculate_metrics()
@@ -275,6 +296,8 @@ class GemmaBaselineEvaluator:
             "failed_tests": total_tests - successful_tests,
             "error_rate": ((total_tests - successful_tests) / total_tests) * 100,
             "avg_inference_time_seconds": avg_inference_time,
+            "wall_time_seconds": self.wall_time,
+            "max_concurrency": self.max_concurrency,
             "avg_keyword_match_percent": avg_keyword_match,
             "diagnosis_accuracy_percent": diagnosis_accuracy,
             "results": self.results
@@ -299,6 +322,7 @@ class GemmaBaselineEvaluator:
         print(f"\n{'─' * 80}")
         print(f"Performance Metrics:")
         print(f"  Avg Inference Time: {metrics['avg_inference_time_seconds']:.2f}s")
+        print(f"  Wall Time:          {metrics['wall_time_seconds']:.2f}s ({metrics['max_concurrency']} concurrent)")
         print(f"  Keyword Match Rate: {metrics['avg_keyword_match_percent']:.2f}%")
         print(f"  Diagnosis Accuracy: {metrics['diagnosis_accuracy_percent']:.2f}%")
         print(f"\n{'#' * 80}\n")